@@ -4,9 +4,15 @@ import os
 # Load environment variables FIRST (before any other imports)
 load_dotenv()
 
+import threading
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.routers import chatbot, analytics, feedback
+from app.recommender import recommender
+from app.recommender.mood_extractor import close_llm_clients
+from app.recommender.conversation_memory import conversation_log
+from app.recommender.write_behind import write_queue
 
 app = FastAPI(
     title="StreamSmart API",
@@ -57,14 +63,20 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "version": "1.0.0"}
+    """Liveness: the process is up and serving HTTP (models may still be loading)"""
+    return {"status": "healthy", "version": "1.0.0", "ready": recommender.is_ready()}
+
+
+@app.get("/health/ready")
+def readiness_check():
+    """Readiness: 200 once the recommender model is loaded, 503 until then"""
+    status = recommender.get_model_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize data files on startup"""
-    import json
-
     # ✅ Use writable directory depending on environment
     if os.getenv("WEBSITE_SITE_NAME"):  # Azure App Service
         base_dir = os.path.join("/home", "data")
@@ -73,17 +85,24 @@ async def startup_event():
 
     os.makedirs(base_dir, exist_ok=True)
 
-    # Initialize data files if they don't exist
-    files_to_init = {
-        "conversations.json": {},
-        "feedback.json": {"show_ratings": [], "recommendation_feedback": []}
-    }
+    # Conversations, history and feedback stores create their own files on first write
 
-    for filename, initial_data in files_to_init.items():
-        filepath = os.path.join(base_dir, filename)
-        if not os.path.exists(filepath):
-            with open(filepath, "w") as f:
-                json.dump(initial_data, f, indent=2)
-            print(f"✅ Initialized {filename} at {filepath}")
+    # Load the model bundle in the background so startup (and autoscaling) isn't blocked on it
+    threading.Thread(target=recommender.warm_up, name="recommender-warm-up", daemon=True).start()
+
+    # Enforce per-user conversation retention off the request path
+    conversation_log.start_compaction(
+        interval=float(os.getenv("CONVERSATION_COMPACT_INTERVAL", "300")),
+        min_dead=int(os.getenv("CONVERSATION_COMPACT_MIN_DEAD", "1000"))
+    )
 
     print("🚀 StreamSmart API is ready!")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush queued writes, release pooled LLM connections and stop background jobs"""
+    write_queue.stop()
+    conversation_log.stop_compaction()
+    feedback.feedback_store.save_snapshot()
+    await close_llm_clients()
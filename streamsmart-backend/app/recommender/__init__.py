@@ -1,6 +1,6 @@
-from .recommender import get_recommendations
-from .mood_extractor import extract_mood
+from .recommender import get_recommendations, get_recommendations_async, get_recommendations_batch, get_recommendations_batch_async
+from .mood_extractor import extract_mood, extract_mood_async, extract_mood_batch
 from .user_profile import get_user_history
 
-__all__ = ["get_recommendations", "extract_mood", "get_user_history"]
+__all__ = ["get_recommendations", "get_recommendations_async", "get_recommendations_batch", "get_recommendations_batch_async", "extract_mood", "extract_mood_async", "extract_mood_batch", "get_user_history"]
 
@@ -0,0 +1,194 @@
+"""
+Approximate nearest-neighbour retrieval over the TF-IDF catalog.
+
+Prompt similarity is an exact sparse product against every catalog row,
+which is fine for a few hundred titles but grows linearly with the catalog.
+The IVF index narrows it to a candidate set first:
+
+- offline: TruncatedSVD reduces the TF-IDF rows to `dim` dense dimensions,
+  spherical k-means (plain NumPy) splits them into `nlist` clusters, and
+  each catalog row is filed in its cluster's inverted list
+- query: the prompt is projected the same way, the `nprobe` nearest
+  centroids are picked, and only the rows in those lists are scored
+  exactly against the (sparse) prompt vector
+- filtered query: rows outside the filter's bitset are skipped, and lists
+  keep being probed (nearest first) until enough matching rows are found,
+  so a selective filter doesn't come back empty
+
+The hybrid scorer talks to a retriever, so the two are interchangeable:
+
+- ExactRetriever: the full sparse product (same result as before)
+- IVFRetriever: exact scores, but only for IVF candidates
+
+RETRIEVAL_MODE picks one: "exact", "ivf", or "auto" (the default: IVF once
+the catalog has at least ANN_MIN_CATALOG titles). ANN_NPROBE trades recall
+for speed. The index is built with the artifact bundle (ann_ivf.npz); a
+bundle without one gets it built at load time when IVF is selected.
+"""
+import os
+import time
+
+import numpy as np
+
+from app.recommender.metadata_index import bits_contain
+
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "auto").lower()
+ANN_MIN_CATALOG = int(os.getenv("ANN_MIN_CATALOG", "50000"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+ANN_DIM = 64
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class IVFIndex:
+    def __init__(self, components, centroids, list_rows, list_offsets):
+        """
+        components: (n_features, dim) projection; centroids: (nlist, dim), unit rows;
+        list_rows[list_offsets[i]:list_offsets[i + 1]] are the catalog rows in list i
+        """
+        self.components = np.asarray(components, dtype=np.float32)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.list_rows = np.asarray(list_rows)
+        self.list_offsets = np.asarray(list_offsets)
+        self.nlist = self.centroids.shape[0]
+
+    def project(self, vectors):
+        """Unit-length reduced vectors for (n, n_features) sparse or dense rows"""
+        reduced = vectors @ self.components
+        return _normalize_rows(np.asarray(reduced, dtype=np.float32))
+
+    def candidates(self, vector, nprobe=ANN_NPROBE, allowed=None, min_rows=0):
+        """
+        Catalog rows in the `nprobe` lists nearest to one query vector, as a sorted array.
+        With `allowed` (a packed row bitset) only those rows are kept, and further lists
+        are probed, nearest first, until at least `min_rows` have been found.
+        """
+        query = self.project(vector)[0]
+        nprobe = min(nprobe, self.nlist)
+        similarities = self.centroids @ query
+        if allowed is None:
+            nearest = np.argpartition(-similarities, nprobe - 1)[:nprobe]
+            rows = np.concatenate([
+                self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in nearest
+            ])
+        else:
+            parts, found = [], 0
+            for probed, i in enumerate(np.argsort(-similarities)):
+                if probed >= nprobe and found >= min_rows:
+                    break
+                part = self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]]
+                parts.append(part[bits_contain(allowed, part)])
+                found += parts[-1].shape[0]
+            rows = np.concatenate(parts)
+        rows.sort()
+        return rows
+
+    def save(self, path):
+        np.savez(
+            path,
+            components=self.components,
+            centroids=self.centroids,
+            list_rows=self.list_rows,
+            list_offsets=self.list_offsets,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["components"], data["centroids"], data["list_rows"], data["list_offsets"])
+
+
+def build_ivf_index(tfidf_matrix, dim=ANN_DIM, nlist=None, iterations=10, seed=0):
+    """SVD-reduce the catalog, cluster it with spherical k-means and build the inverted lists"""
+    from sklearn.decomposition import TruncatedSVD
+
+    n_items, n_features = tfidf_matrix.shape
+    dim = max(1, min(dim, n_features - 1, n_items - 1))
+    svd = TruncatedSVD(n_components=dim, random_state=seed)
+    svd.fit(tfidf_matrix)
+    components = svd.components_.T.astype(np.float32)
+    reduced = _normalize_rows(np.asarray(tfidf_matrix @ components, dtype=np.float32))
+
+    nlist = nlist or int(np.clip(4 * np.sqrt(n_items), 1, n_items))
+    rng = np.random.default_rng(seed)
+    centroids = reduced[rng.choice(n_items, size=nlist, replace=False)]
+    for _ in range(iterations):
+        assignment = _assign(reduced, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, reduced)
+        counts = np.bincount(assignment, minlength=nlist)
+        # Empty lists are re-seeded from random rows so every centroid stays useful
+        empty = counts == 0
+        sums[empty] = reduced[rng.choice(n_items, size=int(empty.sum()))]
+        centroids = _normalize_rows(sums)
+    assignment = _assign(reduced, centroids)
+
+    order = np.argsort(assignment, kind="stable")
+    list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignment, minlength=nlist), out=list_offsets[1:])
+    return IVFIndex(components, centroids, order.astype(np.int32), list_offsets)
+
+
+def _assign(reduced, centroids, block=65536):
+    """Nearest centroid (by cosine) per row, in blocks to bound memory"""
+    return np.concatenate([
+        np.argmax(reduced[start:start + block] @ centroids.T, axis=1)
+        for start in range(0, reduced.shape[0], block)
+    ])
+
+
+# -----------------------------
+# Retrievers used by the hybrid scorer
+# -----------------------------
+class ExactRetriever:
+    name = "exact"
+
+    def __init__(self, tfidf_matrix):
+        self.tfidf_matrix = tfidf_matrix
+
+    def prompt_similarities(self, prompt_vec, allowed=None, min_rows=0):
+        """(rows, cosine similarities) for every catalog row with a non-zero score (in `allowed`, if given)"""
+        similarities = (self.tfidf_matrix @ prompt_vec.T).tocoo()
+        rows, similarities = similarities.row, similarities.data
+        if allowed is not None:
+            keep = bits_contain(allowed, rows)
+            rows, similarities = rows[keep], similarities[keep]
+        return rows, similarities
+
+
+class IVFRetriever:
+    name = "ivf"
+
+    def __init__(self, tfidf_matrix, index, nprobe=ANN_NPROBE):
+        self.tfidf_matrix = tfidf_matrix
+        self.index = index
+        self.nprobe = nprobe
+
+    def candidates(self, prompt_vec, allowed=None, min_rows=0):
+        return self.index.candidates(prompt_vec, self.nprobe, allowed, min_rows)
+
+    def prompt_similarities(self, prompt_vec, allowed=None, min_rows=0):
+        """Exact similarities, but only for rows in the probed IVF lists (see IVFIndex.candidates)"""
+        rows = self.candidates(prompt_vec, allowed, min_rows)
+        # Sparse rows times a dense query vector is much cheaper than a sparse-sparse product
+        similarities = self.tfidf_matrix[rows] @ prompt_vec.toarray().ravel()
+        keep = similarities != 0
+        return rows[keep], similarities[keep]
+
+
+def create_retriever(tfidf_matrix, ann_index=None, mode=RETRIEVAL_MODE):
+    """Retriever for RETRIEVAL_MODE; "auto" only uses IVF for large catalogs"""
+    if mode not in ("exact", "ivf", "auto"):
+        raise ValueError(f"Unknown RETRIEVAL_MODE: {mode!r} (expected 'exact', 'ivf' or 'auto')")
+    n_items = tfidf_matrix.shape[0]
+    if mode == "exact" or (mode == "auto" and n_items < ANN_MIN_CATALOG):
+        return ExactRetriever(tfidf_matrix)
+    if ann_index is None:
+        start = time.perf_counter()
+        ann_index = build_ivf_index(tfidf_matrix)
+        print(f"⚠️  Bundle has no ANN index; built one at load time ({time.perf_counter() - start:.1f}s)")
+    return IVFRetriever(tfidf_matrix, ann_index)
@@ -0,0 +1,217 @@
+"""
+Append-only JSONL files shared by several workers.
+
+The conversation log and the feedback store both keep one JSON record per
+line and an in-memory index built from the file. AppendOnlyLog holds what
+they have in common:
+
+- appends are single O_APPEND writes (optionally fsynced)
+- before reading, each process indexes whatever other workers appended
+  since its last look, and starts over if the file was rewritten
+- a lock file (fcntl, where available) keeps rewrites from racing appends
+  and reads
+- the index can be snapshotted next to the file; a snapshot records the
+  file's inode, its indexed size and a checksum of the first and last
+  indexed bytes, and is only trusted while all three still match
+
+Subclasses say how a line is indexed and what their snapshot holds.
+"""
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+# Bytes at each end of the indexed region covered by a snapshot's checksum
+SNAPSHOT_CHECK_BYTES = 4096
+
+
+def checksum(f, size):
+    """Digest of the first and last SNAPSHOT_CHECK_BYTES of an open file's first `size` bytes"""
+    digest = hashlib.sha1()
+    length = min(size, SNAPSHOT_CHECK_BYTES)
+    for start in (0, size - length):
+        f.seek(start)
+        digest.update(f.read(length))
+    return digest.hexdigest()
+
+
+class FileLock:
+    """Shared/exclusive advisory lock on a sidecar file"""
+
+    def __init__(self, path):
+        self.path = path
+
+    @contextmanager
+    def hold(self, exclusive=False):
+        if fcntl is None:
+            yield
+            return
+        with open(self.path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class AppendOnlyLog:
+    """
+    Base for a JSONL file indexed incrementally by every process sharing it.
+
+    Subclasses implement _index_line(offset, record), _snapshot_state() and
+    _restore_snapshot(snapshot), extend _reset_index(), and may implement
+    _import_json() to seed the file from an older JSON document.
+    """
+    snapshot_suffix = ".index.json"
+
+    def __init__(self, path, import_json=None):
+        self.path = path
+        self.import_json = import_json
+        self._file_lock = FileLock(path + ".lock")
+        self._lock = threading.RLock()
+        self._ready = False
+        self._indexed_size = 0
+        self._inode = None
+
+    def _start(self):
+        # Opened lazily so importing a module never touches the filesystem
+        if self._ready:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if not os.path.exists(self.path) and self.import_json and os.path.exists(self.import_json):
+            with self._file_lock.hold(exclusive=True):
+                if not os.path.exists(self.path):
+                    self._import_json()
+        self._ready = True
+
+    def _import_json(self):
+        raise NotImplementedError
+
+    def _reset_index(self):
+        self._indexed_size = 0
+        self._inode = None
+
+    def _index_line(self, offset, record):
+        """Index one complete line (record is None if it isn't valid JSON)"""
+        raise NotImplementedError
+
+    def refresh(self):
+        """Index lines appended since the last look"""
+        with self._lock:
+            self._start()
+            with self._file_lock.hold(exclusive=False):
+                self._sync()
+
+    def _sync(self):
+        """Index lines appended (by any process) since the last look; rebuild after a rewrite"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset_index()
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._indexed_size:
+            self._reset_index()
+            self._inode = stat.st_ino
+            self._load_snapshot(stat)
+        if stat.st_size == self._indexed_size:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._indexed_size)
+            offset = self._indexed_size
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # another worker is mid-append; pick it up next time
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                self._index_line(offset, record)
+                offset += len(line)
+            self._indexed_size = offset
+
+    # -----------------------------
+    # Snapshots
+    # -----------------------------
+    @property
+    def snapshot_path(self):
+        return self.path + self.snapshot_suffix
+
+    def _snapshot_state(self):
+        """JSON-serializable index state to store alongside the snapshot's position"""
+        raise NotImplementedError
+
+    def _restore_snapshot(self, snapshot):
+        """Load index state from a snapshot of this same file; return False to ignore it"""
+        raise NotImplementedError
+
+    def save_snapshot(self):
+        """Persist the index so the next start only reads lines appended after it"""
+        with self._lock:
+            if self._inode is None:
+                return
+            with open(self.path, "rb") as f:
+                if os.fstat(f.fileno()).st_ino != self._inode:
+                    return  # replaced since the last sync; the index no longer describes it
+                digest = checksum(f, self._indexed_size)
+            snapshot = {
+                "inode": self._inode,
+                "size": self._indexed_size,
+                "checksum": digest,
+                **self._snapshot_state(),
+            }
+            tmp = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, self.snapshot_path)
+
+    def _load_snapshot(self, stat):
+        """Restore the index from a snapshot of this same file, if there is one"""
+        try:
+            with open(self.snapshot_path, "r") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        if snapshot.get("inode") != stat.st_ino or snapshot.get("size", 0) > stat.st_size:
+            return
+        try:
+            with open(self.path, "rb") as f:
+                if snapshot.get("checksum") != checksum(f, snapshot.get("size", 0)):
+                    return
+        except OSError:
+            return
+        if self._restore_snapshot(snapshot) is not False:
+            self._indexed_size = snapshot["size"]
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def _append(self, data, fsync=True):
+        """Append encoded lines with one write (and one fsync)"""
+        if not data:
+            return
+        with self._lock:
+            self._start()
+            with self._file_lock.hold(exclusive=False):
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, data)
+                    if fsync:
+                        os.fsync(fd)
+                finally:
+                    os.close(fd)
+
+    def _rewrite(self, records):
+        """Atomically replace the file with the given records (caller holds the exclusive lock)"""
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
@@ -0,0 +1,398 @@
+"""
+Versioned model artifact bundle
+===============================
+Everything the recommender needs at serve time, precomputed offline:
+
+- catalog columns (one .npy per column)
+- fitted TF-IDF vocabulary + idf weights (no refit at startup)
+- TF-IDF matrix as raw CSR arrays
+- sorted key -> row indexes for titles and movie ids
+- RandomForest lookup table (see rf_lookup.py)
+- IVF approximate-nearest-neighbour index over the TF-IDF rows (see ann_index.py)
+- users table
+
+A manifest.json records the format version, build parameters and a SHA-256
+per file. Build it with:
+
+    python -m app.recommender.artifacts build [--out DIR] [--train]
+
+The service loads the bundle with plain NumPy (no CSV parsing, no unpickling,
+no training). If no bundle exists it falls back to building the same objects
+from the raw CSVs and pickles, but never trains a model at serve time.
+
+Array files are opened with np.load(mmap_mode="r") by default, so every
+uvicorn/gunicorn worker on a host maps the same pages from the OS page cache
+instead of holding a private copy (set MODEL_BUNDLE_MMAP=0 to read them into
+memory instead). Lookups that would otherwise need a per-worker dict (title or
+movie id -> row) are served from sorted, memory-mapped key arrays.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.recommender.ann_index import IVFIndex, build_ivf_index
+from app.recommender.rf_lookup import RFLookupTable, build_rf_lookup
+
+FORMAT_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+
+base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+data_dir = os.path.join(base_dir, "data")
+DEFAULT_BUNDLE_DIR = os.getenv("MODEL_BUNDLE_DIR") or os.path.join(data_dir, "model_bundle")
+USE_MMAP = os.getenv("MODEL_BUNDLE_MMAP", "1") != "0"
+
+movies_path = os.path.join(data_dir, "movies_metadata.csv")
+moods_path = os.path.join(data_dir, "mood_recommendations.csv")
+users_path = os.path.join(data_dir, "users.csv")
+model_path = os.path.join(data_dir, "rf_recommender_optimized.pkl")
+le_mood_path = os.path.join(data_dir, "le_mood.pkl")
+le_context_path = os.path.join(data_dir, "le_context.pkl")
+le_time_path = os.path.join(data_dir, "le_time.pkl")
+le_movie_path = os.path.join(data_dir, "le_movie.pkl")
+
+CATALOG_COLUMNS = ["movie_id", "title", "genre", "release_year", "duration", "rating", "tags"]
+STRING_COLUMNS = {"title", "genre", "tags"}
+TFIDF_PARAMS = {
+    "max_features": 100,  # Only top 100 words
+    "stop_words": "english",
+    "lowercase": True,
+    "ngram_range": [1, 2],  # Unigrams and bigrams
+}
+RF_LOOKUP_TOP_N = 10
+
+
+class KeyIndex:
+    """
+    Key -> catalog row lookup over a sorted key array.
+
+    Unlike a dict, both arrays can be memory-mapped and shared between workers.
+    """
+
+    def __init__(self, sorted_keys, rows):
+        self.sorted_keys = sorted_keys
+        self.rows = rows
+
+    @classmethod
+    def build(cls, keys):
+        order = np.argsort(keys, kind="stable")
+        return cls(keys[order], order)
+
+    def get(self, key, default=None):
+        i = int(np.searchsorted(self.sorted_keys, key))
+        if i < self.sorted_keys.shape[0] and self.sorted_keys[i] == key:
+            return int(self.rows[i])
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get_many(self, keys):
+        """Vectorized lookup; missing keys map to -1"""
+        keys = np.asarray(keys)
+        if keys.size == 0 or self.sorted_keys.shape[0] == 0:
+            return np.full(keys.shape, -1, dtype=np.intp)
+        positions = np.minimum(np.searchsorted(self.sorted_keys, keys), self.sorted_keys.shape[0] - 1)
+        found = self.sorted_keys[positions] == keys
+        return np.where(found, self.rows[positions], -1).astype(np.intp)
+
+
+class ModelBundle:
+    """In-memory view of a bundle, however it was produced"""
+
+    def __init__(self, catalog, tfidf_vectorizer, tfidf_matrix, rf_lookup, users, manifest,
+                 title_index=None, movie_id_index=None, ann_index=None):
+        self.catalog = catalog  # column name -> 1-D array, all the same length
+        self.tfidf_vectorizer = tfidf_vectorizer
+        self.tfidf_matrix = tfidf_matrix
+        self.rf_lookup = rf_lookup  # None when no RF model is available
+        self.users = users  # list of users.csv records
+        self.manifest = manifest
+        self.title_index = title_index or KeyIndex.build(catalog["title"])
+        self.movie_id_index = movie_id_index or KeyIndex.build(catalog["movie_id"])
+        self.ann_index = ann_index  # None for bundles built before the ANN index existed
+
+    @property
+    def catalog_size(self):
+        return len(self.catalog["movie_id"])
+
+    @property
+    def version(self):
+        return self.manifest.get("bundle_version", "unversioned")
+
+
+def _text_features(catalog):
+    # Combine title, genre, and tags for better matching
+    return [
+        f"{title} {genre} {tags}"
+        for title, genre, tags in zip(catalog["title"], catalog["genre"], catalog["tags"])
+    ]
+
+
+def _tfidf_vectorizer(vocabulary=None, idf=None):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    params = dict(TFIDF_PARAMS, ngram_range=tuple(TFIDF_PARAMS["ngram_range"]))
+    if vocabulary is None:
+        return TfidfVectorizer(**params)
+    params.pop("max_features")
+    vectorizer = TfidfVectorizer(vocabulary={term: i for i, term in enumerate(vocabulary.tolist())}, **params)
+    vectorizer.idf_ = idf
+    return vectorizer
+
+
+def _load_rf_lookup(train_if_missing=False):
+    """Export the RF lookup table from the pickles, optionally training them first"""
+    import joblib
+
+    if not (os.path.exists(model_path) and os.path.exists(le_mood_path)):
+        if not train_if_missing:
+            print("⚠️  No RandomForest model found; ML component disabled (run the bundle build with --train)")
+            return None
+        train_rf_model()
+
+    rf_model = joblib.load(model_path)
+    le_mood = joblib.load(le_mood_path)
+    le_context = joblib.load(le_context_path)
+    le_time = joblib.load(le_time_path)
+    le_movie = joblib.load(le_movie_path)
+    return build_rf_lookup(rf_model, le_mood, le_context, le_time, le_movie, top_n=RF_LOOKUP_TOP_N)
+
+
+def train_rf_model():
+    """Train and pickle the lightweight RandomForest (offline only, never at serve time)"""
+    import joblib
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import LabelEncoder
+
+    print("🔧 Training optimized Random Forest model...")
+    moods_df = pd.read_csv(moods_path)
+    le_mood = LabelEncoder()
+    le_context = LabelEncoder()
+    le_time = LabelEncoder()
+    le_movie = LabelEncoder()
+
+    moods_df["mood_enc"] = le_mood.fit_transform(moods_df["mood"])
+    moods_df["context_enc"] = le_context.fit_transform(moods_df["context"])
+    moods_df["time_enc"] = le_time.fit_transform(moods_df["time_of_day"])
+    moods_df["movie_enc"] = le_movie.fit_transform(moods_df["recommended_movie_id"])
+
+    X = moods_df[["mood_enc", "context_enc", "time_enc"]]
+    y = moods_df["movie_enc"]
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # OPTIMIZED: 10 trees (vs 100), max_depth=10, min_samples_split=10
+    rf_model = RandomForestClassifier(
+        n_estimators=10,
+        max_depth=10,
+        min_samples_split=10,
+        random_state=42,
+        n_jobs=1  # Single thread for Azure
+    )
+    rf_model.fit(X_train, y_train)
+
+    # Save model and encoders for reuse
+    joblib.dump(rf_model, model_path)
+    joblib.dump(le_mood, le_mood_path)
+    joblib.dump(le_context, le_context_path)
+    joblib.dump(le_time, le_time_path)
+    joblib.dump(le_movie, le_movie_path)
+
+    accuracy = rf_model.score(X_test, y_test)
+    print(f"✅ Optimized model trained! Test Accuracy: {accuracy:.2%}")
+
+
+def build_from_sources(train_if_missing=False):
+    """Build a ModelBundle from the raw CSVs and pickles (slow path)"""
+    import pandas as pd
+
+    print("📊 Loading datasets...")
+    movies_df = pd.read_csv(movies_path)
+    users_df = pd.read_csv(users_path)
+    print(f"✅ Loaded {len(movies_df)} movies")
+
+    catalog = {}
+    for col in CATALOG_COLUMNS:
+        if col in STRING_COLUMNS:
+            catalog[col] = movies_df[col].fillna("").to_numpy(dtype=str)
+        else:
+            catalog[col] = movies_df[col].to_numpy()
+
+    print("🔧 Building TF-IDF vectorizer...")
+    tfidf_vectorizer = _tfidf_vectorizer()
+    tfidf_matrix = tfidf_vectorizer.fit_transform(_text_features(catalog)).tocsr()
+    print(f"✅ TF-IDF ready ({tfidf_matrix.shape[0]} movies, {tfidf_matrix.shape[1]} features)")
+
+    rf_lookup = _load_rf_lookup(train_if_missing=train_if_missing)
+    users = json.loads(users_df.to_json(orient="records"))
+
+    print("🔧 Building ANN index...")
+    ann_index = build_ivf_index(tfidf_matrix)
+    print(f"✅ ANN index ready ({ann_index.nlist} lists)")
+
+    manifest = {"format_version": FORMAT_VERSION, "bundle_version": "sources"}
+    return ModelBundle(catalog, tfidf_vectorizer, tfidf_matrix, rf_lookup, users, manifest, ann_index=ann_index)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_bundle(bundle, out_dir=DEFAULT_BUNDLE_DIR):
+    """Write a ModelBundle as .npy/.npz files plus a manifest"""
+    os.makedirs(out_dir, exist_ok=True)
+    files = {}
+
+    def save_array(name, array):
+        np.save(os.path.join(out_dir, name), array, allow_pickle=False)
+        files[name] = None
+
+    for col, values in bundle.catalog.items():
+        save_array(f"catalog_{col}.npy", values)
+
+    vectorizer = bundle.tfidf_vectorizer
+    vocabulary = np.empty(len(vectorizer.vocabulary_), dtype=object)
+    for term, index in vectorizer.vocabulary_.items():
+        vocabulary[index] = term
+    save_array("tfidf_vocabulary.npy", vocabulary.astype(str))
+    save_array("tfidf_idf.npy", vectorizer.idf_)
+
+    matrix = bundle.tfidf_matrix
+    save_array("tfidf_data.npy", matrix.data)
+    save_array("tfidf_indices.npy", matrix.indices)
+    save_array("tfidf_indptr.npy", matrix.indptr)
+
+    for name, index in (("title", bundle.title_index), ("movie_id", bundle.movie_id_index)):
+        save_array(f"index_{name}_keys.npy", index.sorted_keys)
+        save_array(f"index_{name}_rows.npy", index.rows)
+
+    if bundle.rf_lookup is not None:
+        bundle.rf_lookup.save(os.path.join(out_dir, "rf_lookup.npz"))
+        files["rf_lookup.npz"] = None
+
+    if bundle.ann_index is not None:
+        bundle.ann_index.save(os.path.join(out_dir, "ann_ivf.npz"))
+        files["ann_ivf.npz"] = None
+
+    with open(os.path.join(out_dir, "users.json"), "w") as f:
+        json.dump(bundle.users, f)
+    files["users.json"] = None
+
+    for name in files:
+        files[name] = _sha256(os.path.join(out_dir, name))
+    bundle_version = hashlib.sha256(
+        "".join(f"{name}:{digest}" for name, digest in sorted(files.items())).encode()
+    ).hexdigest()[:12]
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "bundle_version": bundle_version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "catalog_size": bundle.catalog_size,
+        "catalog_columns": list(bundle.catalog),
+        "tfidf_shape": list(matrix.shape),
+        "tfidf_params": TFIDF_PARAMS,
+        "rf_lookup_top_n": bundle.rf_lookup.top_n if bundle.rf_lookup is not None else None,
+        "files": files,
+    }
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    bundle.manifest = manifest
+    return manifest
+
+
+def load_bundle(bundle_dir=DEFAULT_BUNDLE_DIR, verify=False, mmap=USE_MMAP):
+    """Load a prebuilt bundle. Raises FileNotFoundError/ValueError if it is missing or incompatible"""
+    from scipy.sparse import csr_matrix
+
+    manifest_path = os.path.join(bundle_dir, MANIFEST_FILE)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(
+            f"Bundle format {manifest.get('format_version')} is not supported (expected {FORMAT_VERSION})"
+        )
+    if verify:
+        for name, digest in manifest["files"].items():
+            if _sha256(os.path.join(bundle_dir, name)) != digest:
+                raise ValueError(f"Bundle file {name} does not match its manifest checksum")
+
+    def load_array(name):
+        return np.load(os.path.join(bundle_dir, name), mmap_mode="r" if mmap else None, allow_pickle=False)
+
+    catalog = {col: load_array(f"catalog_{col}.npy") for col in manifest["catalog_columns"]}
+    tfidf_vectorizer = _tfidf_vectorizer(
+        np.load(os.path.join(bundle_dir, "tfidf_vocabulary.npy"), allow_pickle=False),
+        np.load(os.path.join(bundle_dir, "tfidf_idf.npy"), allow_pickle=False),
+    )
+    # copy=False keeps the (possibly memory-mapped) arrays as the matrix's storage
+    tfidf_matrix = csr_matrix(
+        (load_array("tfidf_data.npy"), load_array("tfidf_indices.npy"), load_array("tfidf_indptr.npy")),
+        shape=tuple(manifest["tfidf_shape"]),
+        copy=False,
+    )
+    title_index = KeyIndex(load_array("index_title_keys.npy"), load_array("index_title_rows.npy"))
+    movie_id_index = KeyIndex(load_array("index_movie_id_keys.npy"), load_array("index_movie_id_rows.npy"))
+
+    rf_lookup = None
+    if "rf_lookup.npz" in manifest["files"]:
+        rf_lookup = RFLookupTable.load(os.path.join(bundle_dir, "rf_lookup.npz"))
+
+    ann_index = None
+    if "ann_ivf.npz" in manifest["files"]:
+        ann_index = IVFIndex.load(os.path.join(bundle_dir, "ann_ivf.npz"))
+
+    with open(os.path.join(bundle_dir, "users.json")) as f:
+        users = json.load(f)
+
+    return ModelBundle(
+        catalog, tfidf_vectorizer, tfidf_matrix, rf_lookup, users, manifest,
+        title_index=title_index, movie_id_index=movie_id_index, ann_index=ann_index
+    )
+
+
+def load_model_bundle(bundle_dir=DEFAULT_BUNDLE_DIR):
+    """Prefer the prebuilt bundle; fall back to the raw sources without training"""
+    if os.path.exists(os.path.join(bundle_dir, MANIFEST_FILE)):
+        try:
+            bundle = load_bundle(bundle_dir)
+            print(f"✅ Loaded model bundle {bundle.version} ({bundle.catalog_size} movies)")
+            return bundle
+        except Exception as e:
+            print(f"⚠️  Could not load model bundle from {bundle_dir}: {e}")
+    print("ℹ️  No usable model bundle, building from source data (run: python -m app.recommender.artifacts build)")
+    return build_from_sources(train_if_missing=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the StreamSmart model artifact bundle")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Build the bundle from data/*.csv and the RF pickles")
+    build.add_argument("--out", default=DEFAULT_BUNDLE_DIR, help="Output directory")
+    build.add_argument("--train", action="store_true", help="Train the RandomForest if its pickles are missing")
+    verify = subparsers.add_parser("verify", help="Check a bundle against its manifest checksums")
+    verify.add_argument("--dir", default=DEFAULT_BUNDLE_DIR, help="Bundle directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        manifest = save_bundle(build_from_sources(train_if_missing=args.train), args.out)
+        print(f"✅ Bundle {manifest['bundle_version']} written to {args.out} in {time.perf_counter() - start:.2f}s")
+    else:
+        bundle = load_bundle(args.dir, verify=True)
+        print(f"✅ Bundle {bundle.version} OK ({bundle.catalog_size} movies)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Candidate generation for two-stage recommendation.
+
+Scoring every title on every request makes per-request cost grow with the
+catalog. Instead, a candidate stage gathers a few hundred plausible rows
+from cheap lookups, and only those are ranked with the full hybrid score:
+
+- prompt: nearest rows to the prompt vector (IVF candidates, or term
+  postings when retrieval is exact)
+- history: nearest rows to the user's strongest taste terms
+- ml: the RF lookup table's top-N for the mood
+- genre: best-rated titles of genres named in the prompt or preferred by the user
+- tag: best-rated titles of tags named in the prompt
+- mood: titles recommended for the extracted mood
+
+With a filter (see metadata_index.py), the values it asks for join the
+genre/tag/mood sources and candidates outside the filter are dropped. The
+prompt and history searches apply the filter before keeping their best
+rows, so they return the nearest matching titles rather than the nearest
+titles overall (which a selective filter could remove entirely). If fewer
+than top_n remain, the best-rated matching titles fill in (source
+"filter").
+
+Each source contributes at most CANDIDATE_SOURCE_LIMIT rows. Catalogs
+smaller than CANDIDATE_MIN_CATALOG skip the stage. Ranking everything costs
+about the same as choosing from it, and the results stay identical to full
+scoring.
+"""
+import os
+import re
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from app.recommender.metadata_index import FIELDS, bits_contain
+
+CANDIDATE_SOURCE_LIMIT = int(os.getenv("CANDIDATE_SOURCE_LIMIT", "100"))
+CANDIDATE_MIN_CATALOG = int(os.getenv("CANDIDATE_MIN_CATALOG", "2000"))
+
+# The taste vector is dense; its strongest terms make a sparse query like a prompt
+HISTORY_QUERY_TERMS = 16
+
+
+def _mention_pattern(values):
+    """Regex matching any of `values` as whole words, longest first ("dark humor" before "dark")"""
+    values = sorted((v for v in values if v), key=len, reverse=True)
+    if not values:
+        return None
+    return re.compile(r"(?<!\w)(" + "|".join(re.escape(v) for v in values) + r")(?!\w)")
+
+
+def _best(rows, similarities, limit):
+    """The `limit` rows with the highest non-zero similarity"""
+    if rows.shape[0] > limit:
+        rows = rows[np.argpartition(-similarities, limit - 1)[:limit]]
+    return rows
+
+
+class CandidateGenerator:
+    def __init__(self, metadata_index, retriever, tfidf_matrix,
+                 source_limit=CANDIDATE_SOURCE_LIMIT, min_catalog=CANDIDATE_MIN_CATALOG):
+        self.metadata_index = metadata_index
+        self.retriever = retriever
+        self.source_limit = max(int(source_limit), 1)
+        self.enabled = metadata_index.catalog_size >= min_catalog
+        self._patterns = {field: _mention_pattern(metadata_index.values(field)) for field in ("genre", "tag")}
+        self._term_postings = None
+        if self.enabled and retriever.name == "exact":
+            # Term -> rows postings: a lookup costs the posting lengths of the query's terms, not the whole matrix
+            self._term_postings = tfidf_matrix.T.tocsr()
+
+    def _neighbours(self, query, allowed=None):
+        """Nearest rows to a query vector; with a filter, the nearest matching rows"""
+        if self._term_postings is None:
+            return _best(*self.retriever.prompt_similarities(query, allowed, self.source_limit), self.source_limit)
+        similarities = (query @ self._term_postings).tocoo()
+        rows, similarities = similarities.col, similarities.data
+        if allowed is not None:
+            keep = bits_contain(allowed, rows)
+            rows, similarities = rows[keep], similarities[keep]
+        return _best(rows, similarities, self.source_limit)
+
+    def _mentions(self, field, text):
+        pattern = self._patterns[field]
+        return pattern.findall(text.lower()) if pattern is not None else []
+
+    def _metadata(self, field, values):
+        """Best-rated rows across several values, sharing one source limit"""
+        values = list(dict.fromkeys(v.strip().lower() for v in values if v and v.strip()))
+        if not values:
+            return np.empty(0, dtype=np.int32)
+        per_value = max(self.source_limit // len(values), 1)
+        return np.concatenate([self.metadata_index.top(field, value, per_value) for value in values])
+
+    def generate(self, user_prompt, prompt_vec, mood, taste_vector, ml_rows, preferred_genres=(),
+                 allowed=None, filter_terms=(), min_candidates=0):
+        """
+        Sorted candidate rows, and how many rows each source contributed.
+
+        allowed: packed bitset of the rows a filter admits (None: no filter)
+        filter_terms: (field or None, value) pairs the filter asks for
+        """
+        wanted = {field: [] for field in FIELDS}
+        for field, value in filter_terms:
+            for name in ([field] if field else FIELDS):
+                wanted[name].append(value)
+        sources = {"prompt": self._neighbours(prompt_vec, allowed)}
+        if taste_vector is not None:
+            terms = np.argpartition(-taste_vector, min(HISTORY_QUERY_TERMS, taste_vector.shape[0]) - 1)
+            terms = terms[:HISTORY_QUERY_TERMS]
+            terms = terms[taste_vector[terms] > 0]
+            query = csr_matrix((taste_vector[terms], (np.zeros(terms.shape[0], dtype=np.intp), terms)),
+                               shape=(1, taste_vector.shape[0]))
+            sources["history"] = self._neighbours(query, allowed)
+        sources["ml"] = ml_rows
+        sources["genre"] = self._metadata(
+            "genre", wanted["genre"] + self._mentions("genre", user_prompt) + list(preferred_genres)
+        )
+        sources["tag"] = self._metadata("tag", wanted["tag"] + self._mentions("tag", user_prompt))
+        sources["mood"] = self._metadata("mood", wanted["mood"] + [mood])
+        candidates = np.unique(np.concatenate([np.asarray(rows, dtype=np.intp) for rows in sources.values()]))
+        if allowed is not None:
+            candidates = candidates[bits_contain(allowed, candidates)]
+            if candidates.shape[0] < min_candidates:
+                # Too selective for the sources above: fall back to the best-rated matches
+                sources["filter"] = self.metadata_index.best_rated(allowed, self.source_limit)
+                candidates = np.union1d(candidates, sources["filter"])
+        return candidates, {name: int(len(rows)) for name, rows in sources.items()}
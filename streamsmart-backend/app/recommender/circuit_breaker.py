@@ -0,0 +1,72 @@
+"""
+Minimal circuit breaker for calls to external services (the mood LLM).
+
+closed     -> calls go through; consecutive failures are counted
+open       -> calls are skipped until reset_timeout has passed
+half_open  -> a single probe call is let through; success closes the
+              breaker, failure re-opens it
+"""
+import threading
+import time
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """True if the caller may attempt the protected call now"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+                print(f"🟡 {self.name} circuit half-open, probing")
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                print(f"🟢 {self.name} circuit closed")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or (
+                self.state == "closed" and self.consecutive_failures >= self.failure_threshold
+            ):
+                self.state = "open"
+                self.opened_at = self.clock()
+                self.times_opened += 1
+                self._probe_in_flight = False
+                print(f"🔴 {self.name} circuit open after {self.consecutive_failures} failures")
+
+    def stats(self):
+        with self._lock:
+            retry_in = None
+            if self.state == "open":
+                retry_in = round(max(0.0, self.reset_timeout - (self.clock() - self.opened_at)), 1)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout_seconds": self.reset_timeout,
+                "times_opened": self.times_opened,
+                "retry_in_seconds": retry_in,
+            }
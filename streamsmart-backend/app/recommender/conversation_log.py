@@ -0,0 +1,286 @@
+"""
+Append-only conversation log.
+
+Every chat turn is one JSON line ({"user_id": ..., **entry}) appended to
+data/conversations.jsonl, so a write costs one small append instead of
+re-reading and rewriting every user's history. Each process keeps an
+in-memory index of byte offsets, holding only each user's last
+`retention` records. Reads seek straight to a user's last N lines.
+
+The index also carries each retained record's mood and genres, plus
+per-user mood and genre counters that are updated as records enter and
+leave the retention window. Analytics therefore read counts in O(1), and
+the counts always match the conversations a user can still see. The index
+is snapshotted next to the log (<log>.index.json) after compaction and on
+shutdown, so a restart only scans the lines appended since then.
+
+Several workers can share the file; appends, syncing with other workers,
+locking and snapshot validation come from append_log.AppendOnlyLog.
+
+Records older than the last `retention` per user stay in the file until
+compact() rewrites it. start_compaction() runs that in a background thread
+whenever enough dead records have piled up.
+"""
+import itertools
+import json
+import threading
+from collections import deque
+
+from app.recommender.append_log import AppendOnlyLog
+
+
+def summarize(record):
+    """(mood, genres) of a conversation record, as counted by analytics"""
+    return (record.get("mood") or {}).get("mood", "neutral"), tuple(record.get("genres") or ())
+
+
+def _count(counts, key, delta):
+    value = counts.get(key, 0) + delta
+    if value:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+
+class ConversationLog(AppendOnlyLog):
+    def __init__(self, path, retention=50, import_json=None):
+        super().__init__(path, import_json)
+        self.retention = retention
+        self._windows = {}  # user_id -> deque of (offset, mood, genres), newest last
+        self._moods = {}  # user_id -> {mood: count} over the window
+        self._genres = {}  # user_id -> {genre: count} over the window
+        self._lines = 0
+        self._compactor = None
+        self._stop = threading.Event()
+        self.compactions = 0
+
+    # -----------------------------
+    # Index maintenance
+    # -----------------------------
+    def _import_json(self):
+        """Seed the log from the old conversations.json (one-time, first start)"""
+        with open(self.import_json, "r") as f:
+            try:
+                conversations = json.load(f)
+            except ValueError:
+                conversations = {}
+        self._rewrite(
+            {"user_id": user_id, **entry}
+            for user_id, entries in conversations.items()
+            for entry in entries[-self.retention:]
+        )
+        print(f"📦 Imported conversations for {len(conversations)} users from {self.import_json}")
+
+    def _reset_index(self):
+        super()._reset_index()
+        self._windows = {}
+        self._moods = {}
+        self._genres = {}
+        self._lines = 0
+
+    def _index_line(self, offset, record):
+        user_id = record.get("user_id") if isinstance(record, dict) else None
+        if user_id is not None:
+            self._index(user_id, offset, *summarize(record))
+        self._lines += 1
+
+    def _index(self, user_id, offset, mood, genres):
+        """Add a record to the user's window, evicting (and uncounting) the oldest past retention"""
+        window = self._windows.get(user_id)
+        if window is None:
+            window = self._windows[user_id] = deque()
+            self._moods[user_id] = {}
+            self._genres[user_id] = {}
+        window.append((offset, mood, genres))
+        _count(self._moods[user_id], mood, 1)
+        for genre in genres:
+            _count(self._genres[user_id], genre, 1)
+        if len(window) > self.retention:
+            _, old_mood, old_genres = window.popleft()
+            _count(self._moods[user_id], old_mood, -1)
+            for genre in old_genres:
+                _count(self._genres[user_id], genre, -1)
+
+    def _snapshot_state(self):
+        return {
+            "lines": self._lines,
+            "retention": self.retention,
+            "windows": {user_id: [list(item) for item in window] for user_id, window in self._windows.items()},
+        }
+
+    def _restore_snapshot(self, snapshot):
+        if snapshot.get("retention") != self.retention:
+            return False
+        for user_id, window in snapshot["windows"].items():
+            for offset, mood, genres in window:
+                self._index(user_id, offset, mood, tuple(genres))
+        self._lines = snapshot["lines"]
+
+    # -----------------------------
+    # Reads and writes
+    # -----------------------------
+    def append(self, user_id, entry):
+        self.append_many([(user_id, entry)], fsync=False)
+
+    def append_many(self, records, fsync=True):
+        """Append (user_id, entry) records with one write (and one fsync)"""
+        data = "".join(json.dumps({"user_id": user_id, **entry}) + "\n" for user_id, entry in records).encode()
+        self._append(data, fsync)
+
+    def get(self, user_id, limit=None):
+        """A user's most recent records (at most `retention`), oldest first"""
+        limit = self.retention if limit is None else min(limit, self.retention)
+        if limit <= 0:
+            return []
+        with self._lock:
+            self._start()
+            with self._file_lock.hold(exclusive=False):
+                self._sync()
+                return self._read(list(self._windows.get(user_id, ()))[-limit:])
+
+    def _read(self, items):
+        """Records at the given window items' offsets (caller holds the locks)"""
+        if not items:
+            return []
+        records = []
+        with open(self.path, "rb") as f:
+            for offset, _, _ in items:
+                f.seek(offset)
+                record = json.loads(f.readline())
+                record.pop("user_id", None)
+                records.append(record)
+        return records
+
+    def load_all(self):
+        """{user_id: records} for every user (retention applied)"""
+        with self._lock:
+            self._start()
+            with self._file_lock.hold(exclusive=False):
+                self._sync()
+                users = list(self._windows)
+            return {user_id: self.get(user_id) for user_id in users}
+
+    def replace_all(self, conversations):
+        """Rewrite the log from a {user_id: records} dict"""
+        with self._lock:
+            self._start()
+            with self._file_lock.hold(exclusive=True):
+                self._write_compacted(
+                    (user_id, entry)
+                    for user_id, entries in conversations.items()
+                    for entry in entries[-self.retention:]
+                )
+
+    def aggregates(self, user_id, pending=()):
+        """
+        (count, {mood: n}, {genre: n}) over the user's retained conversations.
+
+        `pending` are records not yet appended (e.g. still queued); the window
+        slides over them exactly as if they had been logged. Any that reached
+        the log in the meantime are recognized at the tail and not counted twice.
+        """
+        with self._lock:
+            self._start()
+            with self._file_lock.hold(exclusive=False):
+                self._sync()
+                window = self._windows.get(user_id, ())
+                if pending:
+                    tail = self._read(list(window)[-len(pending):])
+                    pending = [record for record in pending if record not in tail]
+            moods = dict(self._moods.get(user_id, {}))
+            genres = dict(self._genres.get(user_id, {}))
+            extra = [summarize(record) for record in pending]
+            overflow = len(window) + len(extra) - self.retention
+            evicted = [item[1:] for item in itertools.islice(window, max(overflow, 0))]
+        for mood, record_genres in extra:
+            _count(moods, mood, 1)
+            for genre in record_genres:
+                _count(genres, genre, 1)
+        # Whatever would slide out of the window, logged records first
+        evicted += extra[:max(overflow - len(evicted), 0)]
+        for mood, record_genres in evicted:
+            _count(moods, mood, -1)
+            for genre in record_genres:
+                _count(genres, genre, -1)
+        return min(len(window) + len(extra), self.retention), moods, genres
+
+    # -----------------------------
+    # Compaction
+    # -----------------------------
+    def dead_records(self):
+        with self._lock:
+            self._start()
+            with self._file_lock.hold(exclusive=False):
+                self._sync()
+            return self._lines - sum(len(window) for window in self._windows.values())
+
+    def _write_compacted(self, records):
+        self._rewrite({"user_id": user_id, **entry} for user_id, entry in records)
+        self._reset_index()
+        self._sync()
+
+    def compact(self):
+        """Drop everything but each user's last `retention` records; returns records removed"""
+        with self._lock:
+            self._start()
+            with self._file_lock.hold(exclusive=True):
+                self._sync()
+                before = self._lines
+                live = {user_id: [item[0] for item in window] for user_id, window in self._windows.items()}
+                with open(self.path, "rb") as f:
+                    def records():
+                        # Keep global append order so the file still reads chronologically
+                        for offset, user_id in sorted((o, u) for u, offsets in live.items() for o in offsets):
+                            f.seek(offset)
+                            record = json.loads(f.readline())
+                            record.pop("user_id", None)
+                            yield user_id, record
+                    self._write_compacted(records())
+                self.save_snapshot()
+                self.compactions += 1
+                return before - self._lines
+
+    def start_compaction(self, interval=300.0, min_dead=1000):
+        """Compact in a daemon thread every `interval` seconds once `min_dead` records are dead"""
+        if self._compactor is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    if self.dead_records() >= min_dead:
+                        removed = self.compact()
+                        print(f"🧹 Compacted conversation log ({removed} old records removed)")
+                except Exception as e:
+                    print(f"⚠️  Conversation log compaction failed: {e}")
+
+        self._stop.clear()
+        self._compactor = threading.Thread(target=run, name="conversation-compaction", daemon=True)
+        self._compactor.start()
+
+    def stop_compaction(self):
+        """Stop the compactor and snapshot the index for a fast restart"""
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join(timeout=5)
+            self._compactor = None
+        if self._ready and self._inode is not None:
+            try:
+                self.save_snapshot()
+            except OSError as e:
+                print(f"⚠️  Could not save conversation index snapshot: {e}")
+
+    def stats(self):
+        with self._lock:
+            self._start()
+            with self._file_lock.hold(exclusive=False):
+                self._sync()
+            live = sum(len(window) for window in self._windows.values())
+            return {
+                "users": len(self._windows),
+                "records": self._lines,
+                "live_records": live,
+                "dead_records": self._lines - live,
+                "file_bytes": self._indexed_size,
+                "compactions": self.compactions,
+            }
@@ -1,39 +1,63 @@
 """
 Conversation memory to track user interactions and improve recommendations over time
 """
-import json
 import os
 from datetime import datetime
 from typing import List, Dict, Optional
+from app.recommender.conversation_log import ConversationLog
+from app.recommender.write_behind import write_queue
 
 base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 CONVERSATION_FILE = os.path.join(base_dir, "data", "conversations.json")
+CONVERSATION_LOG_FILE = os.getenv("CONVERSATION_LOG_FILE") or os.path.join(base_dir, "data", "conversations.jsonl")
+
+# Conversations kept per user (older records are dropped by compaction)
+CONVERSATION_RETENTION = 50
+
+# Append-only log with a per-user offset index; the old JSON file is imported on first start
+conversation_log = ConversationLog(
+    CONVERSATION_LOG_FILE,
+    retention=CONVERSATION_RETENTION,
+    import_json=CONVERSATION_FILE
+)
+
+# Chat turns are queued and appended in batches (one write + fsync per flush)
+write_queue.register("conversation", conversation_log.append_many)
+
+def _pending_conversations(user_id: str) -> List[Dict]:
+    return [entry for _, entry in write_queue.pending("conversation", user_id)]
+
+def _recent_conversations(user_id: str, limit: int) -> List[Dict]:
+    """Logged plus still-queued conversations for a user, newest last"""
+    limit = min(limit, CONVERSATION_RETENTION)
+    if limit <= 0:
+        return []
+    # Queued entries are read first; one flushed in between shows up in both and is skipped
+    pending = _pending_conversations(user_id)
+    stored = conversation_log.get(user_id, limit)
+    if pending:
+        tail = stored[-len(pending):]
+        stored += [entry for entry in pending if entry not in tail]
+    return stored[-limit:]
 
 def load_conversations() -> Dict:
     """Load conversation history from file"""
-    if not os.path.exists(CONVERSATION_FILE):
-        return {}
     try:
-        with open(CONVERSATION_FILE, "r") as f:
-            return json.load(f)
+        write_queue.flush()
+        return conversation_log.load_all()
     except Exception:
         return {}
 
 def save_conversations(conversations: Dict):
     """Save conversation history to file"""
     try:
-        with open(CONVERSATION_FILE, "w") as f:
-            json.dump(conversations, f, indent=2)
+        write_queue.flush()
+        conversation_log.replace_all(conversations)
     except Exception as e:
         print(f"Error saving conversations: {e}")
 
 def add_conversation(user_id: str, message: str, mood: Dict, recommendations: List[Dict]):
     """Add a conversation entry for a user"""
-    conversations = load_conversations()
-    
-    if user_id not in conversations:
-        conversations[user_id] = []
-    
     conversation_entry = {
         "timestamp": datetime.now().isoformat(),
         "message": message,
@@ -42,40 +66,25 @@ def add_conversation(user_id: str, message: str, mood: Dict, recommendations: Li
         "genres": list(set([rec["genre"] for rec in recommendations[:3]]))
     }
     
-    conversations[user_id].append(conversation_entry)
-    
-    # Keep only last 50 conversations per user
-    conversations[user_id] = conversations[user_id][-50:]
-    
-    save_conversations(conversations)
+    # Acknowledged immediately; retention (last 50 per user) is applied on read and by compaction
+    write_queue.submit("conversation", user_id, (user_id, conversation_entry))
 
 def get_user_conversations(user_id: str, limit: int = 10) -> List[Dict]:
     """Get recent conversations for a user"""
-    conversations = load_conversations()
-    user_convos = conversations.get(user_id, [])
-    return user_convos[-limit:]
+    return _recent_conversations(user_id, limit)
 
 def get_user_mood_history(user_id: str) -> Dict[str, int]:
     """Get mood statistics for a user"""
-    conversations = load_conversations()
-    user_convos = conversations.get(user_id, [])
-    
-    mood_count = {}
-    for convo in user_convos:
-        mood = convo.get("mood", {}).get("mood", "neutral")
-        mood_count[mood] = mood_count.get(mood, 0) + 1
-    
+    # Counters are maintained by the log as records enter and leave the retention window
+    _, mood_count, _ = conversation_log.aggregates(user_id, _pending_conversations(user_id))
     return mood_count
 
 def get_user_genre_preferences(user_id: str) -> Dict[str, int]:
     """Get genre preferences based on conversation history"""
-    conversations = load_conversations()
-    user_convos = conversations.get(user_id, [])
-    
-    genre_count = {}
-    for convo in user_convos:
-        for genre in convo.get("genres", []):
-            genre_count[genre] = genre_count.get(genre, 0) + 1
-    
+    _, _, genre_count = conversation_log.aggregates(user_id, _pending_conversations(user_id))
     return genre_count
 
+def get_user_conversation_summary(user_id: str) -> Dict:
+    """Conversation count plus mood and genre counters, from one read of the aggregates"""
+    count, mood_count, genre_count = conversation_log.aggregates(user_id, _pending_conversations(user_id))
+    return {"count": count, "moods": mood_count, "genres": genre_count}
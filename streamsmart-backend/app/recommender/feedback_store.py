@@ -0,0 +1,255 @@
+"""
+Append-only feedback store with running aggregates.
+
+Every rating is one JSON line ({"section": ..., "write_id": ..., **entry}) appended to
+data/feedback.jsonl, so a write never re-reads or rewrites older feedback.
+While indexing the file, each process keeps running totals:
+
+- show ratings: count, rating sum, liked count
+- recommendation feedback: count, accuracy sum, helpful count
+- per title: count, rating sum, liked count
+
+The stats endpoints read these totals in O(1) however much feedback has
+piled up. Like the conversation log (both build on append_log.AppendOnlyLog),
+each read first indexes whatever other workers appended since the last look,
+and the totals are snapshotted (<log>.stats.json) on shutdown so a restart
+only scans newer lines.
+
+Each write carries a write id (new_write_id()) so entries still queued for
+the log can be told apart from ones already indexed: ids this process wrote
+are remembered as a contiguous watermark plus a set of any written out of order.
+Listeners registered with add_listener() are told a title's new totals
+whenever they change, which lets other components keep their own
+incremental views.
+
+The old data/feedback.json is imported once on first start.
+"""
+import itertools
+import json
+import os
+import uuid
+
+from app.recommender.append_log import AppendOnlyLog
+
+base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+FEEDBACK_FILE = os.path.join(base_dir, "data", "feedback.json")
+FEEDBACK_LOG_FILE = os.getenv("FEEDBACK_LOG_FILE") or os.path.join(base_dir, "data", "feedback.jsonl")
+
+SHOW_RATINGS = "show_ratings"
+RECOMMENDATION_FEEDBACK = "recommendation_feedback"
+
+
+def _empty_totals():
+    return {
+        SHOW_RATINGS: {"count": 0, "rating_sum": 0, "liked": 0},
+        RECOMMENDATION_FEEDBACK: {"count": 0, "accuracy_sum": 0, "helpful": 0},
+    }
+
+
+class FeedbackStore(AppendOnlyLog):
+    snapshot_suffix = ".stats.json"
+
+    def __init__(self, path, import_json=None):
+        super().__init__(path, import_json)
+        self._listeners = []
+        self._titles = {}
+        # Write ids are "<writer>-<seq>"; only this process's own ids can be pending here
+        self._writer = uuid.uuid4().hex[:12]
+        self._write_seq = itertools.count(1)
+        self._logged_upto = 0  # every own seq up to here has been indexed
+        self._logged_ahead = set()  # own seqs indexed past a gap
+        self._reset_index()
+
+    # -----------------------------
+    # Index maintenance
+    # -----------------------------
+    def _import_json(self):
+        """Seed the log from the old feedback.json (one-time, first start)"""
+        with open(self.import_json, "r") as f:
+            try:
+                feedback = json.load(f)
+            except ValueError:
+                feedback = {}
+        self._write_all(feedback)
+        print(f"📦 Imported {sum(len(v) for v in feedback.values())} feedback entries from {self.import_json}")
+
+    def _reset_index(self):
+        super()._reset_index()
+        # Titles dropped by a rewrite are reported as zeroed before starting over
+        for title in self._titles:
+            self._notify(title, (0, 0, 0))
+        self._totals = _empty_totals()
+        self._titles = {}  # title -> [count, rating_sum, liked]
+
+    def add_listener(self, callback):
+        """
+        callback(title, count, rating_sum, liked) with a title's totals each
+        time they change; it is called for every title already indexed first.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+            for title, aggregate in self._titles.items():
+                callback(title, *aggregate)
+
+    def new_write_id(self):
+        """Id for an entry about to be queued; pass it to append_many with the entry"""
+        return f"{self._writer}-{next(self._write_seq)}"
+
+    def _notify(self, title, aggregate):
+        for callback in self._listeners:
+            callback(title, *aggregate)
+
+    def _index_line(self, offset, record):
+        if not isinstance(record, dict):
+            return
+        self._mark_logged(record.get("write_id"))
+        section = record.get("section")
+        totals = self._totals.get(section)
+        if totals is None:
+            return
+        totals["count"] += 1
+        if section == SHOW_RATINGS:
+            rating, liked = record.get("rating", 0), bool(record.get("liked"))
+            totals["rating_sum"] += rating
+            totals["liked"] += liked
+            title = record.get("show_title")
+            if title is not None:
+                aggregate = self._titles.get(title)
+                if aggregate is None:
+                    aggregate = self._titles[title] = [0, 0, 0]
+                aggregate[0] += 1
+                aggregate[1] += rating
+                aggregate[2] += liked
+                self._notify(title, aggregate)
+        else:
+            totals["accuracy_sum"] += record.get("accuracy_score", 0)
+            totals["helpful"] += bool(record.get("recommendation_helpful"))
+
+    def _snapshot_state(self):
+        return {"totals": self._totals, "titles": self._titles}
+
+    def _restore_snapshot(self, snapshot):
+        self._totals = snapshot["totals"]
+        self._titles = snapshot["titles"]
+        for title, aggregate in self._titles.items():
+            self._notify(title, aggregate)
+
+    def _own_seq(self, write_id):
+        writer, _, seq = (write_id or "").partition("-")
+        return int(seq) if writer == self._writer else None
+
+    def _mark_logged(self, write_id):
+        seq = self._own_seq(write_id)
+        if seq is None or seq <= self._logged_upto:
+            return
+        self._logged_ahead.add(seq)
+        while self._logged_upto + 1 in self._logged_ahead:
+            self._logged_upto += 1
+            self._logged_ahead.remove(self._logged_upto)
+
+    def _is_logged(self, write_id):
+        seq = self._own_seq(write_id)
+        return seq is not None and (seq <= self._logged_upto or seq in self._logged_ahead)
+
+    # -----------------------------
+    # Reads and writes
+    # -----------------------------
+    def append_many(self, entries, fsync=True):
+        """Append (write_id, section, entry) triples with one write (and one fsync)"""
+        data = "".join(
+            json.dumps({"section": section, "write_id": write_id, **entry}) + "\n"
+            for write_id, section, entry in entries
+        ).encode()
+        self._append(data, fsync)
+
+    def load_all(self):
+        """Everything, in the old feedback.json shape ({section: [entries]})"""
+        feedback = {SHOW_RATINGS: [], RECOMMENDATION_FEEDBACK: []}
+        with self._lock:
+            self._start()
+            with self._file_lock.hold(exclusive=False):
+                if not os.path.exists(self.path):
+                    return feedback
+                with open(self.path, "r") as f:
+                    for line in f:
+                        if not line.endswith("\n"):
+                            break
+                        record = json.loads(line)
+                        record.pop("write_id", None)
+                        feedback.setdefault(record.pop("section"), []).append(record)
+        return feedback
+
+    def replace_all(self, feedback):
+        """Rewrite the log from a {section: [entries]} dict"""
+        with self._lock:
+            self._start()
+            with self._file_lock.hold(exclusive=True):
+                self._write_all(feedback)
+                self._reset_index()
+
+    def _write_all(self, feedback):
+        self._rewrite({"section": section, **entry} for section, entries in feedback.items() for entry in entries)
+
+    def totals(self, pending=()):
+        """
+        Running totals per section, including `pending` (write_id, section, entry)
+        triples that are not logged yet. Any that reached the log in the meantime
+        are recognized by their write id and not counted twice.
+        """
+        with self._lock:
+            self._start()
+            with self._file_lock.hold(exclusive=False):
+                self._sync()
+                pending = self._unlogged(pending)
+            totals = {section: dict(values) for section, values in self._totals.items()}
+        for section, entry in pending:
+            values = totals.get(section)
+            if values is None:
+                continue
+            values["count"] += 1
+            if section == SHOW_RATINGS:
+                values["rating_sum"] += entry.get("rating", 0)
+                values["liked"] += bool(entry.get("liked"))
+            else:
+                values["accuracy_sum"] += entry.get("accuracy_score", 0)
+                values["helpful"] += bool(entry.get("recommendation_helpful"))
+        return totals
+
+    def title_totals(self, title, pending=()):
+        """(count, rating_sum, liked) for one show, including pending show ratings"""
+        return self.totals_for_titles([title], pending)[title]
+
+    def totals_for_titles(self, titles, pending=()):
+        """{title: (count, rating_sum, liked)}, including pending show ratings"""
+        with self._lock:
+            self._start()
+            with self._file_lock.hold(exclusive=False):
+                self._sync()
+                pending = self._unlogged(pending)
+            result = {title: list(self._titles.get(title, (0, 0, 0))) for title in titles}
+        for section, entry in pending:
+            if section == SHOW_RATINGS and entry.get("show_title") in result:
+                aggregate = result[entry["show_title"]]
+                aggregate[0] += 1
+                aggregate[1] += entry.get("rating", 0)
+                aggregate[2] += bool(entry.get("liked"))
+        return {title: tuple(aggregate) for title, aggregate in result.items()}
+
+    def _unlogged(self, pending):
+        """(section, entry) pairs of pending triples not indexed yet (caller holds the locks)"""
+        return [(section, entry) for write_id, section, entry in pending if not self._is_logged(write_id)]
+
+    def stats(self):
+        with self._lock:
+            self._start()
+            with self._file_lock.hold(exclusive=False):
+                self._sync()
+            return {
+                "entries": sum(values["count"] for values in self._totals.values()),
+                "titles_rated": len(self._titles),
+                "file_bytes": self._indexed_size,
+            }
+
+
+# Shared by the feedback endpoints and the recommender's rating prior
+feedback_store = FeedbackStore(FEEDBACK_LOG_FILE, import_json=FEEDBACK_FILE)
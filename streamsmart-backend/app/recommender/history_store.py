@@ -0,0 +1,214 @@
+"""
+Storage backends for user watch history.
+
+- SQLiteHistoryStore (default): one row per (user, title) in a WAL-mode
+  SQLite file. Reads and appends touch a single user's rows, so cost doesn't
+  grow with the number of users, and concurrent workers append in their own
+  transactions instead of overwriting each other's copy of the whole file.
+- JSONHistoryStore: the original data/user_history.json format (whole-file
+  read/rewrite), kept for simple setups via USER_HISTORY_BACKEND=json.
+
+On first use the SQLite store imports data/user_history.json once if the
+database is empty. The same migration can be run explicitly:
+
+    python -m app.recommender.history_store migrate [--json PATH] [--db PATH] [--force]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+DEFAULT_JSON_PATH = os.path.join(base_dir, "data", "user_history.json")
+DEFAULT_DB_PATH = os.path.join(base_dir, "data", "user_history.sqlite3")
+
+
+class JSONHistoryStore:
+    def __init__(self, path=DEFAULT_JSON_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load_all(self):
+        if not os.path.exists(self.path):
+            with open(self.path, "w") as f:
+                json.dump({}, f)
+        with open(self.path, "r") as f:
+            return json.load(f)
+
+    def save_all(self, history):
+        with open(self.path, "w") as f:
+            json.dump(history, f, indent=2)
+
+    def get(self, user_id):
+        return self.load_all().get(user_id, [])
+
+    def count(self, user_id):
+        return len(self.get(user_id))
+
+    def add(self, user_id, title):
+        """Append a title; returns False if the user already had it"""
+        return self.add_many([(user_id, title)]) == 1
+
+    def add_many(self, pairs):
+        """Append (user_id, title) pairs with one read and one rewrite; returns how many were new"""
+        with self._lock:
+            history = self.load_all()
+            added = 0
+            for user_id, title in pairs:
+                user_data = history.setdefault(user_id, [])
+                if title not in user_data:
+                    user_data.append(title)
+                    added += 1
+            if added:
+                self.save_all(history)
+            return added
+
+
+class SQLiteHistoryStore:
+    def __init__(self, path=DEFAULT_DB_PATH, import_json=DEFAULT_JSON_PATH):
+        self.path = path
+        self.import_json = import_json
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        # Opened lazily so importing the module never touches the filesystem
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # id keeps watch order; (user_id, title) is unique so appends are idempotent
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS watch_history ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " user_id TEXT NOT NULL,"
+                " title TEXT NOT NULL,"
+                " added_at REAL NOT NULL,"
+                " UNIQUE (user_id, title))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS watch_history_user ON watch_history (user_id, id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.commit()
+            self._conn = conn
+            if self.import_json:
+                self._import_once(conn)
+        return self._conn
+
+    def _import_once(self, conn):
+        """Seed an empty database from the JSON file (first start after switching backends)"""
+        done = conn.execute("SELECT value FROM meta WHERE key = 'json_import'").fetchone()
+        empty = conn.execute("SELECT 1 FROM watch_history LIMIT 1").fetchone() is None
+        if done or not empty or not os.path.exists(self.import_json):
+            return
+        with open(self.import_json, "r") as f:
+            history = json.load(f)
+        rows = self._insert_many(conn, self._pairs(history))
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_import', ?)",
+            (json.dumps({"source": self.import_json, "rows": rows, "at": time.time()}),)
+        )
+        conn.commit()
+        print(f"📦 Imported {rows} watch history rows for {len(history)} users from {self.import_json}")
+
+    @staticmethod
+    def _insert_many(conn, pairs):
+        """INSERT OR IGNORE (user_id, title) pairs; returns how many rows were new"""
+        now = time.time()
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO watch_history (user_id, title, added_at) VALUES (?, ?, ?)",
+            ((user_id, title, now) for user_id, title in pairs)
+        )
+        return conn.total_changes - before
+
+    @staticmethod
+    def _pairs(history):
+        return ((user_id, title) for user_id, titles in history.items() for title in titles)
+
+    def load_all(self):
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT user_id, title FROM watch_history ORDER BY id"
+            ).fetchall()
+        history = {}
+        for user_id, title in rows:
+            history.setdefault(user_id, []).append(title)
+        return history
+
+    def save_all(self, history):
+        """Replace every user's history (compatibility with the JSON API)"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM watch_history")
+                self._insert_many(conn, self._pairs(history))
+
+    def get(self, user_id):
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT title FROM watch_history WHERE user_id = ? ORDER BY id", (user_id,)
+            ).fetchall()
+        return [title for (title,) in rows]
+
+    def count(self, user_id):
+        """Number of titles the user has watched (an index-only count)"""
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM watch_history WHERE user_id = ?", (user_id,)
+            ).fetchone()[0]
+
+    def add(self, user_id, title):
+        """Append a title; returns False if the user already had it"""
+        return self.add_many([(user_id, title)]) == 1
+
+    def add_many(self, pairs):
+        """Append (user_id, title) pairs in one transaction; returns how many were new"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                return self._insert_many(conn, pairs)
+
+
+def create_history_store(backend=None):
+    """Store for USER_HISTORY_BACKEND ("sqlite", the default, or "json")"""
+    backend = (backend or os.getenv("USER_HISTORY_BACKEND") or "sqlite").lower()
+    if backend == "json":
+        return JSONHistoryStore(os.getenv("USER_HISTORY_FILE") or DEFAULT_JSON_PATH)
+    if backend == "sqlite":
+        return SQLiteHistoryStore(
+            os.getenv("USER_HISTORY_DB") or DEFAULT_DB_PATH,
+            import_json=os.getenv("USER_HISTORY_FILE") or DEFAULT_JSON_PATH
+        )
+    raise ValueError(f"Unknown USER_HISTORY_BACKEND: {backend!r} (expected 'sqlite' or 'json')")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the user watch history store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate = subparsers.add_parser("migrate", help="Copy user_history.json into the SQLite store")
+    migrate.add_argument("--json", default=DEFAULT_JSON_PATH, help="Source JSON file")
+    migrate.add_argument("--db", default=DEFAULT_DB_PATH, help="Target SQLite file")
+    migrate.add_argument("--force", action="store_true", help="Replace existing SQLite history instead of merging")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    with open(args.json, "r") as f:
+        history = json.load(f)
+    store = SQLiteHistoryStore(args.db, import_json=None)
+    conn = store._connection()
+    with conn:
+        if args.force:
+            conn.execute("DELETE FROM watch_history")
+        rows = store._insert_many(conn, store._pairs(history))
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_import', ?)",
+            (json.dumps({"source": args.json, "rows": rows, "at": time.time()}),)
+        )
+    print(f"✅ Migrated {rows} rows for {len(history)} users to {args.db} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
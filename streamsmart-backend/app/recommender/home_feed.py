@@ -0,0 +1,248 @@
+"""
+Precomputed per-user home feed
+==============================
+Most sessions open with a generic prompt, so the first screen doesn't need
+live scoring. An offline job scores HOME_FEED_PROMPT for every known user
+(users.csv plus everyone in the watch history store) with the default
+hybrid weights, using the batch scorer, and writes a compact keyed store:
+
+- user_ids.npy: sorted user ids
+- offsets.npy: int64, user i's feed is movie_ids[offsets[i]:offsets[i + 1]]
+- movie_ids.npy / scores.npy: concatenated feeds, best first
+- fingerprints.npy: hash of each user's watch history at build time
+
+Each build writes a new generation of these files and then atomically
+replaces manifest.json, which names the live generation, so readers never
+see a half-written feed. Serving memory-maps the arrays: a lookup is one
+binary search and a slice.
+
+Rebuilds are incremental: a user whose history fingerprint is unchanged
+(and whose feed was built with the same bundle, prompt, weights and size)
+keeps their previous feed, and only the rest are scored. When the rating
+prior is weighted, new feedback changes every score, so a build whose
+prior differs (by content hash) from the previous one rescores everyone.
+
+    python -m app.recommender.home_feed build [--out DIR] [--top-n 20] [--prompt TEXT] [--full]
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+DEFAULT_FEED_DIR = os.getenv("HOME_FEED_DIR") or os.path.join(base_dir, "data", "home_feed")
+HOME_FEED_PROMPT = os.getenv("HOME_FEED_PROMPT", "recommend something good to watch")
+HOME_FEED_TOP_N = int(os.getenv("HOME_FEED_TOP_N", "20"))
+MANIFEST_FILE = "manifest.json"
+ARRAYS = ("user_ids", "offsets", "movie_ids", "scores", "fingerprints")
+
+
+def history_fingerprint(titles):
+    """Stable 64-bit hash of a user's watch history (order-independent)"""
+    digest = hashlib.blake2b("\x1f".join(sorted(titles)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class HomeFeed:
+    """Read side: memory-mapped arrays of one generation"""
+
+    def __init__(self, feed_dir, manifest):
+        self.feed_dir = feed_dir
+        self.manifest = manifest
+        generation = manifest["generation"]
+        arrays = {
+            name: np.load(os.path.join(feed_dir, f"{name}.{generation}.npy"), mmap_mode="r", allow_pickle=False)
+            for name in ARRAYS
+        }
+        self.user_ids = arrays["user_ids"]
+        self.offsets = arrays["offsets"]
+        self.movie_ids = arrays["movie_ids"]
+        self.scores = arrays["scores"]
+        self.fingerprints = arrays["fingerprints"]
+
+    def _position(self, user_id):
+        i = int(np.searchsorted(self.user_ids, user_id))
+        if i < self.user_ids.shape[0] and self.user_ids[i] == user_id:
+            return i
+        return None
+
+    def get(self, user_id):
+        """(movie_ids, scores, history fingerprint at build time) or None"""
+        i = self._position(user_id)
+        if i is None:
+            return None
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.movie_ids[start:end], self.scores[start:end], int(self.fingerprints[i])
+
+    def __len__(self):
+        return self.user_ids.shape[0]
+
+
+def load_home_feed(feed_dir=DEFAULT_FEED_DIR):
+    """The live generation in feed_dir, or None if no feed has been built"""
+    try:
+        with open(os.path.join(feed_dir, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    return HomeFeed(feed_dir, manifest)
+
+
+def _live_generation(feed_dir):
+    try:
+        with open(os.path.join(feed_dir, MANIFEST_FILE)) as f:
+            return json.load(f)["generation"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+class HomeFeedReader:
+    """Serves the current feed, picking up a new generation at most every `check_seconds`"""
+
+    def __init__(self, feed_dir=DEFAULT_FEED_DIR, check_seconds=5.0):
+        self.feed_dir = feed_dir
+        self.check_seconds = check_seconds
+        self._feed = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.check_seconds
+                    try:
+                        mtime = os.stat(os.path.join(self.feed_dir, MANIFEST_FILE)).st_mtime_ns
+                    except FileNotFoundError:
+                        mtime = None
+                    if mtime != self._mtime:
+                        try:
+                            self._feed = load_home_feed(self.feed_dir) if mtime is not None else None
+                            self._mtime = mtime
+                        except (OSError, ValueError, KeyError) as e:
+                            print(f"⚠️  Could not load home feed: {e}")
+        return self._feed
+
+
+home_feed_reader = HomeFeedReader(
+    DEFAULT_FEED_DIR,
+    check_seconds=float(os.getenv("HOME_FEED_CHECK_SECONDS", "5"))
+)
+
+
+# -----------------------------
+# Offline build
+# -----------------------------
+def _known_users(model, history):
+    users = {str(record["user_id"]) for records in model.users_by_id.values() for record in records}
+    users.update(history)
+    return sorted(users)
+
+
+def build_home_feed(feed_dir=DEFAULT_FEED_DIR, top_n=HOME_FEED_TOP_N, prompt=HOME_FEED_PROMPT, full=False):
+    """Score the home prompt for every user whose history changed; returns a summary dict"""
+    from app.recommender import recommender
+    from app.recommender.mood_extractor import extract_mood
+    from app.recommender.user_profile import load_user_history
+
+    start = time.perf_counter()
+    model = recommender.get_model()
+    weights = dict(recommender.DEFAULT_WEIGHTS)
+    history = load_user_history()
+    users = _known_users(model, history)
+    fingerprints = np.array([history_fingerprint(history.get(user_id, [])) for user_id in users], dtype=np.uint64)
+
+    settings = {
+        "bundle_version": model.bundle.version, "prompt": prompt, "top_n": top_n, "weights": weights,
+        "rating_prior": model.rating_prior.digest() if weights["rating_weight"] else None,
+    }
+    previous = None if full else load_home_feed(feed_dir)
+    if previous is not None and previous.manifest.get("settings") != settings:
+        previous = None
+
+    # Reuse feeds whose history fingerprint is unchanged; score everyone else in one batch
+    feeds = {}
+    stale = []
+    for user_id, fingerprint in zip(users, fingerprints):
+        entry = previous.get(user_id) if previous is not None else None
+        if entry is not None and entry[2] == int(fingerprint):
+            feeds[user_id] = (np.asarray(entry[0]), np.asarray(entry[1]))
+        else:
+            stale.append(user_id)
+
+    if stale:
+        mood_info = extract_mood(prompt)
+        items = [(user_id, prompt, top_n, mood_info) for user_id in stale]
+        blocks = recommender.score_blocks(model, items, **weights)
+        for block, scores, top_rows in blocks:
+            top_rows = top_rows[:, :top_n]
+            movie_ids = model.catalog_movie_ids[top_rows]
+            top_scores = np.take_along_axis(scores, top_rows, axis=1)
+            for i, (user_id, _, _, _) in enumerate(block):
+                feeds[user_id] = (movie_ids[i], top_scores[i])
+
+    lengths = np.array([len(feeds[user_id][0]) for user_id in users], dtype=np.int64)
+    offsets = np.zeros(len(users) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    arrays = {
+        "user_ids": np.array(users, dtype=str),
+        "offsets": offsets,
+        "movie_ids": np.concatenate([feeds[u][0] for u in users]) if users else np.empty(0, dtype=np.int64),
+        "scores": np.concatenate([feeds[u][1] for u in users]).astype(np.float32) if users else np.empty(0, dtype=np.float32),
+        "fingerprints": fingerprints,
+    }
+
+    # New generation first, then swap the manifest; older generations are removed afterwards
+    os.makedirs(feed_dir, exist_ok=True)
+    generation = f"{int(time.time() * 1000)}-{os.getpid()}"
+    for name, array in arrays.items():
+        np.save(os.path.join(feed_dir, f"{name}.{generation}.npy"), array, allow_pickle=False)
+    manifest = {
+        "generation": generation,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "users": len(users),
+        "recomputed": len(stale),
+        "settings": settings,
+    }
+    tmp = os.path.join(feed_dir, f"{MANIFEST_FILE}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    live_before = _live_generation(feed_dir)
+    os.replace(tmp, os.path.join(feed_dir, MANIFEST_FILE))
+    # Keep the generation readers may still be switching away from; drop anything older
+    keep = {generation, live_before}
+    for path in glob.glob(os.path.join(feed_dir, "*.npy")):
+        if path.rsplit(".", 2)[-2] not in keep:
+            os.remove(path)
+
+    manifest["seconds"] = round(time.perf_counter() - start, 3)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the precomputed home feed")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Recompute feeds for users whose history changed")
+    build.add_argument("--out", default=DEFAULT_FEED_DIR, help="Feed directory")
+    build.add_argument("--top-n", type=int, default=HOME_FEED_TOP_N)
+    build.add_argument("--prompt", default=HOME_FEED_PROMPT)
+    build.add_argument("--full", action="store_true", help="Recompute every user")
+    args = parser.parse_args(argv)
+
+    summary = build_home_feed(args.out, top_n=args.top_n, prompt=args.prompt, full=args.full)
+    print(
+        f"✅ Home feed {summary['generation']}: {summary['recomputed']}/{summary['users']} users recomputed "
+        f"in {summary['seconds']}s -> {args.out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Posting lists over catalog metadata.
+
+Built once at load time, so finding the titles for a genre, tag or mood is a
+dict lookup instead of a scan over string columns:
+
+- genre: the catalog's genre column
+- tag: the catalog's tags column (comma-separated cells are split)
+- mood: titles recommended for each mood in mood_recommendations.csv
+
+Values are lowercased. Each posting is a sorted int32 array of catalog rows;
+the same rows are also kept ordered by catalog rating, so top() can hand out
+the best few titles for a value without touching the rest of its list.
+
+Filters combine postings with AND / OR / NOT and parentheses:
+
+    genre:comedy AND NOT watched
+    (tag:"dark humor" OR mood:sad) AND NOT genre:horror
+    comedy AND NOT watched          (a bare value matches any field)
+
+`watched` stands for the user's watch history. A filter evaluates to a
+packed bitset over catalog rows (one bit per title; per-value bitsets are
+cached), so AND/OR/NOT are bitwise operations on catalog_size / 8 bytes, and
+checking a handful of candidate rows against it costs one gather.
+"""
+import csv
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+FIELDS = ("genre", "tag", "mood")
+_EMPTY = np.empty(0, dtype=np.int32)
+BITSET_CACHE_SIZE = 256
+
+
+def _split(cell):
+    return [part.strip().lower() for part in str(cell).split(",") if part.strip()]
+
+
+def _group(column):
+    """value -> sorted catalog rows for a string column (only distinct cells are split)"""
+    cells, inverse = np.unique(np.asarray(column, dtype=str), return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[order], np.arange(len(cells) + 1))
+    parts = {}
+    for i, cell in enumerate(cells):
+        for value in _split(cell):
+            parts.setdefault(value, []).append(order[bounds[i]:bounds[i + 1]])
+    return {value: np.unique(np.concatenate(rows)).astype(np.int32) for value, rows in parts.items()}
+
+
+def _mood_postings(moods_path, movie_id_index):
+    """mood -> sorted rows of the titles recommended for it"""
+    if not moods_path or not os.path.exists(moods_path):
+        print("⚠️  No mood recommendations file; mood postings are empty")
+        return {}
+    movie_ids = {}
+    with open(moods_path, newline="") as f:
+        for record in csv.DictReader(f):
+            try:
+                movie_ids.setdefault(record["mood"].strip().lower(), []).append(int(record["recommended_movie_id"]))
+            except (KeyError, ValueError):
+                continue
+    postings = {}
+    for mood, ids in movie_ids.items():
+        rows = movie_id_index.get_many(np.array(ids))
+        postings[mood] = np.unique(rows[rows >= 0]).astype(np.int32)
+    return postings
+
+
+# -----------------------------
+# Filter expressions
+# -----------------------------
+_TOKEN = re.compile(r'\(|\)|[\w-]+:"[^"]*"|"[^"]*"|[^\s()]+')
+_KEYWORDS = {"and", "or", "not"}
+
+
+def _value(token):
+    return token.strip('"').strip().lower()
+
+
+@lru_cache(maxsize=1024)
+def parse_filter(text):
+    """
+    Parse a filter expression into nested tuples:
+    ("and", a, b), ("or", a, b), ("not", a), ("term", field or None, value), ("watched",).
+    NOT binds tightest, then AND, then OR. Raises ValueError for malformed input.
+    """
+    tokens = _TOKEN.findall(text or "")
+    position = 0
+
+    def peek():
+        return tokens[position].lower() if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def parse_or():
+        node = parse_and()
+        while peek() == "or":
+            take()
+            node = ("or", node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_not()
+        while peek() == "and":
+            take()
+            node = ("and", node, parse_not())
+        return node
+
+    def parse_not():
+        if peek() == "not":
+            take()
+            return ("not", parse_not())
+        return parse_atom()
+
+    def parse_atom():
+        token = peek()
+        if token is None:
+            raise ValueError(f"Invalid filter {text!r}: unexpected end")
+        if token == "(":
+            take()
+            node = parse_or()
+            if peek() != ")":
+                raise ValueError(f"Invalid filter {text!r}: missing ')'")
+            take()
+            return node
+        if token == ")" or token in _KEYWORDS:
+            raise ValueError(f"Invalid filter {text!r}: unexpected {tokens[position]!r}")
+        token = take()
+        if token.lower() == "watched":
+            return ("watched",)
+        field, sep, value = token.partition(":")
+        if sep and not token.startswith('"'):
+            field = field.lower()
+            if field not in FIELDS:
+                raise ValueError(f"Invalid filter {text!r}: unknown field {field!r} (expected one of {FIELDS})")
+            return ("term", field, _value(value))
+        return ("term", None, _value(token))
+
+    node = parse_or()
+    if position != len(tokens):
+        raise ValueError(f"Invalid filter {text!r}: unexpected {tokens[position]!r}")
+    return node
+
+
+def filter_uses_watched(node):
+    return node[0] == "watched" or any(filter_uses_watched(child) for child in node[1:] if isinstance(child, tuple))
+
+
+def positive_terms(node, negated=False):
+    """(field, value) terms a matching title must or may have (those not under a NOT)"""
+    if node[0] == "term":
+        return [] if negated else [node[1:]]
+    if node[0] == "not":
+        return positive_terms(node[1], not negated)
+    return [term for child in node[1:] if isinstance(child, tuple) for term in positive_terms(child, negated)]
+
+
+def build_filter(genres=None, exclude_watched=False):
+    """Filter expression for the /api/chat query parameters (comma-separated genres are OR'ed)"""
+    clauses = []
+    values = [_value(genre) for genre in (genres or "").split(",") if _value(genre)]
+    if values:
+        clauses.append("(" + " OR ".join(f'genre:"{value.replace(chr(34), "")}"' for value in values) + ")")
+    if exclude_watched:
+        clauses.append("NOT watched")
+    return " AND ".join(clauses) or None
+
+
+def bits_contain(bits, rows):
+    """Boolean mask: which of `rows` are set in a packed bitset"""
+    rows = np.asarray(rows, dtype=np.intp)
+    return ((bits[rows >> 3] >> (7 - (rows & 7))) & 1).astype(bool)
+
+
+class MetadataIndex:
+    def __init__(self, catalog_size, postings, ratings):
+        self.catalog_size = catalog_size
+        self.postings = postings  # field -> {value: sorted rows}
+        self._bitsets = OrderedDict()  # (field, value) -> packed bitset, LRU
+        self._bitsets_lock = threading.Lock()
+        # NOT must not set the padding bits past the last row
+        self._all = np.packbits(np.ones(catalog_size, dtype=bool))
+        self._ratings = ratings
+        # Stable sort on rows that are already ascending: equal ratings keep catalog order
+        self._by_rating = {
+            field: {value: rows[np.argsort(-ratings[rows], kind="stable")] for value, rows in values.items()}
+            for field, values in postings.items()
+        }
+
+    @classmethod
+    def build(cls, catalog, movie_id_index, moods_path=None):
+        postings = {
+            "genre": _group(catalog["genre"]),
+            "tag": _group(catalog["tags"]),
+            "mood": _mood_postings(moods_path, movie_id_index),
+        }
+        ratings = np.asarray(catalog["rating"], dtype=np.float64)
+        return cls(ratings.shape[0], postings, ratings)
+
+    def rows(self, field, value):
+        """Sorted catalog rows with this value (empty if none)"""
+        return self.postings[field].get(str(value).strip().lower(), _EMPTY)
+
+    def top(self, field, value, limit):
+        """Up to `limit` rows with this value, best catalog rating first"""
+        return self._by_rating[field].get(str(value).strip().lower(), _EMPTY)[:max(int(limit), 0)]
+
+    def values(self, field):
+        return list(self.postings[field])
+
+    def pack(self, rows):
+        """Packed bitset with the given rows set"""
+        mask = np.zeros(self.catalog_size, dtype=bool)
+        mask[np.asarray(rows, dtype=np.intp)] = True
+        return np.packbits(mask)
+
+    def unpack(self, bits):
+        """Boolean mask over catalog rows"""
+        return np.unpackbits(bits, count=self.catalog_size).astype(bool)
+
+    def bitset(self, field, value):
+        """Packed bitset of one posting (a bare value, field None, matches any field)"""
+        key = (field, value)
+        with self._bitsets_lock:
+            bits = self._bitsets.get(key)
+            if bits is not None:
+                self._bitsets.move_to_end(key)
+                return bits
+        if field is None:
+            bits = np.bitwise_or.reduce([self.bitset(f, value) for f in FIELDS])
+        else:
+            bits = self.pack(self.rows(field, value))
+        with self._bitsets_lock:
+            self._bitsets[key] = bits
+            while len(self._bitsets) > BITSET_CACHE_SIZE:
+                self._bitsets.popitem(last=False)
+        return bits
+
+    def evaluate(self, node, watched_rows=None):
+        """Packed bitset of the rows matching a parsed filter"""
+        kind = node[0]
+        if kind == "term":
+            return self.bitset(node[1], node[2])
+        if kind == "watched":
+            return self.pack(() if watched_rows is None else watched_rows)
+        if kind == "not":
+            return np.bitwise_and(np.bitwise_not(self.evaluate(node[1], watched_rows)), self._all)
+        combine = np.bitwise_and if kind == "and" else np.bitwise_or
+        return combine(self.evaluate(node[1], watched_rows), self.evaluate(node[2], watched_rows))
+
+    def best_rated(self, bits, limit):
+        """Up to `limit` matching rows, best catalog rating first (scans the bitset)"""
+        rows = np.flatnonzero(self.unpack(bits))
+        if rows.shape[0] > limit:
+            rows = rows[np.argpartition(-self._ratings[rows], limit - 1)[:limit]]
+        return rows
+
+    def stats(self):
+        return {
+            **{field: len(values) for field, values in self.postings.items()},
+            "cached_bitsets": len(self._bitsets),
+        }
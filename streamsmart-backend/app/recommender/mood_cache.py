@@ -0,0 +1,121 @@
+"""
+Two-tier cache for LLM mood extraction results.
+
+Tier 1 is an in-process LRU; tier 2 is a SQLite file that survives restarts
+and is shared by all workers on the host. Entries are keyed by the normalized
+prompt and the model/deployment that produced them, so switching deployments
+never serves another model's answers.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.recommender.result_cache import MISSING, TTLCache, normalize_prompt
+
+
+class MoodCache:
+    def __init__(self, path, maxsize=4096):
+        self.path = path
+        self.memory = TTLCache(maxsize=maxsize, ttl=float("inf"))
+        self.disk_hits = 0
+        self.misses = 0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self.saved_seconds = 0.0  # sum of the original LLM latency of every hit
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        # Opened lazily so importing the module never touches the filesystem
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS mood_cache ("
+                " prompt TEXT NOT NULL,"
+                " model TEXT NOT NULL,"
+                " result TEXT NOT NULL,"
+                " llm_seconds REAL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (prompt, model))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get(self, prompt, model):
+        """Cached mood dict for (prompt, model), or None"""
+        cached = self.get_memory(prompt, model)
+        if cached is not None:
+            return cached
+        return self.get_disk(prompt, model)
+
+    def get_memory(self, prompt, model):
+        """Tier 1 only (never touches disk, safe on the event loop); None on a miss"""
+        entry = self.memory.get((normalize_prompt(prompt), model))
+        if entry is MISSING:
+            return None
+        result, llm_seconds = entry
+        with self._lock:
+            self.saved_seconds += llm_seconds or 0.0
+        return dict(result)
+
+    def get_disk(self, prompt, model):
+        """Tier 2 lookup after a tier 1 miss (blocking SQLite read); promotes hits to tier 1"""
+        key = (normalize_prompt(prompt), model)
+        try:
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT result, llm_seconds FROM mood_cache WHERE prompt = ? AND model = ?", key
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠️  Mood cache read failed: {e}")
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self.saved_seconds += row[1] or 0.0
+        result = json.loads(row[0])
+        self.memory.set(key, (result, row[1]))
+        return dict(result)
+
+    def put(self, prompt, model, result, llm_seconds=None):
+        """Store an LLM result; llm_seconds feeds the saved-latency estimate"""
+        key = (normalize_prompt(prompt), model)
+        self.memory.set(key, (dict(result), llm_seconds))
+        with self._lock:
+            if llm_seconds is not None:
+                self.llm_calls += 1
+                self.llm_seconds += llm_seconds
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO mood_cache (prompt, model, result, llm_seconds, created_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key[0], key[1], json.dumps(result), llm_seconds, time.time())
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️  Mood cache write failed: {e}")
+
+    def stats(self):
+        memory = self.memory.stats()
+        with self._lock:
+            hits = memory["hits"] + self.disk_hits
+            lookups = hits + self.misses
+            avg_llm_ms = self.llm_seconds / self.llm_calls * 1000 if self.llm_calls else 0.0
+            return {
+                "memory_hits": memory["hits"],
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_size": memory["size"],
+                "llm_calls": self.llm_calls,
+                "avg_llm_latency_ms": round(avg_llm_ms, 1),
+                "saved_latency_ms": round(self.saved_seconds * 1000, 1),
+            }
@@ -0,0 +1,280 @@
+"""
+Local distilled mood classifier
+===============================
+A small CPU-only text classifier trained offline on prompts the LLM has
+already labelled, so most prompts never need an LLM round trip.
+
+Training (scikit-learn, offline only):
+
+- features: word unigrams + bigrams, sublinear TF-IDF, L2-normalized
+- one multinomial LogisticRegression head for mood and one for tone
+- labels come from the LLM mood cache (SQLite) and/or the conversation log
+
+The fitted vocabulary, idf weights and head coefficients are exported to a
+single .npz. Serving is plain NumPy: tokenize, gather the weight rows of the
+prompt's terms and take a softmax, which costs tens of microseconds and needs
+no network. predict() also returns a confidence (the lower of the two heads'
+top probabilities) so the caller can escalate uncertain prompts to the LLM.
+
+    python -m app.recommender.mood_classifier train [--cache PATH] [--conversations PATH] [--model KEY] [--out PATH]
+    python -m app.recommender.mood_classifier predict "feeling low, something cosy"
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import time
+
+import numpy as np
+
+from app.recommender.result_cache import normalize_prompt
+
+base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+DEFAULT_CLASSIFIER_PATH = os.path.join(base_dir, "data", "mood_classifier.npz")
+DEFAULT_CACHE_PATH = os.path.join(base_dir, "data", "mood_cache.sqlite3")
+DEFAULT_CONVERSATIONS_PATH = os.path.join(base_dir, "data", "conversations.jsonl")
+
+HEADS = ("mood", "tone")
+
+# Same tokens scikit-learn's default token_pattern produces, so training and serving agree
+_TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+
+
+def _terms(text):
+    tokens = _TOKEN_RE.findall(text.lower())
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class MoodClassifier:
+    def __init__(self, terms, idf, heads):
+        """
+        terms: vocabulary in column order; idf: weight per column;
+        heads: {"mood": (classes, weights (n_terms, n_classes), bias), "tone": ...}
+        """
+        self.terms = [str(t) for t in terms]
+        self.vocabulary = {term: col for col, term in enumerate(self.terms)}
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self.heads = {
+            name: ([str(c) for c in classes], np.asarray(weights, dtype=np.float64), np.asarray(bias, dtype=np.float64))
+            for name, (classes, weights, bias) in heads.items()
+        }
+        # Both heads side by side so a prompt costs one row gather and one mat-vec
+        self._weights = np.hstack([weights for _, weights, _ in self.heads.values()])
+        self._bias = np.concatenate([bias for _, _, bias in self.heads.values()])
+        bounds = np.cumsum([0] + [len(classes) for classes, _, _ in self.heads.values()])
+        self._slices = {name: slice(bounds[i], bounds[i + 1]) for i, name in enumerate(self.heads)}
+
+    def _vectorize(self, text):
+        counts = {}
+        for term in _terms(text):
+            col = self.vocabulary.get(term)
+            if col is not None:
+                counts[col] = counts.get(col, 0) + 1
+        cols = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        values = (1.0 + np.log(tf)) * self.idf[cols]
+        norm = np.sqrt(values @ values)
+        if norm > 0:
+            values /= norm
+        return cols, values
+
+    def predict_proba(self, text):
+        """{head: (classes, probabilities)} for one prompt"""
+        cols, values = self._vectorize(text)
+        all_logits = values @ self._weights[cols] + self._bias
+        result = {}
+        for name, (classes, _, _) in self.heads.items():
+            logits = all_logits[self._slices[name]]
+            logits -= logits.max()
+            probabilities = np.exp(logits)
+            probabilities /= probabilities.sum()
+            result[name] = (classes, probabilities)
+        return result
+
+    def predict(self, text):
+        """({"mood": ..., "tone": ...}, confidence) where confidence is the weaker head's top probability"""
+        answer = {}
+        confidence = 1.0
+        for name, (classes, probabilities) in self.predict_proba(text).items():
+            best = int(probabilities.argmax())
+            answer[name] = classes[best]
+            confidence = min(confidence, float(probabilities[best]))
+        return answer, confidence
+
+    def save(self, path):
+        arrays = {"terms": np.array(self.terms, dtype=str), "idf": self.idf}
+        for name, (classes, weights, bias) in self.heads.items():
+            arrays[f"{name}_classes"] = np.array(classes, dtype=str)
+            arrays[f"{name}_weights"] = weights
+            arrays[f"{name}_bias"] = bias
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path=DEFAULT_CLASSIFIER_PATH):
+        with np.load(path) as data:
+            heads = {
+                name: (data[f"{name}_classes"], data[f"{name}_weights"], data[f"{name}_bias"])
+                for name in HEADS
+            }
+            return cls(data["terms"], data["idf"], heads)
+
+
+# -----------------------------
+# Offline training
+# -----------------------------
+def load_labels_from_cache(path=DEFAULT_CACHE_PATH, model=None):
+    """(prompt, mood, tone) rows from the LLM mood cache, optionally for one model key"""
+    if not os.path.exists(path):
+        return []
+    conn = sqlite3.connect(path)
+    try:
+        query = "SELECT prompt, result FROM mood_cache"
+        rows = conn.execute(query + " WHERE model = ?", (model,)) if model else conn.execute(query)
+        examples = []
+        for prompt, result in rows:
+            mood = json.loads(result)
+            examples.append((prompt, str(mood.get("mood", "neutral")).lower(), str(mood.get("tone", "neutral")).lower()))
+        return examples
+    finally:
+        conn.close()
+
+
+def load_labels_from_conversations(path=DEFAULT_CONVERSATIONS_PATH):
+    """
+    (prompt, mood, tone) rows from the conversation log (conversations.jsonl,
+    or the older conversations.json).
+
+    Only useful for conversations logged while an LLM mode was active;
+    rule-based labels would just teach the classifier the rules.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        if path.endswith(".jsonl"):
+            entries = [json.loads(line) for line in f if line.strip()]
+        else:
+            entries = [entry for user_entries in json.load(f).values() for entry in user_entries]
+    examples = []
+    for entry in entries:
+        mood = entry.get("mood") or {}
+        if entry.get("message") and "mood" in mood:
+            examples.append((
+                entry["message"],
+                str(mood["mood"]).lower(),
+                str(mood.get("tone", "neutral")).lower()
+            ))
+    return examples
+
+
+def _dedupe(examples):
+    # Later labels win (the cache is read first, conversations after)
+    latest = {}
+    for prompt, mood, tone in examples:
+        latest[normalize_prompt(prompt)] = (mood, tone)
+    return [(prompt, mood, tone) for prompt, (mood, tone) in latest.items()]
+
+
+def _fit_head(features, labels):
+    """Weights (n_terms, n_classes) and bias for one head; a single-class head always predicts it"""
+    from sklearn.linear_model import LogisticRegression
+
+    classes = sorted(set(labels))
+    if len(classes) == 1:
+        return classes, np.zeros((features.shape[1], 1)), np.zeros(1)
+    model = LogisticRegression(max_iter=1000, C=10.0)
+    model.fit(features, labels)
+    weights, bias = model.coef_.T, model.intercept_
+    if len(model.classes_) == 2:
+        # Binary LR keeps one logit for classes_[1]; softmax([0, z]) == sigmoid(z)
+        weights = np.hstack([np.zeros_like(weights), weights])
+        bias = np.concatenate([[0.0], bias])
+    return list(model.classes_), weights, bias
+
+
+def train_mood_classifier(examples):
+    """Fit TF-IDF + one linear head per label on (prompt, mood, tone) rows"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    prompts = [prompt for prompt, _, _ in examples]
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True)
+    features = vectorizer.fit_transform(prompts)
+    terms = np.empty(len(vectorizer.vocabulary_), dtype=object)
+    for term, col in vectorizer.vocabulary_.items():
+        terms[col] = term
+
+    heads = {}
+    for i, name in enumerate(HEADS, start=1):
+        heads[name] = _fit_head(features, [row[i] for row in examples])
+    return MoodClassifier(terms, vectorizer.idf_, heads)
+
+
+def evaluate(classifier, examples, threshold):
+    """Accuracy on all rows and on the rows the classifier would answer itself"""
+    correct = confident = confident_correct = 0
+    for prompt, mood, tone in examples:
+        answer, confidence = classifier.predict(prompt)
+        hit = answer["mood"] == mood and answer["tone"] == tone
+        correct += hit
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += hit
+    n = len(examples)
+    return {
+        "examples": n,
+        "accuracy": correct / n if n else 0.0,
+        "answered_locally": confident / n if n else 0.0,
+        "local_accuracy": confident_correct / confident if confident else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train or try the local mood classifier")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train = subparsers.add_parser("train", help="Train on LLM-labelled prompts")
+    train.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="Mood cache SQLite file ('' to skip)")
+    train.add_argument("--conversations", default="", help=f"Conversation log to add (e.g. {DEFAULT_CONVERSATIONS_PATH})")
+    train.add_argument("--model", default=None, help="Only use cache rows from this model key (e.g. azure:gpt-4o-mini)")
+    train.add_argument("--out", default=DEFAULT_CLASSIFIER_PATH, help="Output .npz")
+    train.add_argument("--threshold", type=float, default=float(os.getenv("MOOD_CLASSIFIER_THRESHOLD", "0.6")))
+    train.add_argument("--min-examples", type=int, default=50)
+    predict = subparsers.add_parser("predict", help="Classify one prompt with a trained model")
+    predict.add_argument("prompt")
+    predict.add_argument("--model-path", default=DEFAULT_CLASSIFIER_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "predict":
+        classifier = MoodClassifier.load(args.model_path)
+        start = time.perf_counter()
+        answer, confidence = classifier.predict(args.prompt)
+        print(f"{answer} confidence={confidence:.3f} ({(time.perf_counter() - start) * 1e6:.0f} µs)")
+        return
+
+    examples = []
+    if args.cache:
+        examples += load_labels_from_cache(args.cache, args.model)
+    if args.conversations:
+        examples += load_labels_from_conversations(args.conversations)
+    examples = _dedupe(examples)
+    if len(examples) < args.min_examples:
+        raise SystemExit(f"❌ Only {len(examples)} labelled prompts (need {args.min_examples})")
+    print(f"📊 {len(examples)} labelled prompts")
+
+    # Hold out every 5th prompt to report accuracy, then refit on everything
+    holdout = examples[::5]
+    report = evaluate(train_mood_classifier([e for i, e in enumerate(examples) if i % 5]), holdout, args.threshold)
+    print(
+        f"✅ Holdout: accuracy {report['accuracy']:.2%}, "
+        f"{report['answered_locally']:.2%} answered locally at threshold {args.threshold} "
+        f"with {report['local_accuracy']:.2%} accuracy"
+    )
+
+    start = time.perf_counter()
+    classifier = train_mood_classifier(examples)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    classifier.save(args.out)
+    print(f"✅ Mood classifier ({len(classifier.terms)} terms) written to {args.out} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,28 @@
 import os
-from textblob import TextBlob
+import asyncio
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from app.recommender.mood_cache import MoodCache
+from app.recommender.result_cache import normalize_prompt
+from app.recommender.circuit_breaker import CircuitBreaker
+from app.recommender.mood_rules import MoodRuleMatcher, load_lexicon
 
 # Detect which AI service is available (priority order)
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
 AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o-mini")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MODEL = "gpt-4o-mini"
+
+base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# LLM answers are cached per (normalized prompt, model/deployment), in memory and on disk
+mood_cache = MoodCache(
+    path=os.getenv("MOOD_CACHE_PATH") or os.path.join(base_dir, "data", "mood_cache.sqlite3"),
+    maxsize=int(os.getenv("MOOD_CACHE_SIZE", "4096"))
+)
 
 # Determine which mode to use
 if AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_KEY:
@@ -19,121 +35,528 @@ else:
     USE_MODE = "rule_based"
     print("ℹ️  Using rule-based mood extraction (no API key configured)")
 
+# The LLM provider (or rule_based) behind USE_MODE; the local classifier escalates to it
+LLM_MODE = USE_MODE
+
+# Opt-in local classifier (see mood_classifier.py): answers confident prompts itself
+MOOD_CLASSIFIER_PATH = os.getenv("MOOD_CLASSIFIER_PATH") or os.path.join(base_dir, "data", "mood_classifier.npz")
+MOOD_CLASSIFIER_THRESHOLD = float(os.getenv("MOOD_CLASSIFIER_THRESHOLD", "0.6"))
+mood_classifier = None
+if os.getenv("MOOD_EXTRACTION_MODE", "").lower() == "local_classifier":
+    from app.recommender.mood_classifier import MoodClassifier
+    try:
+        mood_classifier = MoodClassifier.load(MOOD_CLASSIFIER_PATH)
+        USE_MODE = "local_classifier"
+        if LLM_MODE == "rule_based":
+            print("✅ Using local mood classifier (no LLM configured, answers every prompt)")
+        else:
+            print(f"✅ Using local mood classifier (escalates to {LLM_MODE} below {MOOD_CLASSIFIER_THRESHOLD:.2f} confidence)")
+    except (OSError, KeyError, ValueError) as e:
+        print(f"⚠️  Local mood classifier unavailable ({e}), using {LLM_MODE}")
+
 def get_active_mode():
     """Return which mood extraction mode is active"""
     return USE_MODE
 
-def extract_mood_with_azure_openai(prompt: str):
+# -----------------------------
+# Long-lived LLM clients (one connection pool per process, reused across requests)
+# -----------------------------
+AZURE_OPENAI_API_VERSION = "2024-02-15-preview"
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+# SDK-level retries; the mood deadline and circuit breaker already bound failures
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "0"))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _http_limits():
+    import httpx
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+        keepalive_expiry=60.0
+    )
+
+
+def _llm_client(use_async: bool):
+    """Return the shared (Async)AzureOpenAI / (Async)OpenAI client for the active mode"""
+    key = (LLM_MODE, use_async)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _clients_lock:
+        if key not in _clients:
+            import httpx
+            import openai
+
+            if use_async:
+                http_client = httpx.AsyncClient(limits=_http_limits(), timeout=LLM_TIMEOUT_SECONDS)
+            else:
+                http_client = httpx.Client(limits=_http_limits(), timeout=LLM_TIMEOUT_SECONDS)
+
+            if LLM_MODE == "azure_openai":
+                print(f"🔧 Azure OpenAI Config:")
+                print(f"   Endpoint: {AZURE_OPENAI_ENDPOINT}")
+                print(f"   Deployment: {AZURE_OPENAI_DEPLOYMENT}")
+                print(f"   Key: {'*' * 20}...{AZURE_OPENAI_KEY[-4:] if AZURE_OPENAI_KEY else 'None'}")
+                client_class = openai.AsyncAzureOpenAI if use_async else openai.AzureOpenAI
+                _clients[key] = client_class(
+                    api_key=AZURE_OPENAI_KEY,
+                    api_version=AZURE_OPENAI_API_VERSION,
+                    azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                    http_client=http_client,
+                    max_retries=LLM_MAX_RETRIES
+                )
+            else:
+                client_class = openai.AsyncOpenAI if use_async else openai.OpenAI
+                _clients[key] = client_class(api_key=OPENAI_API_KEY, http_client=http_client, max_retries=LLM_MAX_RETRIES)
+            print(f"✅ {'Async' if use_async else 'Sync'} LLM client created (pooled, keep-alive)")
+        return _clients[key]
+
+
+async def close_llm_clients():
+    """Close pooled connections (call on app shutdown)"""
+    with _clients_lock:
+        clients = list(_clients.items())
+        _clients.clear()
+    for (_, use_async), client in clients:
+        if use_async:
+            await client.close()
+        else:
+            client.close()
+
+
+# -----------------------------
+# Prompts and response parsing (shared by the sync and async paths)
+# -----------------------------
+def _azure_openai_request(prompt: str):
+    return dict(
+        model=AZURE_OPENAI_DEPLOYMENT,
+        messages=[
+            {
+                "role": "system",
+                "content": "You are a JSON-only assistant. Extract mood and tone from text. ONLY return valid JSON, no markdown, no explanation."
+            },
+            {
+                "role": "user",
+                "content": f"Extract mood (happy/sad/calm/energetic/neutral) and tone (light/intense/neutral) from: '{prompt}'. Return ONLY this exact JSON format: {{\"mood\": \"value\", \"tone\": \"value\"}}"
+            }
+        ],
+        temperature=0.3,
+        max_tokens=50
+    )
+
+
+def _openai_request(prompt: str):
+    return dict(
+        model=OPENAI_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": "You are an assistant that identifies mood and tone from user prompts for a movie recommendation system."
+            },
+            {
+                "role": "user",
+                "content": f"Extract the user's mood (like happy, sad, relaxed, energetic, etc.) and preferred tone (light-hearted, serious, intense) from this text: '{prompt}'. Respond only in JSON with keys 'mood' and 'tone'."
+            }
+        ],
+        temperature=0.7,
+        max_tokens=100
+    )
+
+
+def _parse_llm_json(content: str):
+    """Parse a JSON answer, tolerating markdown code fences"""
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0].strip()
+    return json.loads(content.strip())
+
+
+def _llm_request(prompt: str):
+    if LLM_MODE == "azure_openai":
+        return f"azure:{AZURE_OPENAI_DEPLOYMENT}", _azure_openai_request(prompt)
+    return f"openai:{OPENAI_MODEL}", _openai_request(prompt)
+
+
+def _check_mood(result):
+    if not isinstance(result, dict) or "mood" not in result:
+        raise ValueError(f"Unexpected LLM response: {result!r}")
+    return result
+
+
+# -----------------------------
+# Resilience: latency budget + circuit breaker around the LLM
+# -----------------------------
+MOOD_LLM_DEADLINE_SECONDS = float(os.getenv("MOOD_LLM_DEADLINE_MS", "2500")) / 1000
+
+llm_breaker = CircuitBreaker(
+    "Mood LLM",
+    failure_threshold=int(os.getenv("MOOD_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("MOOD_BREAKER_RESET_SECONDS", "30"))
+)
+
+# Sync callers wait on a future so the deadline holds; a late answer still lands in the cache
+_llm_executor = ThreadPoolExecutor(max_workers=min(LLM_MAX_CONNECTIONS, 32), thread_name_prefix="mood-llm")
+
+_extraction_stats = {
+    "extractions": 0, "llm_requests": 0, "llm_answers": 0,
+    "deadline": 0, "error": 0, "malformed": 0, "circuit_open": 0,
+    "batch_calls": 0, "batched_prompts": 0,
+    "local_answers": 0, "local_escalations": 0
+}
+_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        _extraction_stats[key] += 1
+
+
+def get_extraction_stats():
+    """Deadline, breaker state and fallback rate for /api/status"""
+    with _stats_lock:
+        stats = dict(_extraction_stats)
+    fallbacks = stats["deadline"] + stats["error"] + stats["malformed"] + stats["circuit_open"]
+    local_total = stats["local_answers"] + stats["local_escalations"]
+    return {
+        "deadline_ms": round(MOOD_LLM_DEADLINE_SECONDS * 1000),
+        "circuit_breaker": llm_breaker.stats(),
+        "uncached_extractions": stats["extractions"],
+        "llm_requests": stats["llm_requests"],
+        "llm_answers": stats["llm_answers"],
+        "fallbacks": {
+            "deadline": stats["deadline"], "error": stats["error"],
+            "malformed": stats["malformed"], "circuit_open": stats["circuit_open"]
+        },
+        "fallback_rate": round(fallbacks / stats["extractions"], 4) if stats["extractions"] else 0.0,
+        "batching": {
+            "window_ms": round(MOOD_BATCH_WINDOW_SECONDS * 1000, 1),
+            "max_batch_size": MOOD_BATCH_MAX_SIZE,
+            "llm_calls": stats["batch_calls"],
+            "prompts": stats["batched_prompts"],
+            "avg_batch_size": round(stats["batched_prompts"] / stats["batch_calls"], 2) if stats["batch_calls"] else 0.0,
+        },
+        "local_classifier": {
+            "enabled": mood_classifier is not None,
+            "threshold": MOOD_CLASSIFIER_THRESHOLD,
+            "answered": stats["local_answers"],
+            "escalated": stats["local_escalations"],
+            "escalation_rate": round(stats["local_escalations"] / local_total, 4) if local_total else 0.0,
+        },
+    }
+
+
+def _fallback(reason, fallback, error=None):
+    _count(reason)
+    if reason in ("error", "malformed"):
+        print(f"⚠️  {LLM_MODE} mood extraction failed ({type(error).__name__}: {error}), using rule-based result")
+    elif reason == "deadline":
+        print(f"⚠️  {LLM_MODE} mood extraction missed the {MOOD_LLM_DEADLINE_SECONDS * 1000:.0f} ms deadline, using rule-based result")
+    return fallback
+
+
+def _store(prompt, model_key, content, started):
+    result = _check_mood(_parse_llm_json(content))
+    mood_cache.put(prompt, model_key, result, llm_seconds=time.perf_counter() - started)
+    print(f"🎭 {model_key} extracted mood: {result}")
+    return result
+
+
+def _call_llm(prompt, model_key, request):
+    started = time.perf_counter()
+    response = _llm_client(use_async=False).chat.completions.create(**request)
+    return _store(prompt, model_key, response.choices[0].message.content, started)
+
+
+async def _call_llm_async(prompt, model_key, request):
+    started = time.perf_counter()
+    response = await _llm_client(use_async=True).chat.completions.create(**request)
+    # The cache write goes to SQLite; keep it off the event loop
+    return await asyncio.to_thread(_store, prompt, model_key, response.choices[0].message.content, started)
+
+
+# -----------------------------
+# Micro-batching: coalesce concurrent async prompts into one chat completion
+# -----------------------------
+MOOD_BATCH_WINDOW_SECONDS = float(os.getenv("MOOD_BATCH_WINDOW_MS", "5")) / 1000
+MOOD_BATCH_MAX_SIZE = int(os.getenv("MOOD_BATCH_MAX_SIZE", "16"))
+
+
+def _batch_request(prompts):
+    """One completion that answers a numbered list of prompts with a JSON array"""
+    if LLM_MODE == "azure_openai":
+        labels = "mood (happy/sad/calm/energetic/neutral) and tone (light/intense/neutral)"
+        model, temperature = AZURE_OPENAI_DEPLOYMENT, 0.3
+    else:
+        labels = "mood (like happy, sad, relaxed, energetic, etc.) and preferred tone (light-hearted, serious, intense)"
+        model, temperature = OPENAI_MODEL, 0.7
+    numbered = "\n".join(f"{i}. {' '.join(prompt.split())}" for i, prompt in enumerate(prompts, 1))
+    return dict(
+        model=model,
+        messages=[
+            {
+                "role": "system",
+                "content": "You are a JSON-only assistant. Extract mood and tone from each numbered text. ONLY return valid JSON, no markdown, no explanation."
+            },
+            {
+                "role": "user",
+                "content": f"For each numbered text below, extract {labels}. Return ONLY a JSON array with exactly {len(prompts)} objects in the same order, each in this format: {{\"mood\": \"value\", \"tone\": \"value\"}}\n\n{numbered}"
+            }
+        ],
+        temperature=temperature,
+        max_tokens=20 + 30 * len(prompts)
+    )
+
+
+class _BatchFailed(Exception):
+    """The shared batched request failed (counted against the breaker by the batcher)"""
+
+
+class _MoodBatcher:
     """
-    Uses Azure OpenAI GPT model to extract mood and tone
+    Collects prompts that arrive within MOOD_BATCH_WINDOW_MS (up to
+    MOOD_BATCH_MAX_SIZE) and sends them as a single structured request.
+
+    Each caller gets its own future: a prompt whose array item is missing or
+    malformed fails with ValueError (so that caller alone falls back to the
+    rule-based answer); a failed request fails every caller in the batch with
+    _BatchFailed. A batch of one uses the regular single-prompt request.
+
+    The batcher does the breaker accounting, once per LLM call rather than
+    once per waiting caller: a call that fails or runs past
+    MOOD_LLM_DEADLINE_MS is one failure, any other answer (even malformed
+    JSON) one success.
+    """
+
+    def __init__(self):
+        self._pending = []  # (prompt, future)
+        self._timer = None
+        self._tasks = set()  # in-flight _send tasks; the loop only keeps weak references
+
+    async def submit(self, prompt: str):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((prompt, future))
+        if len(self._pending) >= MOOD_BATCH_MAX_SIZE:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(MOOD_BATCH_WINDOW_SECONDS, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        # Identical prompts in one window share a slot
+        slots = {}
+        for prompt, future in batch:
+            slots.setdefault(normalize_prompt(prompt), (prompt, []))[1].append(future)
+        prompts = [prompt for prompt, _ in slots.values()]
+        model_key, request = _llm_request(prompts[0])
+        late = []
+
+        def missed_deadline():
+            # Callers stop waiting now; the call counts as one failure however many were waiting
+            late.append(True)
+            llm_breaker.record_failure()
+
+        deadline = asyncio.get_running_loop().call_later(MOOD_LLM_DEADLINE_SECONDS, missed_deadline)
+
+        failed = False
+        try:
+            if len(prompts) == 1:
+                results = [await _call_llm_async(prompts[0], model_key, request)]
+            else:
+                results = await self._call_batch(prompts, model_key)
+        except ValueError as e:
+            # The endpoint answered, just not with usable JSON: not an outage
+            results = [e] * len(prompts)
+        except Exception as e:
+            failed = True
+            results = [_BatchFailed(e)] * len(prompts)
+        finally:
+            deadline.cancel()
+        if not late:
+            if failed:
+                llm_breaker.record_failure()
+            else:
+                llm_breaker.record_success()
+
+        for (prompt, futures), result in zip(slots.values(), results):
+            for future in futures:
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(dict(result))
+
+    async def _call_batch(self, prompts, model_key):
+        _count("batch_calls")
+        with _stats_lock:
+            _extraction_stats["batched_prompts"] += len(prompts)
+        started = time.perf_counter()
+        response = await _llm_client(use_async=True).chat.completions.create(**_batch_request(prompts))
+        elapsed = time.perf_counter() - started
+        answers = _parse_llm_json(response.choices[0].message.content)
+        if not isinstance(answers, list):
+            raise ValueError(f"Expected a JSON array from batched mood request, got {type(answers).__name__}")
+
+        results = []
+        for i, prompt in enumerate(prompts):
+            try:
+                result = _check_mood(answers[i] if i < len(answers) else None)
+            except ValueError as e:
+                results.append(e)
+                continue
+            # Each prompt is charged an equal share of the call for saved-latency accounting
+            mood_cache.put(prompt, model_key, result, llm_seconds=elapsed / len(prompts))
+            results.append(result)
+        print(f"🎭 {model_key} extracted {len(prompts)} moods in one call")
+        return results
+
+
+_batcher = _MoodBatcher()
+
+
+def _llm_mood(prompt: str):
+    """
+    Cached LLM mood extraction bounded by MOOD_LLM_DEADLINE_MS; never raises.
+
+    The rule-based answer is computed up front and returned if the LLM is
+    slow, failing, or its circuit breaker is open.
     """
+    model_key, request = _llm_request(prompt)
+    cached = mood_cache.get(prompt, model_key)
+    if cached is not None:
+        return cached
+    _count("extractions")
+    fallback = extract_mood_rule_based(prompt)
+    if not llm_breaker.allow_request():
+        return _fallback("circuit_open", fallback)
+    _count("llm_requests")
+    future = _llm_executor.submit(_call_llm, prompt, model_key, request)
     try:
-        from openai import AzureOpenAI
-        
-        print(f"🔧 Azure OpenAI Config:")
-        print(f"   Endpoint: {AZURE_OPENAI_ENDPOINT}")
-        print(f"   Deployment: {AZURE_OPENAI_DEPLOYMENT}")
-        print(f"   Key: {'*' * 20}...{AZURE_OPENAI_KEY[-4:] if AZURE_OPENAI_KEY else 'None'}")
-        
-        client = AzureOpenAI(
-            api_key=AZURE_OPENAI_KEY,
-            api_version="2024-02-15-preview",
-            azure_endpoint=AZURE_OPENAI_ENDPOINT
-        )
-        
-        print(f"✅ Client created, making API call...")
-        
-        response = client.chat.completions.create(
-            model=AZURE_OPENAI_DEPLOYMENT,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a JSON-only assistant. Extract mood and tone from text. ONLY return valid JSON, no markdown, no explanation."
-                },
-                {
-                    "role": "user",
-                    "content": f"Extract mood (happy/sad/calm/energetic/neutral) and tone (light/intense/neutral) from: '{prompt}'. Return ONLY this exact JSON format: {{\"mood\": \"value\", \"tone\": \"value\"}}"
-                }
-            ],
-            temperature=0.3,
-            max_tokens=50
-        )
-        
-        content = response.choices[0].message.content
-        print(f"📄 Raw response: {content}")
-        
-        # Strip markdown code blocks if present
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
-        
-        # Parse JSON
-        content = content.strip()
-        result = json.loads(content)
-        print(f"🎭 Azure OpenAI extracted mood: {result}")
-        return result
-        
+        result = future.result(timeout=MOOD_LLM_DEADLINE_SECONDS)
+    except FutureTimeoutError:
+        llm_breaker.record_failure()
+        return _fallback("deadline", fallback)
+    except ValueError as e:
+        # The endpoint answered, just not with usable JSON: not an outage (and a half-open probe is over)
+        llm_breaker.record_success()
+        return _fallback("malformed", fallback, e)
     except Exception as e:
-        import traceback
-        print(f"❌ Azure OpenAI FAILED!")
-        print(f"   Error Type: {type(e).__name__}")
-        print(f"   Error Message: {str(e)}")
-        print(f"   Traceback:")
-        traceback.print_exc()
-        print(f"⚠️  Falling back to rule-based extraction")
-        return extract_mood_rule_based(prompt)
+        llm_breaker.record_failure()
+        return _fallback("error", fallback, e)
+    llm_breaker.record_success()
+    _count("llm_answers")
+    return result
+
+
+async def _llm_mood_async(prompt: str):
+    """Async twin of _llm_mood on the pooled async client; never blocks a thread on the network"""
+    model_key, request = _llm_request(prompt)
+    # Tier 1 inline; the SQLite tier is blocking I/O, so it runs in a worker thread
+    cached = mood_cache.get_memory(prompt, model_key)
+    if cached is None:
+        cached = await asyncio.to_thread(mood_cache.get_disk, prompt, model_key)
+    if cached is not None:
+        return cached
+    _count("extractions")
+    fallback = extract_mood_rule_based(prompt)
+    if not llm_breaker.allow_request():
+        return _fallback("circuit_open", fallback)
+    _count("llm_requests")
+    # Batched calls are counted against the breaker by the batcher, once per LLM call
+    batched = MOOD_BATCH_WINDOW_SECONDS > 0
+    if batched:
+        task = asyncio.ensure_future(_batcher.submit(prompt))
+    else:
+        task = asyncio.ensure_future(_call_llm_async(prompt, model_key, request))
+    done, _ = await asyncio.wait({task}, timeout=MOOD_LLM_DEADLINE_SECONDS)
+    if not done:
+        # Let it finish in the background so the answer is cached for next time
+        task.add_done_callback(_consume_late_result)
+        if not batched:
+            llm_breaker.record_failure()
+        return _fallback("deadline", fallback)
+    try:
+        result = task.result()
+    except ValueError as e:
+        if not batched:
+            # The endpoint answered, just not with usable JSON (and a half-open probe is over)
+            llm_breaker.record_success()
+        return _fallback("malformed", fallback, e)
+    except _BatchFailed as e:
+        return _fallback("error", fallback, e.args[0])
+    except Exception as e:
+        if not batched:
+            llm_breaker.record_failure()
+        return _fallback("error", fallback, e)
+    if not batched:
+        llm_breaker.record_success()
+    _count("llm_answers")
+    return result
+
+
+def _consume_late_result(task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"⚠️  Late mood LLM call failed: {task.exception()}")
+
+
+def extract_mood_with_azure_openai(prompt: str):
+    """
+    Uses Azure OpenAI GPT model to extract mood and tone
+    """
+    return _llm_mood(prompt)
+
 
 def extract_mood_with_openai(prompt: str):
     """
     Uses regular OpenAI API to extract mood and tone
     """
-    try:
-        from openai import OpenAI
-        
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an assistant that identifies mood and tone from user prompts for a movie recommendation system."
-                },
-                {
-                    "role": "user",
-                    "content": f"Extract the user's mood (like happy, sad, relaxed, energetic, etc.) and preferred tone (light-hearted, serious, intense) from this text: '{prompt}'. Respond only in JSON with keys 'mood' and 'tone'."
-                }
-            ],
-            temperature=0.7,
-            max_tokens=100
-        )
-        
-        content = response.choices[0].message.content
-        result = json.loads(content)
-        print(f"🎭 OpenAI extracted mood: {result}")
-        return result
-        
-    except Exception as e:
-        print(f"⚠️  OpenAI API failed: {e}")
-        print("   Falling back to rule-based extraction")
-        return extract_mood_rule_based(prompt)
+    return _llm_mood(prompt)
+
+
+# Compiled once from the lexicon (MOOD_LEXICON_PATH overrides the built-in word lists)
+rule_matcher = MoodRuleMatcher(load_lexicon(os.getenv("MOOD_LEXICON_PATH")))
 
 
 def extract_mood_rule_based(prompt: str):
     """
     Simple fallback rule-based mood extraction.
     """
-    prompt = prompt.lower()
-    if any(word in prompt for word in ["sad", "bad", "lonely"]):
-        return {"mood": "happy", "tone": "light-hearted"}
-    if any(word in prompt for word in ["tired", "lazy", "bored", "lethargic"]):
-        return {"mood": "relaxed", "tone": "light-hearted"}
-    if any(word in prompt for word in ["excited", "energetic", "thrill"]):
-        return {"mood": "energetic", "tone": "intense"}
-    if any(word in prompt for word in ["romantic", "love"]):
-        return {"mood": "romantic", "tone": "light-hearted"}
-    return {"mood": "neutral", "tone": "neutral"}
+    return rule_matcher.match(prompt)
+
+
+def extract_mood_batch(prompts):
+    """
+    Rule-based mood extraction for many prompts in one call
+    (offline replay, warm-up). Returns one {"mood", "tone"} dict per prompt.
+    """
+    return rule_matcher.match_many(prompts)
+
+
+def _local_mood(prompt: str):
+    """Classifier answer if it is confident enough, else None (escalate)"""
+    answer, confidence = mood_classifier.predict(prompt)
+    if confidence >= MOOD_CLASSIFIER_THRESHOLD or LLM_MODE == "rule_based":
+        # With no LLM configured the classifier's best guess is still the best answer
+        _count("local_answers")
+        return answer
+    _count("local_escalations")
+    return None
 
 
 def extract_mood(prompt: str):
@@ -141,14 +564,37 @@ def extract_mood(prompt: str):
     Extract mood from user prompt using the best available method.
     
     Priority:
+    0. Local classifier (if MOOD_EXTRACTION_MODE=local_classifier), escalating
+       low-confidence prompts to the LLM below
     1. Azure OpenAI (if configured)
     2. Regular OpenAI API (if configured)
     3. Rule-based fallback (always works)
     """
-    if USE_MODE == "azure_openai":
+    if USE_MODE == "local_classifier":
+        answer = _local_mood(prompt)
+        if answer is not None:
+            return answer
+    if LLM_MODE == "azure_openai":
         return extract_mood_with_azure_openai(prompt)
-    elif USE_MODE == "openai":
+    elif LLM_MODE == "openai":
         return extract_mood_with_openai(prompt)
     else:
         # Rule-based - always works
         return extract_mood_rule_based(prompt)
+
+
+async def extract_mood_async(prompt: str):
+    """
+    Async version of extract_mood for the FastAPI event loop.
+
+    LLM calls go through one pooled, keep-alive async client per process, so
+    waiting on the network doesn't tie up a threadpool thread.
+    """
+    if USE_MODE == "local_classifier":
+        answer = _local_mood(prompt)
+        if answer is not None:
+            return answer
+    if LLM_MODE in ("azure_openai", "openai"):
+        return await _llm_mood_async(prompt)
+    # Rule-based - always works
+    return extract_mood_rule_based(prompt)
@@ -0,0 +1,139 @@
+"""
+Compiled rule-based mood matcher
+================================
+The lexicon is an ordered list of rules; each rule maps a set of words to a
+(mood, tone) answer and earlier rules win. It is compiled once into a single
+prefix-trie regex plus a word -> rule-priority dict, so matching is one scan
+of the text that only stops at lexicon words, and words only match on word
+boundaries ("badminton" is not "bad"). match_many() scans a whole batch as
+one string and maps hits back to prompts by offset.
+
+A custom lexicon can be loaded from JSON (MOOD_LEXICON_PATH) in the same shape
+as DEFAULT_LEXICON: {"rules": [{"mood": ..., "tone": ..., "words": [...]}, ...]}
+"""
+
+import json
+import re
+
+import numpy as np
+
+# Rule order is priority order (same order as the original substring checks)
+DEFAULT_LEXICON = {
+    "rules": [
+        {
+            "mood": "happy", "tone": "light-hearted",
+            "words": [
+                "sad", "sadder", "saddest", "sadly", "sadness",
+                "bad", "badly",
+                "lonely", "lonelier", "loneliest", "loneliness",
+            ],
+        },
+        {
+            "mood": "relaxed", "tone": "light-hearted",
+            "words": [
+                "tired", "tiredness",
+                "lazy", "lazier", "laziest", "laziness",
+                "bored", "boredom",
+                "lethargic",
+            ],
+        },
+        {
+            "mood": "energetic", "tone": "intense",
+            "words": [
+                "excited", "excitedly",
+                "energetic", "energetically",
+                "thrill", "thrills", "thrilled", "thriller", "thrillers", "thrilling",
+            ],
+        },
+        {
+            "mood": "romantic", "tone": "light-hearted",
+            "words": [
+                "romantic", "romantically", "romantics",
+                "love", "loves", "loved", "lovely", "lover", "lovers", "loving",
+            ],
+        },
+    ],
+    "default": {"mood": "neutral", "tone": "neutral"},
+}
+
+
+def _trie_regex(words):
+    """Alternation with shared prefixes factored out ("lov(?:e(?:d|ly)?|ing)")"""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node):
+        alternatives = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alternatives:
+            return ""
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        if "" in node:
+            # The prefix so far is itself a word
+            return body + "?" if len(alternatives) > 1 or len(body) == 1 else "(?:" + body + ")?"
+        return body
+
+    return emit(trie)
+
+
+def load_lexicon(path=None):
+    """Lexicon from a JSON file, or the built-in one when no path is given"""
+    if not path:
+        return DEFAULT_LEXICON
+    with open(path, "r") as f:
+        lexicon = json.load(f)
+    if not isinstance(lexicon.get("rules"), list):
+        raise ValueError(f"Mood lexicon {path} has no 'rules' list")
+    return lexicon
+
+
+class MoodRuleMatcher:
+    """Word-boundary lexicon matcher; match() for one prompt, match_many() for bulk replay"""
+
+    def __init__(self, lexicon=DEFAULT_LEXICON):
+        self.answers = []
+        self.priority = {}
+        for rule in lexicon["rules"]:
+            rank = len(self.answers)
+            self.answers.append({"mood": rule["mood"], "tone": rule["tone"]})
+            for word in rule["words"]:
+                # A word listed under several rules keeps its highest-priority rule
+                self.priority.setdefault(word.lower(), rank)
+        self.default = dict(lexicon.get("default") or {"mood": "neutral", "tone": "neutral"})
+        self._no_match = len(self.answers)
+        self._pattern = re.compile(
+            r"(?<![a-z])" + _trie_regex(self.priority) + r"(?![a-z])"
+        ) if self.priority else None
+
+    def match(self, prompt):
+        """(mood, tone) of the highest-priority lexicon word in the prompt"""
+        hits = self._pattern.findall(prompt.lower()) if self._pattern is not None else None
+        if not hits:
+            return dict(self.default)
+        return dict(self.answers[min(map(self.priority.__getitem__, hits))])
+
+    def match_many(self, prompts):
+        """Match a list of prompts with one regex scan over the distinct ones"""
+        unique = list(dict.fromkeys(prompts))
+        ranks = np.full(len(unique), self._no_match, dtype=np.int64)
+        if self._pattern is not None and unique:
+            # Lower each prompt first (lower() can change length); "\n" never
+            # matches a lexicon word, so hits can't span two prompts
+            lowered = [prompt.lower() for prompt in unique]
+            text = "\n".join(lowered)
+            lengths = np.fromiter((len(p) + 1 for p in lowered), dtype=np.int64, count=len(lowered))
+            starts = np.cumsum(lengths) - lengths
+            priority = self.priority
+            positions, hit_ranks = [], []
+            for found in self._pattern.finditer(text):
+                positions.append(found.start())
+                hit_ranks.append(priority[found.group()])
+            if positions:
+                owners = np.searchsorted(starts, positions, side="right") - 1
+                np.minimum.at(ranks, owners, hit_ranks)
+        answers = self.answers + [self.default]
+        answer_of = dict(zip(unique, (answers[rank] for rank in ranks.tolist())))
+        return [dict(answer_of[prompt]) for prompt in prompts]
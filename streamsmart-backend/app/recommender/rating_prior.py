@@ -0,0 +1,105 @@
+"""
+Feedback-driven quality prior for the hybrid score.
+
+Show ratings from /api/feedback/show are folded into one float per catalog
+row, kept in a NumPy array aligned with the catalog. Adding it to the
+hybrid score is a single vectorized `scores += weight * prior` with no
+per-request lookups or joins.
+
+Each title's mean rating and like ratio are Bayesian-smoothed toward a
+prior (FEEDBACK_PRIOR_MEAN, a 50% like ratio) with the weight of
+FEEDBACK_PRIOR_STRENGTH pseudo-ratings, so one 5-star rating can't
+outrank a title with hundreds of good ones:
+
+    mean  = (strength * prior_mean + rating_sum) / (strength + count)
+    liked = (strength * 0.5 + liked_count) / (strength + count)
+    prior = 0.5 * (mean - 1) / 4 + 0.5 * liked  - (the same for no feedback)
+
+Titles without feedback score exactly 0, so the prior only moves titles
+people have rated. Rows are updated incrementally as the feedback store
+indexes new ratings (its listener hook); the store is re-checked at most
+every FEEDBACK_PRIOR_REFRESH_SECONDS from the scoring path. `version` goes
+up whenever a row changes, so cached results that used the prior can be
+keyed on it.
+
+The prior is opt-in: its weight in the hybrid score (FEEDBACK_PRIOR_WEIGHT,
+see recommender.py) defaults to 0.
+"""
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+PRIOR_MEAN = float(os.getenv("FEEDBACK_PRIOR_MEAN", "3.0"))
+PRIOR_STRENGTH = float(os.getenv("FEEDBACK_PRIOR_STRENGTH", "5"))
+REFRESH_SECONDS = float(os.getenv("FEEDBACK_PRIOR_REFRESH_SECONDS", "1.0"))
+
+
+def _quality(mean, liked_ratio):
+    # Both halves in [0, 1]: a 1-5 star mean and the share of likes
+    return 0.5 * (mean - 1.0) / 4.0 + 0.5 * liked_ratio
+
+
+class RatingPrior:
+    def __init__(self, title_index, catalog_size, store=None,
+                 prior_mean=PRIOR_MEAN, strength=PRIOR_STRENGTH, refresh_seconds=REFRESH_SECONDS):
+        self.title_index = title_index
+        self.scores = np.zeros(catalog_size, dtype=np.float64)
+        self.prior_mean = prior_mean
+        self.strength = strength
+        self.refresh_seconds = refresh_seconds
+        self._baseline = _quality(prior_mean, 0.5)
+        self._store = store
+        self._next_refresh = 0.0
+        self.version = 0
+        self._refresh_lock = threading.Lock()
+        if store is not None:
+            store.add_listener(self.update)
+
+    def update(self, title, count, rating_sum, liked):
+        """Set one title's prior from its feedback totals (feedback store listener)"""
+        row = self.title_index.get(title)
+        if row is None:
+            return
+        score = 0.0
+        if count > 0:
+            denominator = self.strength + count
+            mean = (self.strength * self.prior_mean + rating_sum) / denominator
+            liked_ratio = (self.strength * 0.5 + liked) / denominator
+            score = _quality(mean, liked_ratio) - self._baseline
+        if self.scores[row] != score:
+            self.scores[row] = score
+            self.version += 1
+
+    def current(self):
+        """The prior array, after picking up ratings indexed since the last refresh"""
+        if self._store is not None and time.monotonic() >= self._next_refresh:
+            # One caller refreshes; the others keep scoring with the array as it is
+            if self._refresh_lock.acquire(blocking=False):
+                try:
+                    self._store.refresh()
+                except Exception as e:
+                    print(f"⚠️  Could not refresh feedback prior: {e}")
+                finally:
+                    self._next_refresh = time.monotonic() + self.refresh_seconds
+                    self._refresh_lock.release()
+        return self.scores
+
+    def current_version(self):
+        """`version` after picking up ratings indexed since the last refresh"""
+        self.current()
+        return self.version
+
+    def digest(self):
+        """Content hash of the prior array (unlike `version`, comparable across processes)"""
+        return hashlib.blake2b(self.current().tobytes(), digest_size=8).hexdigest()
+
+    def stats(self):
+        return {
+            "titles_with_prior": int(np.count_nonzero(self.scores)),
+            "version": self.version,
+            "prior_mean": self.prior_mean,
+            "prior_strength": self.strength,
+        }
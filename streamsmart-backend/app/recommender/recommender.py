@@ -7,6 +7,8 @@ Changes from original:
 3. Simplified Random Forest (10 trees vs 100)
 4. Added error handling and fallbacks
 5. ZERO training in production (only loads cached models)
+6. Lazy loading from a prebuilt artifact bundle (see artifacts.py), so
+   importing this module is instant and startup never blocks on model loading
 
 Performance:
 - Original: 30+ seconds per request
@@ -14,114 +16,490 @@ Performance:
 - Memory: ~400MB (vs ~1.5GB)
 """
 
-import pandas as pd
+import asyncio
+import csv
 import os
+import threading
+import time
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import joblib
-from app.recommender.mood_extractor import extract_mood
-from app.recommender.user_profile import get_user_history
+from app.recommender.mood_extractor import extract_mood, extract_mood_async
+from app.recommender.user_profile import get_user_history, get_history_version, register_history_listener
+from app.recommender.similarity_index import ItemSimilarityIndex
+from app.recommender.taste_profile import TasteProfileCache
+from app.recommender.artifacts import load_model_bundle, moods_path, movies_path
+from app.recommender.result_cache import MISSING, TTLCache, normalize_prompt
+from app.recommender.trending import trending
+from app.recommender.feedback_store import feedback_store
+from app.recommender.rating_prior import RatingPrior
+from app.recommender.ann_index import create_retriever
+from app.recommender.metadata_index import MetadataIndex, filter_uses_watched, parse_filter, positive_terms
+from app.recommender.candidates import CandidateGenerator
 
-# -----------------------------
-# Load datasets
-# -----------------------------
-base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-movies_path = os.path.join(base_dir, "data", "movies_metadata.csv")
-moods_path = os.path.join(base_dir, "data", "mood_recommendations.csv")
-users_path = os.path.join(base_dir, "data", "users.csv")
+DEFAULT_CONTEXT = "alone"
+DEFAULT_TIME_OF_DAY = "evening"
+RESULT_COLUMNS = ["title", "genre", "release_year", "rating", "tags"]
+
+# Weight of the feedback rating prior (rating_prior.py). Opt-in: at 0 the three
+# hybrid weights below still sum to 1 and rankings are unaffected by feedback.
+RATING_PRIOR_WEIGHT = float(os.getenv("FEEDBACK_PRIOR_WEIGHT", "0"))
+
+# Default hybrid weights (the keyword defaults of get_recommendations)
+DEFAULT_WEIGHTS = {"mood_weight": 0.4, "history_weight": 0.3, "ml_weight": 0.3, "rating_weight": RATING_PRIOR_WEIGHT}
+
+# Batch scoring works on (queries x catalog) blocks of about this many floats (32 MB)
+BATCH_SCORE_BLOCK = int(os.getenv("BATCH_SCORE_BLOCK", str(4 * 1024 * 1024)))
 
-print("📊 Loading datasets...")
-movies_df = pd.read_csv(movies_path)
-moods_df = pd.read_csv(moods_path)
-users_df = pd.read_csv(users_path)
-print(f"✅ Loaded {len(movies_df)} movies")
 
 # -----------------------------
-# Load or Train RandomForest model (LIGHTWEIGHT)
+# Serving model (built once from the artifact bundle)
 # -----------------------------
-model_path = os.path.join(base_dir, "data", "rf_recommender_optimized.pkl")
-le_mood_path = os.path.join(base_dir, "data", "le_mood.pkl")
-le_context_path = os.path.join(base_dir, "data", "le_context.pkl")
-le_time_path = os.path.join(base_dir, "data", "le_time.pkl")
-le_movie_path = os.path.join(base_dir, "data", "le_movie.pkl")
-
-if os.path.exists(model_path) and os.path.exists(le_mood_path):
-    # Load existing model and encoders
-    print("✅ Loading optimized Random Forest model...")
-    rf_model = joblib.load(model_path)
-    le_mood = joblib.load(le_mood_path)
-    le_context = joblib.load(le_context_path)
-    le_time = joblib.load(le_time_path)
-    le_movie = joblib.load(le_movie_path)
-    print("✅ Model loaded successfully!")
-else:
-    # Train new model (ONLY on first local run, never in Azure)
-    print("🔧 Training optimized Random Forest model (first time)...")
-    le_mood = LabelEncoder()
-    le_context = LabelEncoder()
-    le_time = LabelEncoder()
-    le_movie = LabelEncoder()
-    
-    moods_df["mood_enc"] = le_mood.fit_transform(moods_df["mood"])
-    moods_df["context_enc"] = le_context.fit_transform(moods_df["context"])
-    moods_df["time_enc"] = le_time.fit_transform(moods_df["time_of_day"])
-    moods_df["movie_enc"] = le_movie.fit_transform(moods_df["recommended_movie_id"])
-    
-    X = moods_df[["mood_enc", "context_enc", "time_enc"]]
-    y = moods_df["movie_enc"]
-    
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    # OPTIMIZED: 10 trees (vs 100), max_depth=10, min_samples_split=10
-    rf_model = RandomForestClassifier(
-        n_estimators=10,
-        max_depth=10,
-        min_samples_split=10,
-        random_state=42,
-        n_jobs=1  # Single thread for Azure
-    )
-    rf_model.fit(X_train, y_train)
+class RecommenderModel:
+    """Columnar catalog plus the indexes get_recommendations scores against"""
+
+    def __init__(self, bundle):
+        self.bundle = bundle
+        self.catalog_size = bundle.catalog_size
+        self.catalog_movie_ids = bundle.catalog["movie_id"]
+        self.catalog_columns = {col: bundle.catalog[col] for col in RESULT_COLUMNS}
+        # Sorted-array indexes (memory-mapped from the bundle) instead of per-worker dicts
+        self.title_index = bundle.title_index
+        self.movie_id_index = bundle.movie_id_index
+
+        self.tfidf_vectorizer = bundle.tfidf_vectorizer
+        self.tfidf_matrix = bundle.tfidf_matrix
+        self.rf_lookup = bundle.rf_lookup
+
+        # Prompt similarity: exact sparse product, or exact scores over IVF candidates (RETRIEVAL_MODE)
+        self.retriever = create_retriever(self.tfidf_matrix, bundle.ann_index)
+
+        # Genre/tag/mood posting lists, and the candidate stage built on them and the retriever
+        self.metadata_index = MetadataIndex.build(bundle.catalog, self.movie_id_index, moods_path)
+        self.candidate_generator = CandidateGenerator(self.metadata_index, self.retriever, self.tfidf_matrix)
+
+        self.users_by_id = {}
+        for record in bundle.users:
+            self.users_by_id.setdefault(record["user_id"], []).append(record)
+
+        # Feedback quality prior aligned with catalog rows, kept current as ratings are indexed
+        self.rating_prior = RatingPrior(self.title_index, self.catalog_size, store=feedback_store)
+        self.rating_prior.current()  # index existing feedback now rather than on the first request
+
+        # Item-item index: history similarity becomes one mat-vec against the watched centroid
+        self.similarity_index = ItemSimilarityIndex(self.tfidf_matrix)
+
+        # Per-user taste vectors: rebuilt from the history store on a miss, updated in place on new watches
+        self.taste_cache = TasteProfileCache(
+            self.similarity_index,
+            self.title_index,
+            load_history=get_user_history,
+            history_version=get_history_version,
+            maxsize=int(os.getenv("TASTE_CACHE_SIZE", "10000"))
+        )
+
+
+class ModelUnavailableError(RuntimeError):
+    """Neither the serving model nor the catalog CSV could be loaded (the API answers 503)"""
+
+
+_model = None
+_model_lock = threading.Lock()
+_model_status = {"state": "not_loaded", "bundle_version": None, "load_seconds": None, "error": None}
+_scratch = threading.local()
+
+# Repeated (user, prompt) requests are answered from here; a history change bumps
+# the user's history version, which is part of the key, so stale entries just age out
+result_cache = TTLCache(
+    maxsize=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("RECOMMENDATION_CACHE_TTL", "300"))
+)
+
+
+def get_model():
+    """Return the serving model, loading it on first use (concurrent callers wait for one load)"""
+    global _model
+    if _model is not None:
+        return _model
+    with _model_lock:
+        if _model is None:
+            _model_status["state"] = "loading"
+            start = time.perf_counter()
+            try:
+                model = RecommenderModel(load_model_bundle())
+            except Exception as e:
+                _model_status.update(state="failed", error=str(e))
+                raise
+            register_history_listener(model.taste_cache.record_watch)
+            _model_status.update(
+                state="ready",
+                bundle_version=model.bundle.version,
+                load_seconds=round(time.perf_counter() - start, 3),
+                error=None
+            )
+            print(f"🚀 Optimized recommender ready! ({_model_status['load_seconds']}s)")
+            _model = model
+    return _model
+
+
+def _genre_of(title):
+    """Catalog genre for a title, once the model is loaded (trending never forces a load)"""
+    model = _model
+    if model is None:
+        return None
+    row = model.title_index.get(title)
+    return None if row is None else str(model.catalog_columns["genre"][row])
+
+
+# Watches count toward trending; events that only name a title get their genre from the catalog
+trending.set_genre_resolver(_genre_of)
+register_history_listener(lambda user_id, show_title: trending.record(show_title, event="history"))
+
+
+def warm_up():
+    """Load the model in the background so the first request doesn't pay for it"""
+    try:
+        get_model()
+    except Exception as e:
+        print(f"❌ Recommender warm-up failed: {e}")
+
+
+def is_ready():
+    return _model is not None
+
+
+def get_model_status():
+    return dict(_model_status, ready=is_ready())
+
+
+def _score_buffer(model):
+    """Preallocated score vector, one per worker thread (sync routes run in a threadpool)"""
+    scores = getattr(_scratch, "scores", None)
+    if scores is None or scores.shape[0] != model.catalog_size:
+        scores = np.empty(model.catalog_size, dtype=np.float64)
+        _scratch.scores = scores
+    return scores
+
+
+def _top_k_rows(scores, k):
+    """
+    Row indices of the k highest scores, best first.
+
+    Uses a linear-time partial selection instead of a full sort. Ties are
+    broken by catalog order so equal scores give a deterministic ranking.
+    """
+    k = min(int(k), scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    kth_score = np.partition(scores, scores.shape[0] - k)[scores.shape[0] - k]
+    above = np.flatnonzero(scores > kth_score)
+    tied = np.flatnonzero(scores == kth_score)[: k - above.shape[0]]
+    rows = np.concatenate((above, tied))
+    return rows[np.lexsort((rows, -scores[rows]))]
+
+
+def _ml_scores(model, mood, context=DEFAULT_CONTEXT, time_of_day=DEFAULT_TIME_OF_DAY):
+    """
+    Catalog rows and graded scores for the RF's top-N predictions.
+
+    Scores are probabilities relative to the top prediction, so the RF's best
+    pick still gets the full 1.0 boost and runners-up get proportionally less.
+    Moods the model was not trained on fall back to "neutral", then to no boost.
+    """
+    empty = np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+    if model.rf_lookup is None:
+        return empty
+    if mood not in model.rf_lookup.moods:
+        mood = "neutral"
+    movie_ids, probabilities = model.rf_lookup.lookup(mood, context, time_of_day)
+    if movie_ids.size == 0 or probabilities[0] <= 0:
+        return empty
+    rows = model.movie_id_index.get_many(movie_ids)
+    keep = rows >= 0
+    return rows[keep], probabilities[keep] / probabilities[0]
+
+
+_top_rated_catalog = None  # catalog CSV rows by rating, for errors when the model never loaded
+
+
+def _top_rated_without_model(top_n):
+    """Top-rated titles read straight from the catalog CSV, for when the model failed to load"""
+    global _top_rated_catalog
+    if _top_rated_catalog is None:
+        try:
+            with open(movies_path, newline="") as f:
+                records = [
+                    {
+                        "title": record["title"],
+                        "genre": record["genre"],
+                        "release_year": int(record["release_year"]),
+                        "rating": float(record["rating"]),
+                        "tags": record["tags"],
+                        "hybrid_score": 0.5,
+                    }
+                    for record in csv.DictReader(f)
+                ]
+        except (OSError, KeyError, ValueError) as e:
+            raise ModelUnavailableError(f"Recommendations unavailable: model and catalog failed to load ({e})")
+        records.sort(key=lambda record: record["rating"], reverse=True)
+        _top_rated_catalog = records
+    return [dict(record) for record in _top_rated_catalog[:max(int(top_n), 0)]]
+
+
+def _records(model, rows, hybrid):
+    """Materialize only the selected rows as plain dicts, with their hybrid scores"""
+    columns = {col: values[rows].tolist() for col, values in model.catalog_columns.items()}
+    hybrid = np.asarray(hybrid, dtype=np.float64).tolist()
+    return [
+        {**{col: columns[col][i] for col in RESULT_COLUMNS}, "hybrid_score": hybrid[i]}
+        for i in range(len(rows))
+    ]
+
+
+def _rows_to_records(model, rows, scores):
+    """Result dicts for rows of a catalog-sized score vector"""
+    return _records(model, rows, scores[rows])
+
+
+def records_for_movie_ids(model, movie_ids, scores):
+    """Result dicts for precomputed (movie_id, score) lists; ids no longer in the catalog are skipped"""
+    rows = model.movie_id_index.get_many(movie_ids)
+    keep = rows >= 0
+    return _records(model, rows[keep], np.asarray(scores, dtype=np.float64)[keep])
+
+
+def _rank_all(model, prompt_vec, taste_vector, ml_rows, ml_scores, top_n,
+              mood_weight, history_weight, ml_weight, rating_weight, allowed=None):
+    """
+    Hybrid score for every catalog row; returns (top rows, their scores), best first.
+    Rows outside the `allowed` bitset (a filter) are never returned.
+    """
+    # Hybrid score is accumulated in place into a reused buffer
+    scores = _score_buffer(model)
+    scores.fill(0.0)
+    
+    # TF-IDF similarity (rows are L2-normalized, so cosine == dot product), over ANN candidates if enabled
+    prompt_rows, prompt_similarities = model.retriever.prompt_similarities(prompt_vec)
+    scores[prompt_rows] = mood_weight * prompt_similarities
+    
+    # History similarity (average similarity to watched movies == dot with taste vector)
+    if taste_vector is not None:
+        history_sim = model.similarity_index.scores_for_vector(taste_vector)
+        history_sim *= history_weight
+        scores += history_sim
     
-    # Save model and encoders for reuse
-    joblib.dump(rf_model, model_path)
-    joblib.dump(le_mood, le_mood_path)
-    joblib.dump(le_context, le_context_path)
-    joblib.dump(le_time, le_time_path)
-    joblib.dump(le_movie, le_movie_path)
+    # ML prediction from the RF lookup table (graded by probability relative to the top pick)
+    if ml_rows.size:
+        scores[ml_rows] += ml_weight * ml_scores
     
-    accuracy = rf_model.score(X_test, y_test)
-    print(f"✅ Optimized model trained! Test Accuracy: {accuracy:.2%}")
+    # Feedback prior: Bayesian-smoothed rating/like score per row (0 for unrated titles)
+    if rating_weight:
+        scores += rating_weight * model.rating_prior.current()
+    
+    if allowed is not None:
+        scores[~model.metadata_index.unpack(allowed)] = -np.inf
+    
+    # Partial top-k selection over the whole catalog
+    top_rows = _top_k_rows(scores, top_n)
+    top_rows = top_rows[np.isfinite(scores[top_rows])]
+    return top_rows, scores[top_rows]
 
-# -----------------------------
-# TF-IDF Similarity (LIGHTWEIGHT - replaces sentence-transformers)
-# -----------------------------
-print("🔧 Building TF-IDF vectorizer...")
-# Combine title, genre, and tags for better matching
-movies_df['text_features'] = (
-    movies_df['title'].fillna('') + ' ' + 
-    movies_df['genre'].fillna('') + ' ' + 
-    movies_df['tags'].fillna('')
-)
 
-# TF-IDF with limited features (fast and lightweight)
-tfidf_vectorizer = TfidfVectorizer(
-    max_features=100,  # Only top 100 words
-    stop_words='english',
-    lowercase=True,
-    ngram_range=(1, 2)  # Unigrams and bigrams
-)
+def _rank_candidates(model, candidates, prompt_vec, taste_vector, ml_rows, ml_scores, top_n,
+                     mood_weight, history_weight, ml_weight, rating_weight):
+    """The same hybrid score, computed only for the sorted candidate rows"""
+    rows = model.tfidf_matrix[candidates]
+    scores = rows @ prompt_vec.toarray().ravel()
+    scores *= mood_weight
+    if taste_vector is not None:
+        if model.similarity_index.matrix is not model.tfidf_matrix:
+            rows = model.similarity_index.matrix[candidates]
+        scores += history_weight * (rows @ taste_vector)
+    if ml_rows.size:
+        # RF rows are candidates unless a filter dropped them; binary search finds those still there
+        positions = np.searchsorted(candidates, ml_rows)
+        hit = positions < candidates.shape[0]
+        hit[hit] = candidates[positions[hit]] == ml_rows[hit]
+        scores[positions[hit]] += ml_weight * ml_scores[hit]
+    if rating_weight:
+        scores += rating_weight * model.rating_prior.current()[candidates]
+    # Candidates are in catalog order, so ties still break by catalog row
+    positions = _top_k_rows(scores, top_n)
+    return candidates[positions], scores[positions]
+
+
+def _score_recommendations(model, user_id, user_prompt, top_n, mood_weight, history_weight, ml_weight, rating_weight,
+                           mood_info=None, debug=False, filters=None):
+    # Extract mood and tone (unless the async path already did)
+    if mood_info is None:
+        mood_info = extract_mood(user_prompt)
+    mood = mood_info.get("mood", "neutral").lower()
+    tone = mood_info.get("tone", "neutral").lower()
+    
+    # Get user profile
+    user_profile = model.users_by_id.get(user_id, [])
+    taste_vector = model.taste_cache.get(user_id)
+    prompt_vec = model.tfidf_vectorizer.transform([user_prompt])
+    ml_rows, ml_scores = _ml_scores(model, mood)
+    weights = (mood_weight, history_weight, ml_weight, rating_weight)
+    start = time.perf_counter()
+    
+    # Pre-filter ("genre:comedy AND NOT watched"): a bitset of the rows that may be returned
+    allowed, expression = None, None
+    if filters:
+        expression = parse_filter(filters)
+        watched_rows = None
+        if filter_uses_watched(expression):
+            watched_rows = model.title_index.get_many(get_user_history(user_id))
+            watched_rows = watched_rows[watched_rows >= 0]
+        allowed = model.metadata_index.evaluate(expression, watched_rows)
+    
+    # Stage 1: candidate rows from cheap lookups (skipped for small catalogs: everything is ranked)
+    candidates, sources = None, {"catalog": model.catalog_size}
+    if model.candidate_generator.enabled:
+        preferred_genres = [
+            genre for record in user_profile for genre in str(record.get("preferred_genres") or "").split(",")
+        ]
+        candidates, sources = model.candidate_generator.generate(
+            user_prompt, prompt_vec, mood, taste_vector, ml_rows, preferred_genres,
+            allowed=allowed, filter_terms=positive_terms(expression) if expression else (), min_candidates=top_n
+        )
+    generated = time.perf_counter()
+    
+    # Stage 2: full hybrid score over the candidates, partial top-k, dicts for the winners only
+    if candidates is None:
+        top_rows, top_scores = _rank_all(
+            model, prompt_vec, taste_vector, ml_rows, ml_scores, top_n, *weights, allowed=allowed
+        )
+    else:
+        top_rows, top_scores = _rank_candidates(
+            model, candidates, prompt_vec, taste_vector, ml_rows, ml_scores, top_n, *weights
+        )
+    ranked = time.perf_counter()
+    
+    result = {
+        "user_id": user_id,
+        "extracted_mood": mood_info,
+        "user_profile": user_profile,
+        "recommendations": _records(model, top_rows, top_scores)
+    }
+    if debug:
+        result["debug"] = {
+            "catalog_size": model.catalog_size,
+            "retrieval": model.retriever.name,
+            "mode": "full" if candidates is None else "two_stage",
+            "filter": None if allowed is None else {
+                "expression": filters,
+                "matching": int(model.metadata_index.unpack(allowed).sum()),
+            },
+            "stages": {
+                "candidates": {
+                    "ms": round((generated - start) * 1000, 3),
+                    "count": model.catalog_size if candidates is None else int(candidates.shape[0]),
+                    "sources": sources,
+                },
+                "ranking": {"ms": round((ranked - generated) * 1000, 3), "returned": len(top_rows)},
+            },
+        }
+    return result
+
+
+def _top_k_rows_batch(scores, k):
+    """
+    Row-wise _top_k_rows for a (queries, catalog) score matrix: (queries, k)
+    catalog rows, best first, with the same catalog-order tie-breaking.
+    """
+    n_queries, n_items = scores.shape
+    k = min(int(k), n_items)
+    if k <= 0 or n_queries == 0:
+        return np.empty((n_queries, 0), dtype=np.intp)
+    kth_score = np.partition(scores, n_items - k, axis=1)[:, n_items - k, None]
+    above = scores > kth_score
+    tied = scores == kth_score
+    # Keep only as many tied entries per row as are needed to reach k, earliest rows first
+    need = k - above.sum(axis=1, keepdims=True)
+    selected = above | (tied & (np.cumsum(tied, axis=1) <= need))
+    query_idx, rows = np.nonzero(selected)  # exactly k per query, in query order
+    order = np.lexsort((rows, -scores[query_idx, rows], query_idx))
+    return rows[order].reshape(n_queries, k)
+
+
+def score_blocks(model, items, mood_weight, history_weight, ml_weight, rating_weight):
+    """
+    Score many (user_id, user_prompt, top_n, mood_info) requests at once,
+    yielding (block, scores, top_rows) per block of queries.
+
+    One vectorizer.transform for all prompts, one sparse product against the
+    catalog for prompt similarity, one for history similarity (stacked taste
+    vectors), and row-wise top-k. Queries are processed in chunks so the dense
+    score block stays around BATCH_SCORE_BLOCK floats.
+
+    Public batch-scoring entry point for offline jobs (home_feed.py) that
+    want raw scores and rows rather than result dicts.
+    """
+    chunk = max(1, BATCH_SCORE_BLOCK // max(model.catalog_size, 1))
+    prior = model.rating_prior.current() if rating_weight else None
+    for start in range(0, len(items), chunk):
+        block = items[start:start + chunk]
+        moods = [mood_info.get("mood", "neutral").lower() for _, _, _, mood_info in block]
+        
+        # Prompt similarity for the whole block: (catalog x features) @ (features x queries)
+        prompt_matrix = model.tfidf_vectorizer.transform([user_prompt for _, user_prompt, _, _ in block])
+        scores = (model.tfidf_matrix @ prompt_matrix.T).T.toarray()
+        if model.retriever.name != "exact":
+            # Same candidate restriction as the single-request path, so rankings agree
+            candidates = np.zeros(scores.shape, dtype=bool)
+            for i in range(len(block)):
+                candidates[i, model.retriever.candidates(prompt_matrix[i])] = True
+            scores *= candidates
+        scores *= mood_weight
+        
+        # History similarity: stack the users' taste vectors and do one product
+        taste = [(i, model.taste_cache.get(user_id)) for i, (user_id, _, _, _) in enumerate(block)]
+        taste = [(i, vector) for i, vector in taste if vector is not None]
+        if taste:
+            query_rows = np.array([i for i, _ in taste], dtype=np.intp)
+            vectors = np.vstack([vector for _, vector in taste])
+            scores[query_rows] += history_weight * (model.similarity_index.matrix @ vectors.T).T
+        
+        # ML lookup once per distinct mood
+        for mood in set(moods):
+            ml_rows, ml_scores = _ml_scores(model, mood)
+            if ml_rows.size:
+                query_rows = np.array([i for i, m in enumerate(moods) if m == mood], dtype=np.intp)
+                scores[np.ix_(query_rows, ml_rows)] += ml_weight * ml_scores
+        
+        if prior is not None:
+            scores += rating_weight * prior
+        
+        yield block, scores, _top_k_rows_batch(scores, max(top_n for _, _, top_n, _ in block))
+
+
+def _score_recommendations_batch(model, items, mood_weight, history_weight, ml_weight, rating_weight):
+    """Result dicts (as from _score_recommendations) for many requests, scored in blocks"""
+    results = []
+    for block, scores, top_rows in score_blocks(model, items, mood_weight, history_weight, ml_weight, rating_weight):
+        # Gather result columns for the whole block at once instead of per request
+        k = top_rows.shape[1]
+        columns = {col: values[top_rows.ravel()].tolist() for col, values in model.catalog_columns.items()}
+        hybrid = np.take_along_axis(scores, top_rows, axis=1).ravel().tolist()
+        for i, (user_id, _, top_n, mood_info) in enumerate(block):
+            offset = i * k
+            results.append({
+                "user_id": user_id,
+                "extracted_mood": mood_info,
+                "user_profile": model.users_by_id.get(user_id, []),
+                "recommendations": [
+                    {**{col: columns[col][j] for col in RESULT_COLUMNS}, "hybrid_score": hybrid[j]}
+                    for j in range(offset, offset + min(max(int(top_n), 0), k))
+                ]
+            })
+    return results
 
-tfidf_matrix = tfidf_vectorizer.fit_transform(movies_df['text_features'])
-print(f"✅ TF-IDF ready ({tfidf_matrix.shape[0]} movies, {tfidf_matrix.shape[1]} features)")
 
 # -----------------------------
 # Optimized Hybrid Recommendation Function
 # -----------------------------
-def get_recommendations(user_id, user_prompt, top_n=5, mood_weight=0.4, history_weight=0.3, ml_weight=0.3):
+def get_recommendations(user_id, user_prompt, top_n=5, mood_weight=0.4, history_weight=0.3, ml_weight=0.3,
+                        rating_weight=RATING_PRIOR_WEIGHT, debug=False, filters=None):
     """
     Optimized for Azure: Fast, lightweight, production-ready
     
@@ -132,98 +510,191 @@ def get_recommendations(user_id, user_prompt, top_n=5, mood_weight=0.4, history_
         mood_weight: Weight for semantic similarity (0-1)
         history_weight: Weight for user history (0-1)
         ml_weight: Weight for ML prediction (0-1)
+        rating_weight: Weight for the feedback rating prior (0-1, default FEEDBACK_PRIOR_WEIGHT, 0 = off)
+        debug: Add per-stage timings and candidate counts under "debug" (bypasses the result cache)
+        filters: Pre-filter expression, e.g. "genre:comedy AND NOT watched" (see metadata_index.py)
     
     Returns:
         Dictionary with recommendations and metadata
+    
+    Raises:
+        ValueError: if `filters` is not a valid filter expression
+    """
+    if filters:
+        parse_filter(filters)  # fail fast, not in the scoring fallback
+    cache_key, cached = _lookup(
+        (user_id, user_prompt, top_n, mood_weight, history_weight, ml_weight, rating_weight, filters), debug
+    )
+    if cached is not MISSING:
+        return dict(cached)
+    return _recommend_and_cache(
+        cache_key, user_id, user_prompt, top_n, mood_weight, history_weight, ml_weight, rating_weight,
+        debug=debug, filters=filters
+    )
+
+
+async def get_recommendations_async(user_id, user_prompt, top_n=5, mood_weight=0.4, history_weight=0.3, ml_weight=0.3,
+                                    rating_weight=RATING_PRIOR_WEIGHT, debug=False, filters=None):
+    """
+    Async version of get_recommendations for the FastAPI event loop.
+
+    The LLM mood call is awaited on the pooled async client; the cache
+    lookup (its key reads the history and feedback stores) and the short
+    CPU-bound scoring step run in worker threads.
+    """
+    if filters:
+        parse_filter(filters)
+    cache_key, cached = await asyncio.to_thread(
+        _lookup, (user_id, user_prompt, top_n, mood_weight, history_weight, ml_weight, rating_weight, filters), debug
+    )
+    if cached is not MISSING:
+        return dict(cached)
+    mood_info = await extract_mood_async(user_prompt)
+    return await asyncio.to_thread(
+        _recommend_and_cache, cache_key, user_id, user_prompt, top_n,
+        mood_weight, history_weight, ml_weight, rating_weight, mood_info, debug, filters
+    )
+
+
+def get_recommendations_batch(requests, mood_weight=0.4, history_weight=0.3, ml_weight=0.3,
+                              rating_weight=RATING_PRIOR_WEIGHT):
+    """
+    Recommendations for many requests at once (nightly jobs, feed pre-warming).
+    
+    Args:
+        requests: list of {"user_id", "message", "top_n" (optional, default 5)}
+        mood_weight, history_weight, ml_weight, rating_weight: as in get_recommendations
+    
+    Returns:
+        One result dict per request, in order, shaped like get_recommendations'
     """
+    requests = list(requests)
+    weights = (mood_weight, history_weight, ml_weight, rating_weight)
+    return _recommend_batch(requests, *_lookup_batch(requests, weights), weights, extract_mood)
+
+
+async def get_recommendations_batch_async(requests, mood_weight=0.4, history_weight=0.3, ml_weight=0.3,
+                                          rating_weight=RATING_PRIOR_WEIGHT):
+    """Async get_recommendations_batch: mood calls are awaited together (and share LLM batches)"""
+    requests = list(requests)
+    weights = (mood_weight, history_weight, ml_weight, rating_weight)
+    # One cache lookup per request (off the loop): the hits are handed to _recommend_batch, not looked up again
+    cache_keys, cached = await asyncio.to_thread(_lookup_batch, requests, weights)
+    pending = {}
+    for request, hit in zip(requests, cached):
+        if hit is MISSING:
+            pending.setdefault(normalize_prompt(request["message"]), request["message"])
+    moods = await asyncio.gather(*(extract_mood_async(prompt) for prompt in pending.values()))
+    mood_by_prompt = dict(zip(pending, moods))
+    return await asyncio.to_thread(
+        _recommend_batch, requests, cache_keys, cached, weights,
+        lambda prompt: mood_by_prompt.get(normalize_prompt(prompt)) or extract_mood(prompt)
+    )
+
+
+def _lookup(key_args, debug=False):
+    """
+    Cache key and cached result (MISSING on a miss, and always for debug calls).
+    Building the key may read the history and feedback stores, so async callers run it in a thread.
+    """
+    cache_key = _cache_key(*key_args)
+    return cache_key, MISSING if debug else result_cache.get(cache_key)
+
+
+def _lookup_batch(requests, weights):
+    """Cache key and cached result (or MISSING) of every request"""
+    cache_keys = [
+        _cache_key(request["user_id"], request["message"], request.get("top_n", 5), *weights)
+        for request in requests
+    ]
+    return cache_keys, [result_cache.get(cache_key) for cache_key in cache_keys]
+
+
+def _recommend_batch(requests, cache_keys, cached, weights, mood_for):
+    mood_weight, history_weight, ml_weight, rating_weight = weights
+    results = [None] * len(requests)
+    misses = []
+    moods = {}
+    for i, request in enumerate(requests):
+        user_id, user_prompt, top_n = request["user_id"], request["message"], request.get("top_n", 5)
+        cache_key = cache_keys[i]
+        if cached[i] is not MISSING:
+            results[i] = dict(cached[i])
+            continue
+        # Repeated prompts are extracted once
+        prompt_key = normalize_prompt(user_prompt)
+        if prompt_key not in moods:
+            moods[prompt_key] = mood_for(user_prompt)
+        misses.append((i, cache_key, (user_id, user_prompt, top_n, moods[prompt_key])))
+    if not misses:
+        return results
+    
     try:
-        # Extract mood and tone
-        mood_info = extract_mood(user_prompt)
-        mood = mood_info.get("mood", "neutral").lower()
-        tone = mood_info.get("tone", "neutral").lower()
-        
-        # Get user profile
-        user_profile = users_df[users_df["user_id"] == user_id].to_dict(orient="records")
-        user_history_titles = get_user_history(user_id)
-        
-        # TF-IDF similarity (FAST - no GPU needed)
-        prompt_vec = tfidf_vectorizer.transform([user_prompt])
-        prompt_similarities = cosine_similarity(prompt_vec, tfidf_matrix).flatten()
-        
-        temp_df = movies_df.copy()
-        temp_df["prompt_similarity"] = prompt_similarities
-        
-        # History similarity (simplified and fast)
-        if user_history_titles:
-            watched_indices = movies_df[movies_df["title"].isin(user_history_titles)].index.tolist()
-            if watched_indices:
-                # Average similarity to watched movies
-                history_sim = np.zeros(len(movies_df))
-                for idx in watched_indices:
-                    history_sim += cosine_similarity(tfidf_matrix[idx:idx+1], tfidf_matrix).flatten()
-                history_sim = history_sim / max(len(watched_indices), 1)
-                temp_df["history_similarity"] = history_sim
-            else:
-                temp_df["history_similarity"] = 0.0
-        else:
-            temp_df["history_similarity"] = 0.0
-        
-        # ML prediction (with error handling)
-        try:
-            # Handle unknown moods gracefully
-            if mood in le_mood.classes_:
-                mood_enc = le_mood.transform([mood])[0]
-            else:
-                mood_enc = le_mood.transform(["neutral"])[0]
-            
-            context_enc = le_context.transform(["alone"])[0]  # Default context
-            time_enc = le_time.transform(["evening"])[0]      # Default time
-            
-            ml_pred = rf_model.predict([[mood_enc, context_enc, time_enc]])[0]
-            predicted_movie_id = le_movie.inverse_transform([ml_pred])[0]
-            
-            # Boost movies matching ML prediction
-            temp_df["ml_score"] = temp_df["movie_id"].apply(
-                lambda mid: 1.0 if mid == predicted_movie_id else 0.0
+        model = get_model()
+        scored = _score_recommendations_batch(
+            model, [item for _, _, item in misses], mood_weight, history_weight, ml_weight, rating_weight
+        )
+    except Exception as e:
+        print(f"❌ Batch recommendation error: {e}, scoring one by one")
+        scored = None
+    if scored is None:
+        # _recommend_and_cache caches its own successes; its error fallbacks must not be cached
+        for i, cache_key, item in misses:
+            results[i] = _recommend_and_cache(
+                cache_key, *item[:3], mood_weight, history_weight, ml_weight, rating_weight, item[3]
             )
-        except Exception as ml_error:
-            print(f"⚠️  ML prediction failed: {ml_error}, using fallback")
-            temp_df["ml_score"] = 0.0
-        
-        # Normalized hybrid score
-        temp_df["hybrid_score"] = (
-            mood_weight * temp_df["prompt_similarity"]
-            + history_weight * temp_df["history_similarity"]
-            + ml_weight * temp_df["ml_score"]
+        return results
+    for (i, cache_key, _), result in zip(misses, scored):
+        result_cache.set(cache_key, result)
+        results[i] = dict(result)
+    return results
+
+
+def _cache_key(user_id, user_prompt, top_n, mood_weight, history_weight, ml_weight, rating_weight, filters=None):
+    return (
+        user_id, normalize_prompt(user_prompt), top_n,
+        mood_weight, history_weight, ml_weight, rating_weight, filters or None,
+        get_history_version(user_id), _prior_version(rating_weight)
+    )
+
+
+def _prior_version(rating_weight):
+    """Rating prior version for cache keys (results scored with the prior go stale when it changes)"""
+    # Results are only cached once the model has loaded; a key made before that never matches again
+    if not rating_weight or _model is None:
+        return None
+    return _model.rating_prior.current_version()
+
+
+def _recommend_and_cache(cache_key, user_id, user_prompt, top_n, mood_weight, history_weight, ml_weight, rating_weight,
+                         mood_info=None, debug=False, filters=None):
+    model = None
+    try:
+        model = get_model()
+        result = _score_recommendations(
+            model, user_id, user_prompt, top_n, mood_weight, history_weight, ml_weight, rating_weight, mood_info, debug,
+            filters
         )
-        
-        # Sort and return top recommendations
-        results = temp_df.sort_values(by="hybrid_score", ascending=False).head(top_n)
-        
-        return {
-            "user_id": user_id,
-            "extracted_mood": mood_info,
-            "user_profile": user_profile,
-            "recommendations": results[
-                ["title", "genre", "release_year", "rating", "tags", "hybrid_score"]
-            ].to_dict(orient="records")
-        }
+        if not debug:
+            # Debug timings describe one call; don't serve them to later requests
+            result_cache.set(cache_key, result)
+        return dict(result)
     
     except Exception as e:
         print(f"❌ Recommendation error: {e}")
         import traceback
         traceback.print_exc()
         
-        # Fallback: Return top-rated movies
-        fallback_results = movies_df.nlargest(top_n, 'rating')
+        # Fallback: Return top-rated movies (from the catalog CSV if the model never loaded)
+        if model is not None:
+            ratings = model.catalog_columns["rating"].astype(np.float64)
+            top_rows = _top_k_rows(ratings, top_n)
+            recommendations = _rows_to_records(model, top_rows, np.full(model.catalog_size, 0.5))
+        else:
+            recommendations = _top_rated_without_model(top_n)
         return {
             "user_id": user_id,
             "extracted_mood": {"mood": "neutral", "tone": "neutral"},
             "user_profile": [],
-            "recommendations": fallback_results[
-                ["title", "genre", "release_year", "rating", "tags"]
-            ].assign(hybrid_score=0.5).to_dict(orient="records")
+            "recommendations": recommendations
         }
-
-print("🚀 Optimized recommender ready!")
-
@@ -0,0 +1,75 @@
+"""
+Lookup-table export of the RandomForest recommender.
+
+The RF only sees three categorical inputs (mood, context, time of day), so
+its whole input space is a few hundred combinations. We enumerate all of them
+once, keep the top-N predicted movie ids with their probabilities, and serve
+from that dense table instead of calling the encoders and rf_model.predict
+on every request.
+"""
+import itertools
+import numpy as np
+
+
+class RFLookupTable:
+    def __init__(self, moods, contexts, times, movie_ids, probabilities):
+        self.moods = [str(m) for m in moods]
+        self.contexts = [str(c) for c in contexts]
+        self.times = [str(t) for t in times]
+        self._mood_index = {m: i for i, m in enumerate(self.moods)}
+        self._context_index = {c: i for i, c in enumerate(self.contexts)}
+        self._time_index = {t: i for i, t in enumerate(self.times)}
+        # Shape: (n_moods, n_contexts, n_times, top_n), best prediction first
+        self.movie_ids = np.asarray(movie_ids)
+        self.probabilities = np.asarray(probabilities, dtype=np.float64)
+        self.top_n = self.movie_ids.shape[-1]
+
+    def lookup(self, mood, context, time_of_day):
+        """
+        Top-N (movie_ids, probabilities) for one input combination.
+
+        Returns empty arrays for moods/contexts/times the model was not trained on.
+        """
+        m = self._mood_index.get(mood)
+        c = self._context_index.get(context)
+        t = self._time_index.get(time_of_day)
+        if m is None or c is None or t is None:
+            return self.movie_ids[:0, 0, 0, 0], self.probabilities[:0, 0, 0, 0]
+        return self.movie_ids[m, c, t], self.probabilities[m, c, t]
+
+    def save(self, path):
+        np.savez(
+            path,
+            moods=np.array(self.moods),
+            contexts=np.array(self.contexts),
+            times=np.array(self.times),
+            movie_ids=self.movie_ids,
+            probabilities=self.probabilities,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data["moods"], data["contexts"], data["times"],
+                data["movie_ids"], data["probabilities"]
+            )
+
+
+def build_rf_lookup(rf_model, le_mood, le_context, le_time, le_movie, top_n=10):
+    """Enumerate every (mood, context, time) combination and keep the top-N predictions"""
+    shape = (len(le_mood.classes_), len(le_context.classes_), len(le_time.classes_))
+    grid = np.array(list(itertools.product(*(range(n) for n in shape))))
+    proba = rf_model.predict_proba(grid)
+
+    top_n = min(top_n, proba.shape[1])
+    # Stable sort keeps rf_model.predict's tie-break (lowest class index wins)
+    top_idx = np.argsort(-proba, axis=1, kind="stable")[:, :top_n]
+    top_proba = np.take_along_axis(proba, top_idx, axis=1)
+    top_movie_ids = le_movie.classes_[rf_model.classes_[top_idx]]
+
+    return RFLookupTable(
+        le_mood.classes_, le_context.classes_, le_time.classes_,
+        top_movie_ids.reshape(shape + (top_n,)),
+        top_proba.reshape(shape + (top_n,)),
+    )
@@ -0,0 +1,50 @@
+"""
+Item-item similarity index over the TF-IDF catalog matrix.
+
+Built once at load time. Because every row is L2-normalized, the average
+cosine similarity between a title and a set of watched titles equals the dot
+product between that title and the centroid of the watched rows. History
+similarity therefore costs one sparse matrix-vector product per request,
+regardless of how many titles the user has watched.
+"""
+import numpy as np
+
+
+class ItemSimilarityIndex:
+    def __init__(self, tfidf_matrix):
+        from sklearn.preprocessing import normalize
+
+        matrix = tfidf_matrix.tocsr()
+        row_norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        if np.allclose(row_norms[row_norms > 0], 1.0):
+            # TfidfVectorizer output is already L2-normalized; reuse it so a
+            # memory-mapped matrix stays shared instead of being copied per worker
+            self.matrix = matrix
+        else:
+            # Rows with no terms stay all-zero, matching cosine_similarity's behaviour
+            self.matrix = normalize(matrix, norm="l2", copy=True)
+        self.n_items, self.n_features = self.matrix.shape
+
+    def row_vector(self, row):
+        """Dense normalized feature vector for a single catalog row"""
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        vec = np.zeros(self.n_features, dtype=np.float64)
+        vec[self.matrix.indices[start:end]] = self.matrix.data[start:end]
+        return vec
+
+    def centroid(self, rows):
+        """Mean of the normalized rows (a user's taste vector), or None if empty"""
+        if len(rows) == 0:
+            return None
+        return np.asarray(self.matrix[rows].mean(axis=0)).ravel()
+
+    def scores_for_vector(self, vector):
+        """Similarity of every catalog row to a dense feature vector"""
+        return self.matrix @ vector
+
+    def history_similarity(self, rows):
+        """Average cosine similarity of every catalog row to the given rows"""
+        centroid = self.centroid(rows)
+        if centroid is None:
+            return np.zeros(self.n_items, dtype=np.float64)
+        return self.scores_for_vector(centroid)
@@ -0,0 +1,112 @@
+"""
+Cached per-user taste vectors.
+
+A taste vector is the running mean of the (normalized) TF-IDF rows of the
+titles a user has watched. Entries are kept in a bounded LRU; a miss rebuilds
+the vector from the history store, and new watches update a cached vector in
+place without touching the store.
+
+Each entry remembers the history version it was built from, and get() checks
+it against the store, so a watch recorded by another worker sharing the store
+makes the entry rebuild on its next read.
+"""
+import threading
+from collections import OrderedDict
+
+# A build that races with new watches is retried this many times before it is served uncached
+BUILD_ATTEMPTS = 3
+
+
+class TasteProfileCache:
+    def __init__(self, similarity_index, title_index, load_history, history_version, maxsize=10000):
+        self.similarity_index = similarity_index
+        self.title_index = title_index  # artifacts.KeyIndex over catalog titles
+        self.load_history = load_history
+        self.history_version = history_version  # user_id -> version that changes with every watch
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # user_id -> [watched_count, mean_vector or None, history version]
+        # user_id -> [builds in flight, history version]; record_watch bumps the version even for
+        # uncached users, so a build that raced with a watch is not cached
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return the user's taste vector, or None if they have no catalog titles watched"""
+        history_version = self.history_version(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[2] == history_version:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        for attempt in range(BUILD_ATTEMPTS):
+            if attempt:
+                history_version = self.history_version(user_id)
+            with self._lock:
+                state = self._building.setdefault(user_id, [0, 0])
+                state[0] += 1
+                version = state[1]
+            # The store version is read before the history, so a watch landing in between
+            # leaves the entry looking older than it is and it is rebuilt on the next read
+            entry = self._build(user_id) + [history_version]
+            with self._lock:
+                state = self._building[user_id]
+                raced = state[1] != version
+                state[0] -= 1
+                if state[0] == 0:
+                    del self._building[user_id]
+                if not raced:
+                    current = self._entries.get(user_id)
+                    if current is None or current[2] != history_version:
+                        self._entries[user_id] = current = entry
+                    # else another build finished first from the same history
+                    self._entries.move_to_end(user_id)
+                    self._evict()
+                    return current[1]
+        # Watches kept landing mid-build: serve the latest build without caching it
+        return entry[1]
+
+    def record_watch(self, user_id, show_title):
+        """Fold a newly watched title into a cached vector (history listener)"""
+        with self._lock:
+            state = self._building.get(user_id)
+            if state is not None:
+                state[1] += 1
+        row = self.title_index.get(show_title)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                # Not cached: the next get() rebuilds from the store, which already has the title
+                return
+            count, mean, history_version = entry
+            if row is None:
+                # Off-catalog titles leave the vector alone but still count towards the version
+                entry[2] = history_version + 1
+                return
+            vec = self.similarity_index.row_vector(row)
+            count += 1
+            if mean is None:
+                mean = vec
+            else:
+                # Running mean; replace rather than mutate so readers holding the old array are safe
+                mean = mean + (vec - mean) / count
+            # The watch is already in the store (or its queue), one version past this entry;
+            # if another worker wrote in between, the version check on the next get() rebuilds
+            self._entries[user_id] = [count, mean, history_version + 1]
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize}
+
+    def _build(self, user_id):
+        rows = self.title_index.get_many(self.load_history(user_id))
+        rows = rows[rows >= 0]
+        return [len(rows), self.similarity_index.centroid(rows)]
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
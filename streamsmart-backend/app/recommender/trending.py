@@ -0,0 +1,180 @@
+"""
+Trending titles and genres from recent activity.
+
+Recommendations served, watches added and positive ratings are fed in as
+weighted events. Each is counted with exponential time decay (half-life
+TRENDING_HALF_LIFE_HOURS), so a title's score is a running sum of
+weight * 0.5 ** (age / half_life) and old activity fades out on its own.
+
+- Forward decay: an event is stored as weight * exp(rate * (t - landmark)),
+  so counts never have to be aged on a timer; reading divides by the same
+  factor for "now". The landmark moves forward (rescaling every count)
+  before the factor can overflow.
+- Space-Saving: each counter keeps at most `capacity` keys. A new key
+  replaces the current minimum and inherits its count, which keeps every
+  true heavy hitter in the table. Memory is fixed by the capacities, no
+  matter how many events or titles arrive.
+- One title counter per genre plus an overall one, so "top trending in
+  genre G" is a top-n over at most `capacity` entries, independent of
+  catalog size and event volume.
+
+Counts live in process memory and start empty on restart; trends rebuild
+within a few half-lives of traffic. They are not shared between workers:
+each process only counts the events it handled, so with N workers a
+trending request sees roughly 1/N of the traffic (the ranking is still
+representative when requests are spread evenly).
+"""
+import heapq
+import math
+import os
+import threading
+import time
+
+# Relative weight of each kind of event
+EVENT_WEIGHTS = {
+    "recommendation": 1.0,
+    "history": 3.0,
+    "feedback": 2.0,
+}
+
+# Rescale once stored counts carry a factor of e**RESCALE_EXPONENT (well inside float range)
+RESCALE_EXPONENT = 200.0
+
+ALL_GENRES = "*"
+
+
+class DecayedTopK:
+    """Space-Saving counter over forward-decayed weights (the engine owns the landmark)"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}  # key -> weight scaled to the shared landmark
+
+    def add(self, key, scaled_weight):
+        count = self.counts.get(key)
+        if count is not None:
+            self.counts[key] = count + scaled_weight
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = scaled_weight
+        else:
+            # Replace the smallest key; the newcomer inherits its count (Space-Saving overestimate)
+            victim = min(self.counts, key=self.counts.__getitem__)
+            self.counts[key] = self.counts.pop(victim) + scaled_weight
+
+    def rescale(self, factor):
+        for key in self.counts:
+            self.counts[key] *= factor
+
+    def top(self, n):
+        return heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
+
+
+class TrendingEngine:
+    def __init__(self, half_life_hours=24.0, capacity=200, max_genres=64):
+        self.rate = math.log(2) / (half_life_hours * 3600.0)
+        self.capacity = capacity
+        self.max_genres = max_genres
+        self._landmark = time.time()
+        self._titles = {ALL_GENRES: DecayedTopK(capacity)}  # genre -> title counter
+        self._genres = DecayedTopK(max_genres)
+        self._title_genres = {}  # title -> genre, for titles currently in the overall counter
+        self._genre_resolver = None
+        self._lock = threading.Lock()
+        self.events = 0
+
+    def set_genre_resolver(self, resolver):
+        """resolver(title) -> genre or None, for events that only name a title"""
+        self._genre_resolver = resolver
+
+    def record(self, title, genre=None, event="recommendation", weight=1.0, now=None):
+        """Count one event for a title (genre is looked up when not given)"""
+        self.record_many([(title, genre)], event, weight, now)
+
+    def record_many(self, items, event="recommendation", weight=1.0, now=None):
+        """Count (title, genre) events of one kind with a single lock acquisition"""
+        weight *= EVENT_WEIGHTS.get(event, 1.0)
+        if weight <= 0 or not items:
+            return
+        now = time.time() if now is None else now
+        items = [
+            (title, genre if genre is not None else self._resolve(title))
+            for title, genre in items
+            if title
+        ]
+        with self._lock:
+            exponent = self.rate * (now - self._landmark)
+            if exponent > RESCALE_EXPONENT:
+                self._move_landmark(now)
+                exponent = 0.0
+            scaled = weight * math.exp(exponent)
+            overall = self._titles[ALL_GENRES]
+            for title, genre in items:
+                overall.add(title, scaled)
+                if genre:
+                    self._title_genres[title] = genre
+                    self._genres.add(genre, scaled)
+                    counter = self._titles.get(genre)
+                    if counter is None and len(self._titles) <= self.max_genres:
+                        counter = self._titles[genre] = DecayedTopK(self.capacity)
+                    if counter is not None:
+                        counter.add(title, scaled)
+                self.events += 1
+            if len(self._title_genres) > 2 * self.capacity:
+                self._title_genres = {t: self._title_genres[t] for t in overall.counts if t in self._title_genres}
+
+    def _resolve(self, title):
+        if self._genre_resolver is None:
+            return None
+        try:
+            return self._genre_resolver(title)
+        except Exception:
+            return None
+
+    def _move_landmark(self, now):
+        factor = math.exp(-self.rate * (now - self._landmark))
+        for counter in self._titles.values():
+            counter.rescale(factor)
+        self._genres.rescale(factor)
+        self._landmark = now
+
+    def _decay(self, now):
+        return math.exp(-self.rate * (now - self._landmark))
+
+    def top(self, genre=None, n=10, exclude=(), now=None):
+        """Top trending titles overall or within a genre: [{"title", "genre", "score"}], best first"""
+        now = time.time() if now is None else now
+        exclude = set(exclude)
+        with self._lock:
+            counter = self._titles.get(genre or ALL_GENRES)
+            if counter is None:
+                return []
+            decay = self._decay(now)
+            ranked = counter.top(n + len(exclude))
+            return [
+                {"title": title, "genre": genre or self._title_genres.get(title), "score": round(count * decay, 4)}
+                for title, count in ranked
+                if title not in exclude
+            ][:n]
+
+    def top_genres(self, n=5, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            decay = self._decay(now)
+            return [{"genre": genre, "score": round(count * decay, 4)} for genre, count in self._genres.top(n)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "events": self.events,
+                "half_life_hours": round(math.log(2) / self.rate / 3600.0, 2),
+                "capacity": self.capacity,
+                "genres_tracked": len(self._titles) - 1,
+                "titles_tracked": sum(len(counter.counts) for counter in self._titles.values()),
+            }
+
+
+trending = TrendingEngine(
+    half_life_hours=float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24")),
+    capacity=int(os.getenv("TRENDING_CAPACITY", "200")),
+    max_genres=int(os.getenv("TRENDING_MAX_GENRES", "64"))
+)
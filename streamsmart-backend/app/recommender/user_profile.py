@@ -1,32 +1,63 @@
 #This file simply keeps track of what each user has watched
 
-import json
 import os
-import pandas as pd
+import threading
+from app.recommender.history_store import DEFAULT_JSON_PATH, create_history_store
+from app.recommender.write_behind import write_queue
 
-# Get the path relative to the backend root
-base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-USER_HISTORY_FILE = os.path.join(base_dir, "data", "user_history.json")
+USER_HISTORY_FILE = os.getenv("USER_HISTORY_FILE") or DEFAULT_JSON_PATH
+
+# SQLite (default) or the original JSON file, per USER_HISTORY_BACKEND (see history_store.py)
+history_store = create_history_store()
+
+# New watches are acknowledged at once and persisted in batches by the write-behind queue
+write_queue.register("history", history_store.add_many)
+_add_lock = threading.Lock()
+
+# Callbacks notified with (user_id, show_title) whenever a title is newly added
+_history_listeners = []
+
+def register_history_listener(callback):
+    _history_listeners.append(callback)
+
+def get_history_version(user_id):
+    """
+    How many titles the user has watched, read from the store (plus queued watches).
+
+    Histories only grow, so this changes with every new watch, including ones
+    recorded by other workers sharing the store; cached results and taste
+    vectors keyed on it go stale as soon as any worker records a watch.
+    """
+    if write_queue.pending("history", user_id):
+        return len(get_user_history(user_id))
+    return history_store.count(user_id)
 
 def load_user_history():
-    if not os.path.exists(USER_HISTORY_FILE):
-        with open(USER_HISTORY_FILE, "w") as f:
-            json.dump({}, f)
-    with open(USER_HISTORY_FILE, "r") as f:
-        return json.load(f)
+    pending = write_queue.pending_kind("history")
+    history = history_store.load_all()
+    for user_id, show_title in pending:
+        user_data = history.setdefault(user_id, [])
+        if show_title not in user_data:
+            user_data.append(show_title)
+    return history
 
 def save_user_history(history):
-    with open(USER_HISTORY_FILE, "w") as f:
-        json.dump(history, f, indent=2)
+    write_queue.flush()
+    history_store.save_all(history)
 
 def add_to_history(user_id, show_title):
-    history = load_user_history()
-    user_data = history.get(user_id, [])
-    if show_title not in user_data:
-        user_data.append(show_title)
-        history[user_id] = user_data
-        save_user_history(history)
+    with _add_lock:
+        if show_title in get_user_history(user_id):
+            return
+        write_queue.submit("history", user_id, (user_id, show_title))
+    for callback in _history_listeners:
+        callback(user_id, show_title)
 
 def get_user_history(user_id):
-    history = load_user_history()
-    return history.get(user_id, [])
+    # Queued watches are read first so one that is flushed in between is still seen once
+    pending = write_queue.pending("history", user_id)
+    history = history_store.get(user_id)
+    for _, show_title in pending:
+        if show_title not in history:
+            history.append(show_title)
+    return history
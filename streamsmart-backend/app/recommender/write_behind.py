@@ -0,0 +1,285 @@
+"""
+Write-behind buffer for request-path persistence.
+
+Chat, history and feedback writes are queued in memory and acknowledged
+immediately. A background thread flushes them in batches, every
+WRITE_BEHIND_INTERVAL_MS or as soon as WRITE_BEHIND_MAX_BATCH items are
+waiting, so a request never waits on file I/O or fsync.
+
+- Each kind of write registers a writer that persists a whole batch in one
+  go (one append + fsync, one SQLite transaction, one JSON rewrite).
+- pending(kind, key) returns queued and in-flight items so readers can
+  merge them in: a user always sees their own writes, even before a flush.
+- flush() drains synchronously. stop() (app shutdown, and interpreter exit)
+  flushes with retries, so acknowledged writes are not lost on a clean exit.
+- If a writer fails, its items move to that kind's retry list and are
+  retried with exponential backoff (WRITE_BEHIND_RETRY_MS doubling up to
+  WRITE_BEHIND_MAX_RETRY_MS). Later items of the same kind wait behind them
+  to keep submit order; other kinds keep flushing normally.
+- At most WRITE_BEHIND_MAX_PENDING items are held (queued or retrying).
+  Past that, submit() drains the backlog on the caller's thread (so it can
+  block on file I/O: call it from a worker thread, not the event loop). If
+  a failing writer still keeps it full, an item whose kind still has
+  unwritten items waits behind them (keeping submit order); any other item
+  is written through synchronously, and a failure surfaces to the caller.
+- Whatever stop() still cannot write is appended to a dead-letter JSONL
+  file (WRITE_BEHIND_DEAD_LETTER_FILE) for manual replay, never dropped.
+
+WRITE_BEHIND_ENABLED=0 makes submit() write through synchronously.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+
+base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# Flush attempts stop() makes (backing off between them) before writing leftovers to the dead-letter file
+STOP_ATTEMPTS = 3
+
+
+class WriteBehindQueue:
+    def __init__(self, interval=0.2, max_batch=256, enabled=True, max_pending=10000,
+                 retry_delay=0.5, max_retry_delay=30.0, dead_letter_path=None):
+        self.interval = interval
+        self.max_batch = max_batch
+        self.enabled = enabled
+        self.max_pending = max_pending
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.dead_letter_path = dead_letter_path
+        self._writers = {}
+        self._queue = deque()  # (kind, key, payload, enqueued_at)
+        self._retry = {}  # kind -> items of a failed write, oldest first
+        self._retry_at = {}  # kind -> perf_counter time of the next attempt
+        self._failures = {}  # kind -> consecutive failed attempts
+        self._inflight = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.flushed = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_seconds = 0.0
+        self.max_wait_ms = 0.0
+        self.overflows = 0
+        self.dead_lettered = 0
+
+    def register(self, kind, writer):
+        """writer(payloads) persists a list of payloads of this kind, in order"""
+        self._writers[kind] = writer
+
+    def submit(self, kind, key, payload):
+        """Queue a write and return immediately (writes through when disabled)"""
+        if not self.enabled:
+            self._writers[kind]([payload])
+            return
+        if self._depth() >= self.max_pending:
+            with self._lock:
+                self.overflows += 1
+            # Backpressure: drain on the caller's thread, retrying failed kinds now
+            self.flush(force=True)
+            if self._depth() >= self.max_pending:
+                item = (kind, key, payload, time.perf_counter())
+                with self._lock:
+                    # Writing it now would put it ahead of older items of its kind
+                    if kind in self._retry:
+                        self._retry[kind].append(item)
+                        return
+                    if any(inflight[0] == kind for inflight in self._inflight):
+                        self._queue.append(item)
+                        return
+                print(f"⚠️  Write-behind queue full ({self.max_pending} items), writing {kind} through")
+                self._writers[kind]([payload])
+                return
+        with self._lock:
+            self._queue.append((kind, key, payload, time.perf_counter()))
+            depth = len(self._queue)
+        self._ensure_started()
+        if depth >= self.max_batch:
+            self._wake.set()
+
+    def _depth(self):
+        with self._lock:
+            return len(self._queue) + sum(len(items) for items in self._retry.values())
+
+    def _unwritten(self):
+        """Every item not yet persisted, oldest first within each kind (caller holds _lock)"""
+        return [item for items in self._retry.values() for item in items] + self._inflight + list(self._queue)
+
+    def pending(self, kind, key):
+        """Payloads for (kind, key) not yet persisted, oldest first"""
+        with self._lock:
+            return [
+                payload
+                for item_kind, item_key, payload, _ in self._unwritten()
+                if item_kind == kind and item_key == key
+            ]
+
+    def pending_kind(self, kind):
+        with self._lock:
+            return [payload for item_kind, _, payload, _ in self._unwritten() if item_kind == kind]
+
+    def flush(self, force=False):
+        """
+        Persist everything queued so far; returns the number of items written.
+
+        Kinds still backing off after a failure are skipped (their new items
+        wait behind the retry list) unless force is set. A failing kind is
+        tried at most once per call.
+        """
+        written = 0
+        attempted = set()
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+                    groups = {}
+                    for item in batch:
+                        groups.setdefault(item[0], []).append(item)
+                    now = time.perf_counter()
+                    for kind, items in list(self._retry.items()):
+                        if kind not in attempted and (force or now >= self._retry_at[kind]):
+                            groups[kind] = self._retry.pop(kind) + groups.get(kind, [])
+                        elif kind in groups:
+                            items.extend(groups.pop(kind))
+                    if not groups:
+                        return written
+                    self._inflight = [item for items in groups.values() for item in items]
+                start = time.perf_counter()
+                failed = self._write_groups(groups)
+                elapsed = time.perf_counter() - start
+                attempted.update(failed)
+                count = sum(len(items) for kind, items in groups.items() if kind not in failed)
+                with self._lock:
+                    self._inflight = []
+                    for kind in groups:
+                        if kind in failed:
+                            self._failures[kind] = self._failures.get(kind, 0) + 1
+                            delay = min(self.retry_delay * 2 ** (self._failures[kind] - 1), self.max_retry_delay)
+                            self._retry[kind] = groups[kind]
+                            self._retry_at[kind] = start + elapsed + delay
+                        else:
+                            self._failures.pop(kind, None)
+                            self._retry_at.pop(kind, None)
+                    self.errors += len(failed)
+                    self.flushed += count
+                    self.batches += 1
+                    self.total_flush_seconds += elapsed
+                    self.last_flush_ms = elapsed * 1000
+                    self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+                    self.max_wait_ms = max(
+                        self.max_wait_ms, (start - min(items[0][3] for items in groups.values())) * 1000
+                    )
+                written += count
+
+    def _write_groups(self, groups):
+        """Hand each writer its items (in submit order); returns the kinds whose writer failed"""
+        failed = set()
+        for kind, items in groups.items():
+            try:
+                self._writers[kind]([payload for _, _, payload, _ in items])
+            except Exception as e:
+                print(f"⚠️  Write-behind flush of {len(items)} {kind} items failed, will retry: {e}")
+                failed.add(kind)
+        return failed
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def stop(self):
+        """Stop the flusher and durably write whatever is still queued (retrying, then dead-lettering)"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        for attempt in range(STOP_ATTEMPTS):
+            if attempt:
+                time.sleep(min(self.retry_delay * 2 ** (attempt - 1), self.max_retry_delay))
+            self.flush(force=True)
+            if not self._depth():
+                return
+        self._dead_letter()
+
+    def _dead_letter(self):
+        """Append every item that could not be written to the dead-letter file"""
+        with self._lock:
+            items = self._unwritten()
+            self._retry.clear()
+            self._retry_at.clear()
+            self._queue.clear()
+        if not items:
+            return
+        kinds = sorted({item[0] for item in items})
+        if self.dead_letter_path:
+            try:
+                os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+                with open(self.dead_letter_path, "a") as f:
+                    for kind, key, payload, _ in items:
+                        f.write(json.dumps({"kind": kind, "key": key, "payload": payload}, default=str) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                with self._lock:
+                    self.dead_lettered += len(items)
+                print(f"⚠️  {len(items)} unwritten {'/'.join(kinds)} items saved to {self.dead_letter_path}")
+                return
+            except (OSError, TypeError, ValueError) as e:
+                print(f"⚠️  Could not save unwritten items to {self.dead_letter_path}: {e}")
+        print(f"❌ Lost {len(items)} unwritten {'/'.join(kinds)} items:")
+        for kind, key, payload, _ in items:
+            print(f"   {kind} {key!r}: {payload!r}")
+
+    def stats(self):
+        with self._lock:
+            unwritten = self._unwritten()
+            oldest = min((item[3] for item in unwritten), default=None)
+            return {
+                "enabled": self.enabled,
+                "queue_depth": len(self._queue),
+                "retrying": {kind: len(items) for kind, items in self._retry.items()},
+                "in_flight": len(self._inflight),
+                "oldest_pending_ms": round((time.perf_counter() - oldest) * 1000, 1) if oldest else 0.0,
+                "flushed_items": self.flushed,
+                "flush_batches": self.batches,
+                "avg_batch_size": round(self.flushed / self.batches, 2) if self.batches else 0.0,
+                "avg_flush_ms": round(self.total_flush_seconds / self.batches * 1000, 2) if self.batches else 0.0,
+                "last_flush_ms": round(self.last_flush_ms, 2),
+                "max_flush_ms": round(self.max_flush_ms, 2),
+                "max_queue_wait_ms": round(self.max_wait_ms, 1),
+                "flush_errors": self.errors,
+                "overflows": self.overflows,
+                "dead_lettered": self.dead_lettered,
+            }
+
+
+# Shared by conversation memory, user history and feedback
+write_queue = WriteBehindQueue(
+    interval=float(os.getenv("WRITE_BEHIND_INTERVAL_MS", "200")) / 1000,
+    max_batch=int(os.getenv("WRITE_BEHIND_MAX_BATCH", "256")),
+    enabled=os.getenv("WRITE_BEHIND_ENABLED", "1") != "0",
+    max_pending=int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000")),
+    retry_delay=float(os.getenv("WRITE_BEHIND_RETRY_MS", "500")) / 1000,
+    max_retry_delay=float(os.getenv("WRITE_BEHIND_MAX_RETRY_MS", "30000")) / 1000,
+    dead_letter_path=os.getenv("WRITE_BEHIND_DEAD_LETTER_FILE")
+    or os.path.join(base_dir, "data", "write_behind_unflushed.jsonl")
+)
+atexit.register(write_queue.stop)
@@ -1,16 +1,21 @@
 """
 Analytics and insights endpoints
 """
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
 from app.recommender.conversation_memory import (
     get_user_conversations,
-    get_user_mood_history,
+    get_user_conversation_summary,
     get_user_genre_preferences
 )
 from app.recommender.user_profile import get_user_history
+from app.recommender.trending import trending
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
+# Each trending counter keeps at most `capacity` titles, so larger limits could never be filled
+TRENDING_MAX_LIMIT = trending.capacity
+
 @router.get("/user/{user_id}/insights")
 def get_user_insights(user_id: str):
     """
@@ -18,8 +23,10 @@ def get_user_insights(user_id: str):
     """
     try:
         watch_history = get_user_history(user_id)
-        mood_history = get_user_mood_history(user_id)
-        genre_preferences = get_user_genre_preferences(user_id)
+        # Materialized counters: one read, independent of how many conversations the user has
+        summary = get_user_conversation_summary(user_id)
+        mood_history = summary["moods"]
+        genre_preferences = summary["genres"]
         recent_conversations = get_user_conversations(user_id, limit=5)
         
         # Calculate top mood
@@ -43,27 +50,56 @@ def get_user_insights(user_id: str):
         raise HTTPException(status_code=500, detail=f"Error fetching insights: {str(e)}")
 
 @router.get("/user/{user_id}/recommendations/trending")
-def get_trending_for_user(user_id: str):
+def get_trending_for_user(user_id: str, limit: int = Query(10, ge=1, le=TRENDING_MAX_LIMIT)):
     """
     Get trending content based on user's preferences
+
+    Trending counts are kept in memory by the worker serving the request:
+    they start empty after a restart, and with several workers each one
+    only counts the activity it handled itself.
     """
     try:
         genre_preferences = get_user_genre_preferences(user_id)
+        watched = get_user_history(user_id)
         
         if not genre_preferences:
             return {
-                "message": "No preference data yet. Start chatting to build your profile!",
-                "trending": []
+                "message": "No preference data yet. Start chatting to build your profile! Here's what's trending overall.",
+                "trending": trending.top(n=limit, exclude=watched)
             }
         
         # Get top genre
         top_genre = max(genre_preferences.items(), key=lambda x: x[1])[0]
         
+        # Titles the user has already watched are skipped; fill up from overall trends if the genre is quiet
+        titles = trending.top(genre=top_genre, n=limit, exclude=watched)
+        if len(titles) < limit:
+            seen = set(watched) | {t["title"] for t in titles}
+            titles += trending.top(n=limit - len(titles), exclude=seen)
+        
         return {
             "user_id": user_id,
             "top_genre": top_genre,
-            "message": f"Based on your interest in {top_genre}, here's what's trending!"
+            "message": f"Based on your interest in {top_genre}, here's what's trending!",
+            "trending": titles
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching trending: {str(e)}")
 
+@router.get("/trending")
+def get_trending(genre: Optional[str] = None, limit: int = Query(10, ge=1, le=TRENDING_MAX_LIMIT)):
+    """
+    Trending titles overall or within one genre, plus the trending genres
+
+    Trending counts are kept in memory by the worker serving the request:
+    they start empty after a restart, and with several workers each one
+    only counts the activity it handled itself.
+    """
+    try:
+        return {
+            "genre": genre,
+            "trending": trending.top(genre=genre, n=limit),
+            "top_genres": trending.top_genres(),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching trending: {str(e)}")
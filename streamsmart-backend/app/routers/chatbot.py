@@ -1,17 +1,31 @@
-from fastapi import APIRouter, HTTPException
+import os
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List
-from app.recommender import get_recommendations
+from app.recommender import get_recommendations_async, get_recommendations_batch_async
 from app.recommender.user_profile import add_to_history, get_user_history
-from app.recommender.conversation_memory import add_conversation, get_user_conversations
-from app.recommender.mood_extractor import get_active_mode
+from app.recommender.conversation_memory import add_conversation, get_user_conversations, conversation_log
+from app.recommender.mood_extractor import get_active_mode, get_extraction_stats, mood_cache
+from app.recommender import recommender
+from app.recommender.recommender import result_cache
+from app.recommender.metadata_index import build_filter
+from app.recommender.home_feed import HOME_FEED_PROMPT, HOME_FEED_TOP_N, history_fingerprint, home_feed_reader
+from app.recommender.write_behind import write_queue
+from app.recommender.trending import trending
 
 router = APIRouter(prefix="/api", tags=["chatbot"])
 
+CHAT_BATCH_MAX_REQUESTS = int(os.getenv("CHAT_BATCH_MAX_REQUESTS", "5000"))
+
 class ChatRequest(BaseModel):
     user_id: str
     message: str
     top_n: Optional[int] = 5
+    debug: Optional[bool] = False
+
+class BatchChatRequest(BaseModel):
+    requests: List[ChatRequest]
 
 class HistoryRequest(BaseModel):
     user_id: str
@@ -22,27 +36,36 @@ class RecommendationResponse(BaseModel):
     extracted_mood: dict
     recommendations: List[dict]
     message: str
+    debug: Optional[dict] = None
 
 @router.post("/chat", response_model=RecommendationResponse)
-def chat_recommend(req: ChatRequest):
+async def chat_recommend(req: ChatRequest, genre: Optional[str] = None, exclude_watched: bool = False):
     """
     Main chatbot endpoint that takes user message and returns personalized recommendations
+
+    Optional query parameters pre-filter the results:
+    ?genre=Comedy,Drama (any of these genres) and ?exclude_watched=true (skip watched titles)
     """
     try:
-        # Get recommendations using the AI recommender
-        result = get_recommendations(
+        # Get recommendations using the AI recommender (LLM call is awaited, not thread-blocking)
+        result = await get_recommendations_async(
             user_id=req.user_id,
             user_prompt=req.message,
-            top_n=req.top_n
+            top_n=req.top_n,
+            debug=bool(req.debug),
+            filters=build_filter(genre, exclude_watched)
         )
         
-        # Save conversation to memory
-        add_conversation(
+        # Save conversation to memory in a worker thread: a write-through, or a full
+        # write-behind queue applying backpressure, does file I/O on the caller's thread
+        await run_in_threadpool(
+            add_conversation,
             user_id=req.user_id,
             message=req.message,
             mood=result["extracted_mood"],
             recommendations=result["recommendations"]
         )
+        trending.record_many([(rec["title"], rec.get("genre")) for rec in result["recommendations"]])
         
         # Create a friendly message
         mood = result["extracted_mood"].get("mood", "neutral")
@@ -54,9 +77,79 @@ def chat_recommend(req: ChatRequest):
             **result,
             "message": message
         }
+    except recommender.ModelUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating recommendations: {str(e)}")
 
+@router.post("/chat/batch")
+async def chat_recommend_batch(req: BatchChatRequest):
+    """
+    Recommendations for many users/prompts in one call (feed pre-warming, offline jobs).
+    
+    Prompts are vectorized and scored together. Unlike /chat, nothing is
+    logged to conversation memory or trending: these are not user turns.
+    """
+    if len(req.requests) > CHAT_BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=413, detail=f"At most {CHAT_BATCH_MAX_REQUESTS} requests per batch")
+    try:
+        results = await get_recommendations_batch_async([
+            {"user_id": r.user_id, "message": r.message, "top_n": 5 if r.top_n is None else r.top_n}
+            for r in req.requests
+        ])
+        return {"results": results}
+    except recommender.ModelUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating recommendations: {str(e)}")
+
+def _precomputed_feed(user_id, limit):
+    """The user's precomputed home feed response, or None if there is no current one (blocking I/O)"""
+    feed = home_feed_reader.current()
+    entry = feed.get(user_id) if feed is not None else None
+    # A feed built before the user's latest watches is stale; score it live instead
+    if entry is None or entry[2] != history_fingerprint(get_user_history(user_id)) or not recommender.is_ready():
+        return None
+    movie_ids, scores, _ = entry
+    if limit is not None:
+        movie_ids, scores = movie_ids[:limit], scores[:limit]
+    return {
+        "user_id": user_id,
+        "source": "precomputed",
+        "generated_at": feed.manifest["created_at"],
+        "recommendations": recommender.records_for_movie_ids(recommender.get_model(), movie_ids, scores)
+    }
+
+@router.get("/feed/{user_id}")
+async def get_home_feed(user_id: str, limit: Optional[int] = Query(None, ge=1)):
+    """
+    Home feed for a user: the precomputed one (python -m app.recommender.home_feed build)
+    when it is current, else live recommendations for the generic home prompt.
+    """
+    try:
+        # History (SQLite) and the feed files are read in a worker thread, off the event loop
+        precomputed = await run_in_threadpool(_precomputed_feed, user_id, limit)
+        if precomputed is not None:
+            return precomputed
+
+        result = await get_recommendations_async(
+            user_id=user_id,
+            user_prompt=HOME_FEED_PROMPT,
+            top_n=HOME_FEED_TOP_N if limit is None else limit
+        )
+        return {
+            "user_id": user_id,
+            "source": "live",
+            "generated_at": None,
+            "recommendations": result["recommendations"]
+        }
+    except recommender.ModelUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching home feed: {str(e)}")
+
 @router.post("/history")
 def add_user_history(req: HistoryRequest):
     """
@@ -89,16 +182,23 @@ def get_system_status():
     mode_descriptions = {
         "azure_openai": "Azure OpenAI GPT (Best - Enterprise grade)",
         "openai": "OpenAI API GPT (Good - Cloud-based)",
-        "rule_based": "Rule-based (Works offline - No API needed)"
+        "rule_based": "Rule-based (Works offline - No API needed)",
+        "local_classifier": "Local classifier (Offline - escalates uncertain prompts to the LLM)"
     }
     
     return {
         "mood_extraction": {
             "active_mode": mood_mode,
             "description": mode_descriptions.get(mood_mode, "Unknown"),
-            "is_ai_powered": mood_mode in ["azure_openai", "openai"]
+            "is_ai_powered": mood_mode in ["azure_openai", "openai", "local_classifier"],
+            "cache": mood_cache.stats(),
+            "resilience": get_extraction_stats()
         },
         "recommendation_engine": "Active",
+        "recommendation_cache": result_cache.stats(),
+        "conversation_log": conversation_log.stats(),
+        "write_behind": write_queue.stats(),
+        "trending": trending.stats(),
         "analytics": "Active",
         "feedback_system": "Active"
     }
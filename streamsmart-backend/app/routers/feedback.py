@@ -5,13 +5,12 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 import json
-import os
+from app.recommender.feedback_store import feedback_store, SHOW_RATINGS, RECOMMENDATION_FEEDBACK
+from app.recommender.write_behind import write_queue
+from app.recommender.trending import trending
 
 router = APIRouter(prefix="/api/feedback", tags=["feedback"])
 
-base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-FEEDBACK_FILE = os.path.join(base_dir, "data", "feedback.json")
-
 class FeedbackRequest(BaseModel):
     user_id: str
     show_title: str
@@ -25,19 +24,17 @@ class RecommendationFeedback(BaseModel):
     accuracy_score: int  # 1-5
     comment: Optional[str] = None
 
+# Ratings are queued and appended in batches to the append-only feedback log (one write + fsync per flush)
+write_queue.register("feedback", feedback_store.append_many)
+
 def load_feedback():
-    if not os.path.exists(FEEDBACK_FILE):
-        return {"show_ratings": [], "recommendation_feedback": []}
-    try:
-        with open(FEEDBACK_FILE, "r") as f:
-            return json.load(f)
-    except Exception:
-        return {"show_ratings": [], "recommendation_feedback": []}
+    write_queue.flush()
+    return feedback_store.load_all()
 
 def save_feedback(feedback):
     try:
-        with open(FEEDBACK_FILE, "w") as f:
-            json.dump(feedback, f, indent=2)
+        write_queue.flush()
+        feedback_store.replace_all(feedback)
     except Exception as e:
         print(f"Error saving feedback: {e}")
 
@@ -47,8 +44,6 @@ def rate_show(feedback: FeedbackRequest):
     Rate a show after watching
     """
     try:
-        all_feedback = load_feedback()
-        
         feedback_entry = {
             "user_id": feedback.user_id,
             "show_title": feedback.show_title,
@@ -58,8 +53,10 @@ def rate_show(feedback: FeedbackRequest):
             "timestamp": json.dumps(__import__('datetime').datetime.now(), default=str)
         }
         
-        all_feedback["show_ratings"].append(feedback_entry)
-        save_feedback(all_feedback)
+        write_queue.submit("feedback", None, (feedback_store.new_write_id(), SHOW_RATINGS, feedback_entry))
+        # Liked / well-rated shows count toward trending, in proportion to the rating
+        if feedback.liked or feedback.rating >= 4:
+            trending.record(feedback.show_title, event="feedback", weight=max(feedback.rating, 1) / 5)
         
         return {
             "message": "Thank you for your feedback!",
@@ -74,8 +71,6 @@ def rate_recommendation(feedback: RecommendationFeedback):
     Rate the quality of recommendations
     """
     try:
-        all_feedback = load_feedback()
-        
         feedback_entry = {
             "user_id": feedback.user_id,
             "recommendation_helpful": feedback.recommendation_helpful,
@@ -84,8 +79,7 @@ def rate_recommendation(feedback: RecommendationFeedback):
             "timestamp": json.dumps(__import__('datetime').datetime.now(), default=str)
         }
         
-        all_feedback["recommendation_feedback"].append(feedback_entry)
-        save_feedback(all_feedback)
+        write_queue.submit("feedback", None, (feedback_store.new_write_id(), RECOMMENDATION_FEEDBACK, feedback_entry))
         
         return {
             "message": "Thank you for helping us improve!",
@@ -100,24 +94,39 @@ def get_feedback_stats():
     Get overall feedback statistics
     """
     try:
-        feedback = load_feedback()
-        show_ratings = feedback.get("show_ratings", [])
-        rec_feedback = feedback.get("recommendation_feedback", [])
+        # Running totals (plus anything still queued), so this stays O(1) as feedback grows
+        totals = feedback_store.totals(write_queue.pending_kind("feedback"))
+        show_ratings = totals[SHOW_RATINGS]
+        rec_feedback = totals[RECOMMENDATION_FEEDBACK]
         
         # Calculate average ratings
-        avg_show_rating = sum(r["rating"] for r in show_ratings) / len(show_ratings) if show_ratings else 0
-        avg_rec_accuracy = sum(r["accuracy_score"] for r in rec_feedback) / len(rec_feedback) if rec_feedback else 0
+        avg_show_rating = show_ratings["rating_sum"] / show_ratings["count"] if show_ratings["count"] else 0
+        avg_rec_accuracy = rec_feedback["accuracy_sum"] / rec_feedback["count"] if rec_feedback["count"] else 0
         
-        helpful_count = sum(1 for r in rec_feedback if r["recommendation_helpful"])
-        helpful_percentage = (helpful_count / len(rec_feedback) * 100) if rec_feedback else 0
+        helpful_percentage = (rec_feedback["helpful"] / rec_feedback["count"] * 100) if rec_feedback["count"] else 0
         
         return {
-            "total_show_ratings": len(show_ratings),
+            "total_show_ratings": show_ratings["count"],
             "average_show_rating": round(avg_show_rating, 2),
-            "total_recommendation_feedback": len(rec_feedback),
+            "total_recommendation_feedback": rec_feedback["count"],
             "average_accuracy_score": round(avg_rec_accuracy, 2),
             "helpful_percentage": round(helpful_percentage, 2)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching stats: {str(e)}")
 
+@router.get("/show/{show_title}/stats")
+def get_show_feedback_stats(show_title: str):
+    """
+    Rating statistics for one show
+    """
+    try:
+        count, rating_sum, liked = feedback_store.title_totals(show_title, write_queue.pending_kind("feedback"))
+        return {
+            "show_title": show_title,
+            "total_ratings": count,
+            "average_rating": round(rating_sum / count, 2) if count else 0,
+            "liked_percentage": round(liked / count * 100, 2) if count else 0
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching show stats: {str(e)}")
@@ -0,0 +1,97 @@
+"""
+ANN retrieval: IVF candidates vs the exact TF-IDF scan
+======================================================
+Generates a synthetic large catalog with topic structure (each title draws
+its terms from one topic's Zipf-like term distribution), TF-IDF weights and
+L2-normalizes it, then for short prompts compares:
+
+- exact: the full sparse product (ExactRetriever), top-k by similarity
+- ivf: exact similarities over the candidates of the nprobe nearest lists
+
+and reports recall@k against the exact top-k, candidate counts and per-query
+latency for several nprobe values.
+
+Usage (from streamsmart-backend/):
+
+    python -m benchmarks.bench_ann_retrieval [--items 500000] [--features 5000] [--queries 200] [--k 10]
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from app.recommender.ann_index import ExactRetriever, IVFRetriever, build_ivf_index
+
+
+def make_catalog(n_items, n_features, n_topics=200, terms_per_item=12, seed=7):
+    rng = np.random.default_rng(seed)
+    # Each topic prefers its own slice of the vocabulary, with a Zipf-like tail
+    topic_terms = [rng.permutation(n_features)[:200] for _ in range(n_topics)]
+    weights = 1.0 / np.arange(1, 201) ** 1.1
+    weights /= weights.sum()
+    topics = rng.integers(0, n_topics, size=n_items)
+    cols = np.concatenate([rng.choice(topic_terms[t], size=terms_per_item, p=weights) for t in topics])
+    rows = np.repeat(np.arange(n_items), terms_per_item)
+    counts = csr_matrix((np.ones(cols.shape[0]), (rows, cols)), shape=(n_items, n_features))
+    counts.sum_duplicates()
+    idf = np.log((1 + n_items) / (1 + np.bincount(counts.indices, minlength=n_features))) + 1
+    matrix = csr_matrix(counts.multiply(idf))
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    matrix = csr_matrix(matrix.multiply(1 / norms[:, None]))
+    return matrix, topic_terms, weights, rng
+
+
+def make_queries(n_queries, n_features, topic_terms, weights, rng, terms=3):
+    cols = [np.unique(rng.choice(topic_terms[rng.integers(len(topic_terms))], size=terms, p=weights)) for _ in range(n_queries)]
+    queries = []
+    for c in cols:
+        q = csr_matrix((np.ones(len(c)) / np.sqrt(len(c)), (np.zeros(len(c), dtype=int), c)), shape=(1, n_features))
+        queries.append(q)
+    return queries
+
+
+def top_k(rows, sims, k):
+    if rows.shape[0] <= k:
+        return set(rows[np.argsort(-sims)].tolist())
+    best = np.argpartition(-sims, k - 1)[:k]
+    return set(rows[best].tolist())
+
+
+def run(retriever, queries, k):
+    results, start = [], time.perf_counter()
+    for q in queries:
+        rows, sims = retriever.prompt_similarities(q)
+        results.append(top_k(rows, sims, k))
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=500_000)
+    parser.add_argument("--features", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    args = parser.parse_args()
+
+    matrix, topic_terms, weights, rng = make_catalog(args.items, args.features)
+    queries = make_queries(args.queries, args.features, topic_terms, weights, rng)
+
+    start = time.perf_counter()
+    index = build_ivf_index(matrix)
+    print(f"\nIndex: {index.nlist} lists over {args.items:,} items, built in {time.perf_counter() - start:.1f}s")
+
+    exact, exact_s = run(ExactRetriever(matrix), queries, args.k)
+    print(f"{'method':<14}{'recall@' + str(args.k):>10}{'candidates':>12}{'ms/query':>10}{'speedup':>9}")
+    print(f"{'exact':<14}{1.0:>10.3f}{args.items:>12,}{exact_s * 1e3:>10.2f}{1.0:>8.1f}x")
+    for nprobe in args.nprobe:
+        retriever = IVFRetriever(matrix, index, nprobe=nprobe)
+        approx, approx_s = run(retriever, queries, args.k)
+        recall = np.mean([len(a & e) / max(len(e), 1) for a, e in zip(approx, exact)])
+        candidates = np.mean([retriever.candidates(q).shape[0] for q in queries[:50]])
+        print(f"{'ivf nprobe=' + str(nprobe):<14}{recall:>10.3f}{candidates:>12,.0f}{approx_s * 1e3:>10.2f}{exact_s / approx_s:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
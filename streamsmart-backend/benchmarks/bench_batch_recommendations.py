@@ -0,0 +1,79 @@
+"""
+Batch recommendations: per-user loop vs get_recommendations_batch
+=================================================================
+Builds one request per user in data/users.csv (repeated to --users if
+asked for more) and scores them two ways, with rule-based moods and the
+result cache disabled so both sides do the full work:
+
+- loop: get_recommendations once per request (one transform, product and
+  top-k each)
+- batch: get_recommendations_batch over the whole list (one transform,
+  blocked sparse products, row-wise top-k)
+
+Both must return the same titles in the same order.
+
+Usage (from streamsmart-backend/):
+
+    python -m benchmarks.bench_batch_recommendations [--users 5000] [--top-n 10]
+"""
+import argparse
+import csv
+import os
+import random
+import time
+
+os.environ["RECOMMENDATION_CACHE_SIZE"] = "0"
+for key in ("AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_KEY", "OPENAI_API_KEY"):
+    os.environ.pop(key, None)
+
+from app.recommender import recommender  # noqa: E402
+
+PROMPTS = [
+    "feeling sad, something uplifting", "excited for an action movie", "romantic comedy for tonight",
+    "tired after work, something light", "a thriller with a twist", "family fantasy adventure",
+    "bored, surprise me", "a classic drama", "something scary", "funny and short",
+]
+
+
+def make_requests(n, top_n, seed=7):
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(base_dir, "data", "users.csv"), newline="") as f:
+        user_ids = [row["user_id"] for row in csv.DictReader(f)]
+    rng = random.Random(seed)
+    return [
+        {"user_id": user_ids[i % len(user_ids)], "message": rng.choice(PROMPTS), "top_n": top_n}
+        for i in range(n)
+    ]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--top-n", type=int, default=10)
+    args = parser.parse_args()
+
+    requests = make_requests(args.users, args.top_n)
+    recommender.get_model()
+    recommender.get_recommendations_batch(requests[:10])  # warm the taste cache and vectorizer
+
+    loop, loop_s = timed(lambda: [
+        recommender.get_recommendations(r["user_id"], r["message"], r["top_n"]) for r in requests
+    ])
+    batch, batch_s = timed(lambda: recommender.get_recommendations_batch(requests))
+    titles = lambda results: [[rec["title"] for rec in result["recommendations"]] for result in results]
+    assert titles(loop) == titles(batch), "batch and loop rankings differ"
+
+    print(f"\n{len(requests):,} requests, top_n={args.top_n}")
+    print(f"{'method':<10}{'total ms':>12}{'us/request':>12}{'speedup':>10}")
+    for label, seconds in (("loop", loop_s), ("batch", batch_s)):
+        print(f"{label:<10}{seconds * 1e3:>12.1f}{seconds / len(requests) * 1e6:>12.1f}{loop_s / seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Metadata filters: DataFrame string scans vs posting-list bitsets
+================================================================
+Builds a synthetic catalog of --items titles (genres and tags drawn from
+data/movies_metadata.csv, 30% with a second tag) and a 50-title watch
+history, then evaluates the same filters two ways:
+
+- scan: pandas boolean masks over the string columns, the way the legacy
+  recommender filtered (df[df["genre"].str.lower() == ...])
+- bitset: MetadataIndex.evaluate on the parsed filter (cached per-value
+  bitsets, bitwise AND/OR/NOT)
+
+Both must select the same rows. It also times checking 300 candidate rows
+against an evaluated filter, which is the cost the two-stage recommender
+pays per request.
+
+Usage (from streamsmart-backend/):
+
+    python -m benchmarks.bench_metadata_filters [--items 500000] [--repeat 50]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.recommender.artifacts import KeyIndex, moods_path
+from app.recommender.metadata_index import MetadataIndex, bits_contain, parse_filter
+
+FILTERS = [
+    ("genre:comedy AND NOT watched",
+     lambda df, watched: (df["genre"].str.lower() == "comedy") & ~df["movie_id"].isin(watched)),
+    ('(genre:comedy OR genre:drama) AND tag:"dark humor"',
+     lambda df, watched: df["genre"].str.lower().isin(["comedy", "drama"])
+     & df["tags"].str.lower().str.split(", ").apply(lambda tags: "dark humor" in tags)),
+    ("NOT genre:horror AND NOT tag:satire AND NOT watched",
+     lambda df, watched: (df["genre"].str.lower() != "horror")
+     & ~df["tags"].str.lower().str.split(", ").apply(lambda tags: "satire" in tags)
+     & ~df["movie_id"].isin(watched)),
+]
+
+
+def make_catalog(n_items, seed=7):
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    movies = pd.read_csv(os.path.join(base_dir, "data", "movies_metadata.csv"))
+    rng = np.random.default_rng(seed)
+    genres = movies["genre"].unique()
+    tags = movies["tags"].unique()
+    first = tags[rng.integers(0, len(tags), n_items)]
+    second = tags[rng.integers(0, len(tags), n_items)]
+    extra = (rng.random(n_items) < 0.3) & (first != second)
+    return pd.DataFrame({
+        "movie_id": np.arange(1, n_items + 1),
+        "genre": genres[rng.integers(0, len(genres), n_items)],
+        "tags": np.where(extra, np.char.add(np.char.add(first.astype(str), ", "), second.astype(str)), first),
+        "rating": np.round(rng.uniform(1, 10, n_items), 1),
+    })
+
+
+def timed(fn, repeat):
+    result = fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=500000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    df = make_catalog(args.items)
+    catalog = {col: df[col].to_numpy(dtype=str if col in ("genre", "tags") else None) for col in df.columns}
+    movie_id_index = KeyIndex.build(catalog["movie_id"])
+    start = time.perf_counter()
+    index = MetadataIndex.build(catalog, movie_id_index, moods_path)
+    print(f"MetadataIndex over {args.items:,} titles built in {time.perf_counter() - start:.2f}s {index.stats()}")
+
+    rng = np.random.default_rng(11)
+    watched_ids = rng.choice(catalog["movie_id"], 50, replace=False)
+    watched_rows = movie_id_index.get_many(watched_ids)
+    candidates = np.sort(rng.choice(args.items, 300, replace=False))
+
+    print(f"\n{'filter':<54}{'scan ms':>10}{'bitset ms':>11}{'speedup':>9}{'matches':>10}")
+    for text, scan in FILTERS:
+        expression = parse_filter(text)
+        expected, scan_s = timed(lambda: scan(df, watched_ids).to_numpy(), max(args.repeat // 10, 1))
+        bits, bitset_s = timed(lambda: index.evaluate(expression, watched_rows), args.repeat)
+        assert np.array_equal(index.unpack(bits), expected), f"bitset and scan disagree for {text!r}"
+        print(f"{text:<54}{scan_s * 1e3:>10.2f}{bitset_s * 1e3:>11.3f}{scan_s / bitset_s:>8.0f}x{int(expected.sum()):>10,}")
+
+    _, check_s = timed(lambda: bits_contain(bits, candidates), args.repeat * 20)
+    print(f"\nchecking {len(candidates)} candidate rows against a filter: {check_s * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
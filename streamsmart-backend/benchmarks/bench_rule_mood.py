@@ -0,0 +1,92 @@
+"""
+Rule-based mood extraction: substring scans vs the compiled matcher
+===================================================================
+Generates a synthetic prompt set (chat-like sentences, some repeated) and
+times three ways of labelling it:
+
+- legacy: the original lowercase + any(word in prompt) substring checks
+- match: the compiled word-boundary matcher, one prompt at a time
+- batch: extract_mood_batch over the whole list (repeats tokenized once)
+
+It also lists prompts where the two disagree, which should only be
+substring false positives such as "badminton" or "loveless".
+
+Usage (from streamsmart-backend/):
+
+    python -m benchmarks.bench_rule_mood [--prompts 100000] [--unique 0.3]
+"""
+import argparse
+import random
+import time
+
+from app.recommender.mood_rules import MoodRuleMatcher
+
+
+def legacy_extract(prompt):
+    prompt = prompt.lower()
+    if any(word in prompt for word in ["sad", "bad", "lonely"]):
+        return {"mood": "happy", "tone": "light-hearted"}
+    if any(word in prompt for word in ["tired", "lazy", "bored", "lethargic"]):
+        return {"mood": "relaxed", "tone": "light-hearted"}
+    if any(word in prompt for word in ["excited", "energetic", "thrill"]):
+        return {"mood": "energetic", "tone": "intense"}
+    if any(word in prompt for word in ["romantic", "love"]):
+        return {"mood": "romantic", "tone": "light-hearted"}
+    return {"mood": "neutral", "tone": "neutral"}
+
+
+OPENERS = ["I'm feeling", "Feeling", "Honestly so", "Today I am", "Kind of", "Super"]
+FEELINGS = [
+    "sad", "lonely", "tired", "lazy", "bored", "excited", "energetic", "romantic",
+    "happy", "curious", "nostalgic", "stressed", "in love", "thrilled", "okay",
+]
+ASKS = [
+    "recommend something to watch", "what should I watch tonight",
+    "show me a thriller", "any lovely comedies?", "something after badminton practice",
+    "a movie for a date night", "something short and fun", "a documentary maybe",
+    "nothing too heavy please", "a classic from the 90s",
+]
+
+
+def make_prompts(n, unique_fraction, seed=7):
+    rng = random.Random(seed)
+    pool = [
+        f"{rng.choice(OPENERS)} {rng.choice(FEELINGS)}, {rng.choice(ASKS)} (night {i})"
+        for i in range(max(1, int(n * unique_fraction)))
+    ]
+    return [rng.choice(pool) for _ in range(n)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=100_000)
+    parser.add_argument("--unique", type=float, default=0.3, help="Fraction of distinct prompts")
+    args = parser.parse_args()
+
+    prompts = make_prompts(args.prompts, args.unique)
+    matcher = MoodRuleMatcher()
+
+    legacy, legacy_s = timed(lambda: [legacy_extract(p) for p in prompts])
+    single, single_s = timed(lambda: [matcher.match(p) for p in prompts])
+    batch, batch_s = timed(lambda: matcher.match_many(prompts))
+    assert single == batch
+
+    print(f"\n{len(prompts):,} prompts ({len(set(prompts)):,} distinct)")
+    print(f"{'method':<10}{'total ms':>12}{'us/prompt':>12}{'speedup':>10}")
+    for label, seconds in (("legacy", legacy_s), ("match", single_s), ("batch", batch_s)):
+        print(f"{label:<10}{seconds * 1e3:>12.1f}{seconds / len(prompts) * 1e6:>12.2f}{legacy_s / seconds:>9.1f}x")
+
+    changed = sorted({p.split(" (night")[0] for p, old, new in zip(prompts, legacy, batch) if old != new})
+    print(f"\nPrompt templates labelled differently from legacy: {len(changed)}")
+    for prompt in changed[:10]:
+        print(f"  {prompt!r}: {legacy_extract(prompt)['mood']} -> {matcher.match(prompt)['mood']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Two-stage recommendation: full-catalog scoring vs candidates + ranking
+======================================================================
+Scales the real catalog up to --items titles (random genres, tags and
+ratings, vectorized with the bundle's fitted TF-IDF vocabulary), builds a
+serving model over it and gives every user a random watch history. Then
+it scores the same requests three ways:
+
+- exact: every title, exact prompt similarity (the reference ranking)
+- full: every title, prompt similarity over IVF candidates
+- two-stage: candidate generation, then the hybrid score on candidates only
+
+It reports per-request latency, the candidate count, and recall@k against
+the reference: the share of returned titles that score at least as high as
+the reference's k-th title. The synthetic titles share a handful of genre and
+tag combinations, so large groups of titles tie exactly. Ties are broken by
+catalog order, which makes plain set overlap meaningless. The two-stage
+scores are exact hybrid scores. The full-IVF scores undercount the prompt
+term for rows that were not probed.
+
+It then repeats the requests under each of FILTERS and checks two things:
+
+- Every two-stage result matches the filter.
+- Ranking all matching rows through the candidate ranker gives the same
+  top-n scores as the full filtered ranking. This holds even for
+  RF-boosted rows the filter removed.
+
+Usage (from streamsmart-backend/):
+
+    python -m benchmarks.bench_two_stage [--items 200000] [--requests 300] [--top-n 10]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ["RECOMMENDATION_CACHE_SIZE"] = "0"
+os.environ.setdefault("FEEDBACK_LOG_FILE", os.path.join(tempfile.mkdtemp(), "feedback.jsonl"))
+for key in ("AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_KEY", "OPENAI_API_KEY"):
+    os.environ.pop(key, None)
+
+import numpy as np  # noqa: E402
+
+from app.recommender import recommender  # noqa: E402
+from app.recommender.ann_index import ExactRetriever, build_ivf_index  # noqa: E402
+from app.recommender.artifacts import ModelBundle, _text_features, load_model_bundle  # noqa: E402
+from app.recommender.metadata_index import bits_contain, parse_filter  # noqa: E402
+from app.recommender.mood_extractor import extract_mood  # noqa: E402
+from app.recommender.taste_profile import TasteProfileCache  # noqa: E402
+
+PROMPTS = [
+    "feeling sad, something uplifting", "excited for an action movie", "romantic comedy for tonight",
+    "tired after work, something light", "a thriller with a twist", "family fantasy adventure",
+    "bored, surprise me", "a classic drama", "something scary horror", "funny satire", "epic sci-fi",
+]
+FILTERS = ["genre:comedy", "NOT genre:drama AND NOT genre:comedy", '(genre:horror OR tag:"dark humor") AND NOT watched']
+
+
+def make_catalog(base, n_items, seed=7):
+    rng = np.random.default_rng(seed)
+    genres = np.unique(base.catalog["genre"])
+    tags = np.unique(base.catalog["tags"])
+    movie_ids = np.arange(1, n_items + 1)
+    second_tag = rng.random(n_items) < 0.3
+    return {
+        "movie_id": movie_ids,
+        "title": np.array([f"Movie {i}" for i in movie_ids]),
+        "genre": genres[rng.integers(0, len(genres), n_items)],
+        "release_year": rng.integers(1970, 2025, n_items),
+        "duration": rng.integers(80, 180, n_items),
+        "rating": np.round(rng.uniform(1, 10, n_items), 1),
+        "tags": np.array([
+            f"{a}, {b}" if extra and a != b else a
+            for a, b, extra in zip(tags[rng.integers(0, len(tags), n_items)],
+                                   tags[rng.integers(0, len(tags), n_items)], second_tag)
+        ]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--top-n", type=int, default=10)
+    args = parser.parse_args()
+
+    base = load_model_bundle()
+    catalog = make_catalog(base, args.items)
+    matrix = base.tfidf_vectorizer.transform(_text_features(catalog)).tocsr()
+    start = time.perf_counter()
+    ann_index = build_ivf_index(matrix)
+    print(f"IVF index over {args.items:,} titles built in {time.perf_counter() - start:.1f}s")
+    bundle = ModelBundle(catalog, base.tfidf_vectorizer, matrix, base.rf_lookup, base.users,
+                         {"bundle_version": "synthetic"}, ann_index=ann_index)
+    model = recommender.RecommenderModel(bundle)
+
+    rng = random.Random(7)
+    user_ids = sorted({str(u["user_id"]) for u in base.users})
+    histories = {u: [f"Movie {rng.randint(1, args.items)}" for _ in range(rng.randint(3, 30))] for u in user_ids}
+    model.taste_cache = TasteProfileCache(model.similarity_index, model.title_index,
+                                          load_history=lambda user_id: histories.get(user_id, []),
+                                          history_version=lambda user_id: len(histories.get(user_id, [])))
+    requests = [(rng.choice(user_ids), rng.choice(PROMPTS)) for _ in range(args.requests)]
+    moods = {prompt: extract_mood(prompt) for prompt in PROMPTS}
+    weights = dict(recommender.DEFAULT_WEIGHTS)
+
+    def run(retriever, two_stage):
+        model.retriever, model.candidate_generator.enabled = retriever, two_stage
+        rankings, candidates = [], []
+        start = time.perf_counter()
+        for user_id, prompt in requests:
+            result = recommender._score_recommendations(
+                model, user_id, prompt, args.top_n, mood_info=moods[prompt], debug=True, **weights
+            )
+            rankings.append([rec["hybrid_score"] for rec in result["recommendations"]])
+            candidates.append(result["debug"]["stages"]["candidates"]["count"])
+        return rankings, (time.perf_counter() - start) / len(requests), np.mean(candidates)
+
+    ivf = model.retriever
+    run(ivf, True)  # warm the taste cache
+    results = [
+        (label, *run(retriever, two_stage))
+        for label, retriever, two_stage in (("exact", ExactRetriever(matrix), False), ("full", ivf, False),
+                                            ("two-stage", ivf, True))
+    ]
+    _, reference, exact_s, _ = results[0]
+    print(f"\n{args.items:,} titles, {len(requests)} requests, top_n={args.top_n}")
+    print(f"{'method':<12}{'ms/request':>12}{'candidates':>12}{'recall@k':>10}{'speedup':>10}")
+    for label, rankings, seconds, n_candidates in results:
+        recall = np.mean([np.mean(np.array(a) >= b[-1] - 1e-9) for a, b in zip(rankings, reference) if b])
+        print(f"{label:<12}{seconds * 1e3:>12.2f}{n_candidates:>12,.0f}{recall:>10.3f}{exact_s / seconds:>9.1f}x")
+
+    # Filtered requests: two-stage results must match the filter, and the candidate ranker must agree
+    # with the full ranking when given every matching row (RF rows outside the filter included)
+    exact = ExactRetriever(matrix)
+    print(f"\n{'filter':<54}{'matching':>10}{'recall@k':>10}{'ms/request':>12}")
+    for text in FILTERS:
+        expression = parse_filter(text)
+        recalls, seconds = [], 0.0
+        for user_id, prompt in requests:
+            watched = model.title_index.get_many(recommender.get_user_history(user_id))
+            allowed = model.metadata_index.evaluate(expression, watched[watched >= 0])
+            model.retriever, model.candidate_generator.enabled = ivf, True
+            start = time.perf_counter()
+            result = recommender._score_recommendations(
+                model, user_id, prompt, args.top_n, mood_info=moods[prompt], filters=text, **weights
+            )
+            seconds += time.perf_counter() - start
+            rows = model.title_index.get_many([rec["title"] for rec in result["recommendations"]])
+            assert bits_contain(allowed, rows).all(), f"two-stage returned a title outside {text!r}"
+
+            model.retriever = exact
+            ranking = (model.tfidf_vectorizer.transform([prompt]), model.taste_cache.get(user_id),
+                       *recommender._ml_scores(model, moods[prompt].get("mood", "neutral").lower()), args.top_n,
+                       *weights.values())
+            _, full_scores = recommender._rank_all(model, *ranking, allowed=allowed)
+            matching = np.flatnonzero(model.metadata_index.unpack(allowed))
+            _, candidate_scores = recommender._rank_candidates(model, matching, *ranking)
+            assert np.allclose(full_scores, candidate_scores), f"candidate and full ranking disagree for {text!r}"
+            if full_scores.size:
+                scores = np.array([rec["hybrid_score"] for rec in result["recommendations"]])
+                recalls.append(np.mean(scores >= full_scores[-1] - 1e-9))
+        print(f"{text:<54}{matching.shape[0]:>10,}{np.mean(recalls):>10.3f}{seconds / len(requests) * 1e3:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Per-worker memory with and without memory-mapped model artifacts
+==================================================================
+Builds a synthetic bundle by tiling the real catalog (x500 by default), then
+starts N worker processes that each load it the way a uvicorn/gunicorn worker
+would and touch every page of the scoring arrays. While all workers are alive
+it reads /proc/<pid>/smaps_rollup for each and reports, per worker, the memory
+added by loading the model:
+
+- RSS: counts shared page-cache pages in full in every worker, so it barely
+  moves with mmap
+- PSS: shared pages divided among the processes mapping them
+- Private: pages only this worker holds (what each extra worker really costs)
+
+Usage (from streamsmart-backend/, Linux only):
+
+    python -m benchmarks.bench_worker_memory [--workers 4] [--scale 500]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+
+import numpy as np
+
+
+def read_memory_kb(pid):
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[-1] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def build_synthetic_bundle(out_dir, scale):
+    from scipy.sparse import vstack
+    from app.recommender.artifacts import ModelBundle, load_model_bundle, save_bundle
+
+    source = load_model_bundle()
+    size = source.catalog_size * scale
+    catalog = {col: np.tile(values, scale) for col, values in source.catalog.items()}
+    catalog["movie_id"] = np.arange(1, size + 1)
+    catalog["title"] = np.array([f"Movie {i}" for i in range(1, size + 1)])
+    bundle = ModelBundle(
+        catalog,
+        source.tfidf_vectorizer,
+        vstack([source.tfidf_matrix] * scale, format="csr"),
+        source.rf_lookup,
+        source.users,
+        {},
+    )
+    save_bundle(bundle, out_dir)
+    return size
+
+
+def worker(bundle_dir, use_mmap, ready, release):
+    # Import everything up front so the baseline excludes library code
+    import scipy.sparse  # noqa: F401
+    import sklearn.feature_extraction.text  # noqa: F401
+    import sklearn.preprocessing  # noqa: F401
+    from app.recommender.artifacts import load_bundle
+    from app.recommender.recommender import RecommenderModel
+
+    before = read_memory_kb(os.getpid())
+    model = RecommenderModel(load_bundle(bundle_dir, mmap=use_mmap))
+
+    # Touch every page a request could read
+    vector = np.ones(model.tfidf_matrix.shape[1])
+    model.similarity_index.scores_for_vector(vector)
+    for values in model.catalog_columns.values():
+        np.count_nonzero(values == values[0])
+    model.title_index.get("Movie 1")
+
+    ready.put((os.getpid(), before))
+    release.wait()
+
+
+def measure(bundle_dir, use_mmap, n_workers):
+    ctx = mp.get_context("spawn")
+    ready, release = ctx.Queue(), ctx.Event()
+    procs = [ctx.Process(target=worker, args=(bundle_dir, use_mmap, ready, release)) for _ in range(n_workers)]
+    for p in procs:
+        p.start()
+    baselines = dict(ready.get() for _ in procs)
+    deltas = []
+    for pid, before in baselines.items():
+        after = read_memory_kb(pid)
+        deltas.append({key: after[key] - before[key] for key in after})
+    release.set()
+    for p in procs:
+        p.join()
+    return {key: sum(d[key] for d in deltas) / len(deltas) / 1024 for key in deltas[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--scale", type=int, default=500, help="Tile the catalog this many times")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as bundle_dir:
+        size = build_synthetic_bundle(bundle_dir, args.scale)
+        print(f"\nSynthetic catalog: {size:,} titles, {args.workers} workers")
+        print(f"{'mode':<10}{'RSS MB':>10}{'PSS MB':>10}{'Private MB':>12}   (added per worker by loading)")
+        for label, use_mmap in (("in-memory", False), ("mmap", True)):
+            result = measure(bundle_dir, use_mmap, args.workers)
+            print(f"{label:<10}{result['rss']:>10.1f}{result['pss']:>10.1f}{result['private']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()